@@ -2,9 +2,38 @@
 from flask_caching import Cache
 from .models.infra import db, cache
 from .services.vcenter.routes import vcenter_bp
+from .services.metrics import metrics_bp
+from .utils.config import PROFILING_ENABLED, CACHE_TYPE, CACHE_REDIS_URL
+from sqlalchemy import inspect
 import os
 
-def create_app():
+# Columns added to existing tables, by the script in scripts/ that adds them
+COLUMN_MIGRATIONS = {
+    'migrate_collection_scope.py': {
+        'hosts': ('VCenter',),
+        'clusters': ('VCenter',),
+        'virtual_machines': ('VCenter', 'MoRef', 'InstanceUuid'),
+        'snapshots': ('vcenter', 'cluster'),
+        'collection_jobs': ('request_count', 'merged_into')
+    },
+    'migrate_row_hash.py': {
+        'hosts': ('RowHash',),
+        'virtual_machines': ('RowHash',)
+    },
+    'migrate_windows_keys.py': {
+        'windows_vms': ('VCenter', 'MoRef'),
+        'windows_guest_facts': ('MoRef',)
+    },
+    'migrate_vcenter_details.py': {
+        'vcenter_details': ('storage_health_status', 'disk_health_status', 'storage_capacity_used',
+                            'network_status', 'network_details', 'vsan_health_status', 'vsan_disk_status',
+                            'vsan_network_status', 'avg_latency', 'cpu_overcommitment',
+                            'memory_overcommitment', 'storage_overcommitment', 'drs_status', 'drs_balance')
+    }
+}
+
+def create_app(config=None):
+    """Build the app; ``config`` overrides settings, e.g. to point benchmarks at another database"""
     app = Flask(__name__, 
                 template_folder=os.path.join(os.path.dirname(os.path.dirname(__file__)), 'templates'),
                 static_folder=os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static'))
@@ -14,10 +43,12 @@ def create_app():
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     
     # Configure cache
-    app.config['CACHE_TYPE'] = 'redis'
-    app.config['CACHE_REDIS_HOST'] = 'redis'
-    app.config['CACHE_REDIS_PORT'] = 6379
+    app.config['CACHE_TYPE'] = CACHE_TYPE
+    app.config['CACHE_REDIS_URL'] = CACHE_REDIS_URL
     app.config['CACHE_DEFAULT_TIMEOUT'] = 300
+
+    if config:
+        app.config.update(config)
     
     # Initialize extensions
     db.init_app(app)
@@ -25,6 +56,12 @@ def create_app():
     
     # Register blueprints
     app.register_blueprint(vcenter_bp)
+    app.register_blueprint(metrics_bp)
+
+    if PROFILING_ENABLED:
+        from .services.profiling import profiler, profiling_bp
+        profiler.init_app(app)
+        app.register_blueprint(profiling_bp)
     
     # Ensure the instance folder exists
     try:
@@ -32,4 +69,41 @@ def create_app():
     except OSError:
         pass
     
-    return app
\ No newline at end of file
+    return app
+
+def create_missing_tables(app):
+    """Create tables added since the database was set up, such as data_generations or collection_jobs.
+
+    Existing tables are left as they are; columns added to them need the
+    scripts/migrate_*.py migrations, and a database that misses any raises
+    RuntimeError naming them instead of failing on every query later. A
+    database that cannot be opened is logged rather than stopping the
+    process, as before this ran at startup.
+    """
+    with app.app_context():
+        try:
+            db.create_all()
+            missing = missing_columns()
+        except Exception as e:
+            app.logger.error(f"Error creating missing tables: {str(e)}")
+            return
+
+    if missing:
+        scripts = sorted({script for _, _, script in missing})
+        columns = ', '.join(f"{table}.{column}" for table, column, _ in missing)
+        raise RuntimeError(f"Database is missing columns {columns}; run "
+                           + ', '.join(f"scripts/{script}" for script in scripts))
+
+def missing_columns():
+    """(table, column, migration script) for every model column the database does not have"""
+    inspector = inspect(db.engine)
+    missing = []
+    for table in db.metadata.sorted_tables:
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            script = next((script for script, tables in COLUMN_MIGRATIONS.items()
+                           if column.name in tables.get(table.name, ())), 'migrate_*.py')
+            missing.append((table.name, column.name, script))
+    return missing
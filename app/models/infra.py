@@ -1,10 +1,39 @@
+import hashlib
 from flask_sqlalchemy import SQLAlchemy
 from flask_caching import Cache
 from datetime import datetime
+from typing import Any, Dict
 
 db = SQLAlchemy()
 cache = Cache()
 
+def stored_value(column, value: Any) -> Any:
+    """A value as SQLite reads it back from its column, so written and stored rows compare equal"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)  # Only the wall-clock time is stored
+    python_type = column.type.python_type
+    if not isinstance(value, python_type):
+        try:
+            # SQLite stores booleans in text columns as 0/1
+            value = python_type(int(value) if isinstance(value, bool) else value)
+        except (TypeError, ValueError):
+            pass
+    return value
+
+def row_hash(model, values: Dict[str, Any]) -> str:
+    """Hash of a row's content columns, stored with the row at write time.
+
+    Values are hashed as they read back from SQLite, so a stored row and
+    the collected data it was written from hash the same. List pages key
+    rendered row fragments on it, and writers use it to skip unchanged
+    tables.
+    """
+    content = tuple(stored_value(column, values.get(column.key)) for column in model.__table__.columns
+                    if column.key not in ('id', 'RowHash'))
+    return hashlib.blake2b(repr(content).encode(), digest_size=8).hexdigest()
+
 class VCenterInfo(db.Model):
     """Model for storing comprehensive vCenter information"""
     __tablename__ = 'vcenter_details'
@@ -76,6 +105,7 @@ class Hosts(db.Model):
     __tablename__ = 'hosts'
     id = db.Column(db.Integer, primary_key=True)
     Host = db.Column(db.String, index=True)
+    VCenter = db.Column(db.String(100), index=True)
     Datacenter = db.Column(db.String)
     Cluster = db.Column(db.String)
     NumCPU = db.Column(db.Integer)
@@ -92,11 +122,13 @@ class Hosts(db.Model):
     Vendor = db.Column(db.String)
     Model = db.Column(db.String)
     ServiceTag = db.Column(db.String)
+    RowHash = db.Column(db.String(16))  # row_hash of the other columns, set by writers
 
 class Clusters(db.Model):
     __tablename__ = 'clusters'
     id = db.Column(db.Integer, primary_key=True)
     ClusterName = db.Column(db.String, index=True)
+    VCenter = db.Column(db.String(100), index=True)
     CPUUtilization = db.Column(db.Float)
     MemoryUtilization = db.Column(db.Float)
     StorageUtilization = db.Column(db.Float)
@@ -120,6 +152,9 @@ class VirtualMachines(db.Model):
     __tablename__ = 'virtual_machines'
     id = db.Column(db.Integer, primary_key=True)
     VMName = db.Column(db.String(100), index=True)
+    VCenter = db.Column(db.String(100), index=True)
+    MoRef = db.Column(db.String(50))  # Managed object id within its vCenter, e.g. vm-1234
+    InstanceUuid = db.Column(db.String(50))
     OS = db.Column(db.String(100))
     Site = db.Column(db.String(50))
     State = db.Column(db.String(50), index=True)
@@ -133,10 +168,13 @@ class VirtualMachines(db.Model):
     Host = db.Column(db.String(50))
     Cluster = db.Column(db.String(50))
     Notes = db.Column(db.Text)
+    RowHash = db.Column(db.String(16))  # row_hash of the other columns, set by writers
 
 class WindowsVMs(db.Model):
     __tablename__ = 'windows_vms'
     id = db.Column(db.Integer, primary_key=True)
+    VCenter = db.Column(db.String(100), index=True)
+    MoRef = db.Column(db.String(50))
     VMName = db.Column(db.String(100), index=True)
     OS = db.Column(db.String(50))
     Site = db.Column(db.String(50))
@@ -191,10 +229,74 @@ class Snapshots(db.Model):
     vm_name = db.Column(db.String(100), index=True)
     snapshot = db.Column(db.String(100))
     created = db.Column(db.DateTime)
+    vcenter = db.Column(db.String(100), index=True)
+    cluster = db.Column(db.String(100))
 
 class UpdateStats(db.Model):
     __tablename__ = 'update_stats'
     id = db.Column(db.Integer, primary_key=True)
     last_run = db.Column(db.DateTime, default=datetime.utcnow)
     duration = db.Column(db.Float)
-    total_count = db.Column(db.Integer, default=1)
\ No newline at end of file
+    total_count = db.Column(db.Integer, default=1)
+
+class DataGeneration(db.Model):
+    """Per-table data generation counters, bumped whenever a writer commits"""
+    __tablename__ = 'data_generations'
+    table_name = db.Column(db.String(50), primary_key=True)
+    generation = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    source = db.Column(db.String(50))
+
+
+class CollectionJob(db.Model):
+    """Collection runs requested by the web tier or the schedule, executed by the collector process"""
+    __tablename__ = 'collection_jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(100), default='all')  # 'all', 'vcenter:<host>' or 'cluster:<name>'
+    status = db.Column(db.String(20), index=True)  # 'queued', 'running', 'succeeded', 'failed', 'merged'
+    requested_by = db.Column(db.String(50))
+    request_count = db.Column(db.Integer, default=1)  # Requests coalesced into this job
+    merged_into = db.Column(db.Integer)  # Job that absorbed this one when its scope was widened
+    requested_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    progress = db.Column(db.Text)  # JSON document maintained by the collector
+    error_message = db.Column(db.Text)
+
+class WindowsGuestFacts(db.Model):
+    """Last probed Windows guest facts per VM, with the state that invalidates them.
+
+    Keyed by vCenter and MoRef: VM names are not unique across vCenters.
+    """
+    __tablename__ = 'windows_guest_facts'
+    VCenter = db.Column(db.String(100), primary_key=True)
+    MoRef = db.Column(db.String(50), primary_key=True)
+    VMName = db.Column(db.String(100), index=True)
+    boot_time = db.Column(db.DateTime)  # Guest boot time when last probed
+    tools_version = db.Column(db.String(20))  # VMware Tools version when last probed
+    facts = db.Column(db.Text)  # JSON: fact name -> value
+    fact_times = db.Column(db.Text)  # JSON: fact group -> ISO time it was probed
+    last_probe = db.Column(db.DateTime)
+    last_duration = db.Column(db.Float)  # Seconds, used to start slow VMs first
+    last_error = db.Column(db.Text)
+
+class CollectorHeartbeat(db.Model):
+    """Liveness of the standalone collector process"""
+    __tablename__ = 'collector_heartbeat'
+    id = db.Column(db.Integer, primary_key=True)
+    hostname = db.Column(db.String(100))
+    pid = db.Column(db.Integer)
+    started_at = db.Column(db.DateTime)
+    last_seen = db.Column(db.DateTime)
+    current_job_id = db.Column(db.Integer)
+
+
+class SchedulerJobState(db.Model):
+    """Last run bookkeeping for each named scheduler job"""
+    __tablename__ = 'scheduler_job_state'
+    name = db.Column(db.String(50), primary_key=True)
+    last_started = db.Column(db.DateTime)
+    last_success = db.Column(db.DateTime)
+    last_failure = db.Column(db.DateTime)
+    last_duration = db.Column(db.Float)
+    last_error = db.Column(db.Text)
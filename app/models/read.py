@@ -0,0 +1,54 @@
+from collections import namedtuple
+from typing import Dict, Iterable, Tuple
+from sqlalchemy import func, select
+from .infra import db, Hosts, Clusters, VirtualMachines, Snapshots, WindowsVMs
+
+# Same text as format_date in the views, produced by SQLite instead of per row in Python
+SQL_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+class ReadModel:
+    """The columns list pages and APIs read from one table, as immutable slotted rows.
+
+    Rows are selected with Core, so no ORM instances, identity map or
+    instance state are built. Every DateTime column ``X`` also gets an
+    ``X_text`` field formatted by SQLite, for views that show dates as text.
+    """
+
+    def __init__(self, model, exclude: Iterable[str] = ()):
+        self.model = model
+        self.table = model.__table__
+        excluded = set(exclude)
+        self.columns = tuple(column for column in self.table.columns if column.key not in excluded)
+        self.dates = tuple(column for column in self.columns if isinstance(column.type, db.DateTime))
+        self.fields = tuple(column.key for column in self.columns) + \
+            tuple(f"{column.key}_text" for column in self.dates)
+        self.row_type = namedtuple(f"{model.__name__}Row", self.fields)
+
+    def statement(self):
+        return select(*self.columns,
+                      *(func.strftime(SQL_DATE_FORMAT, column).label(f"{column.key}_text")
+                        for column in self.dates))
+
+    def load(self) -> list:
+        """Every row as a plain tuple, the compact form kept in the cache"""
+        return [tuple(row) for row in db.session.execute(self.statement())]
+
+    def wrap(self, rows: Iterable[Tuple]) -> list:
+        return list(map(self.row_type._make, rows))
+
+# Columns no list page, API or dashboard reads are left out; other tables are read whole
+READ_MODELS: Dict[type, ReadModel] = {
+    model: ReadModel(model, exclude) for model, exclude in (
+        (VirtualMachines, ('VCenter', 'MoRef', 'InstanceUuid')),
+        (WindowsVMs, ('VCenter', 'MoRef')),
+        (Hosts, ('VCenter',)),
+        (Clusters, ('VCenter',)),
+        (Snapshots, ('vcenter', 'cluster')),
+    )
+}
+
+def read_model(model) -> ReadModel:
+    """The read model of a table, created with every column on first use"""
+    if model not in READ_MODELS:
+        READ_MODELS[model] = ReadModel(model)
+    return READ_MODELS[model]
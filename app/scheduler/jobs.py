@@ -0,0 +1,196 @@
+import random
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from ..models.infra import db, SchedulerJobState
+
+class ScheduledJob:
+    """A named job with its own cadence, dependencies and run bookkeeping.
+
+    A job runs either every ``interval`` seconds or daily at ``at`` ("HH:MM",
+    local time). ``jitter`` adds a random delay of up to that many seconds to
+    every run so jobs sharing a cadence do not hit the vCenters together.
+    """
+
+    def __init__(self, name: str, func: Callable[[], bool], interval: Optional[int] = None,
+                 at: Optional[str] = None, depends_on: Iterable[str] = (), jitter: int = 0):
+        if not interval and not at:
+            raise ValueError(f"Job {name} needs an interval or a daily time")
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.at = at
+        self.depends_on = tuple(depends_on)
+        self.jitter = jitter
+        self.next_run: Optional[datetime] = None
+        self.last_started: Optional[datetime] = None
+        self.last_success: Optional[datetime] = None
+        self.running = False
+        self._lock = threading.Lock()
+
+    def schedule_next(self, now: datetime):
+        """Compute the next run (UTC) from the last start time"""
+        if self.interval:
+            if self.last_started:
+                base = max(self.last_started + timedelta(seconds=self.interval), now)
+            else:
+                base = now
+        else:
+            hour, minute = map(int, self.at.split(':'))
+            local_now = datetime.now()
+            candidate = local_now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if candidate <= local_now:
+                candidate += timedelta(days=1)
+            base = now + (candidate - local_now)
+        self.next_run = base + timedelta(seconds=random.uniform(0, self.jitter))
+
+    def try_start(self) -> bool:
+        """Mark the job as running unless a run is already in progress"""
+        with self._lock:
+            if self.running:
+                return False
+            self.running = True
+            return True
+
+    def finish(self):
+        with self._lock:
+            self.running = False
+
+class JobScheduler:
+    """Runs named jobs on independent cadences in a small worker pool.
+
+    The same job never overlaps with itself, a due job waits for a run of
+    each of its dependencies that started once it was due and succeeded,
+    so it works on fresh results, and the last
+    start/success/failure of every job is persisted in ``scheduler_job_state``
+    so a restart does not re-run weekly jobs immediately.
+    """
+
+    def __init__(self, max_workers: int = 3, context_factory: Optional[Callable[[], Any]] = None):
+        self.logger = logging.getLogger(__name__)
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self.max_workers = max_workers
+        self.context_factory = context_factory or nullcontext
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def register(self, job: ScheduledJob):
+        for dependency in job.depends_on:
+            if dependency not in self.jobs:
+                raise ValueError(f"Job {job.name} depends on unknown job {dependency}")
+        self.jobs[job.name] = job
+
+    def load_state(self):
+        """Restore last run times and compute each job's first run"""
+        states = {state.name: state for state in SchedulerJobState.query.all()}
+        now = datetime.utcnow()
+        for job in self.jobs.values():
+            state = states.get(job.name)
+            if state:
+                job.last_started = state.last_started
+                job.last_success = state.last_success
+            job.schedule_next(now)
+            self.logger.info(f"Job {job.name} next run at {job.next_run:%Y-%m-%d %H:%M:%S} UTC")
+
+    def _dependencies_met(self, job: ScheduledJob) -> bool:
+        for name in job.depends_on:
+            dependency = self.jobs[name]
+            if dependency.running or not dependency.last_started or not dependency.last_success:
+                return False
+            if dependency.last_started < job.next_run or dependency.last_success < dependency.last_started:
+                return False
+        return True
+
+    def waiting_on(self, name: str) -> List[str]:
+        """Jobs that are waiting for the current run of ``name``, so it can keep its results for them"""
+        started = self.jobs[name].last_started
+        return [job.name for job in self.jobs.values()
+                if name in job.depends_on and not job.running and started
+                and job.next_run is not None and job.next_run <= started]
+
+    def run_pending(self, now: Optional[datetime] = None) -> List[str]:
+        """Submit every due job whose dependencies are satisfied"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix='scheduler-job')
+        now = now or datetime.utcnow()
+        submitted = []
+        for job in self.jobs.values():
+            if job.running or job.next_run is None or job.next_run > now:
+                continue
+            if not self._dependencies_met(job):
+                self.logger.debug(f"Job {job.name} is due but waiting for {', '.join(job.depends_on)}")
+                continue
+            if job.try_start():
+                self._executor.submit(self._execute, job)
+                submitted.append(job.name)
+        return submitted
+
+    def run_job(self, name: str) -> bool:
+        """Run a job synchronously now, unless it is already running"""
+        job = self.jobs[name]
+        if not job.try_start():
+            self.logger.info(f"Job {name} is already running, not starting another run")
+            return False
+        return self._execute(job)
+
+    def _execute(self, job: ScheduledJob) -> bool:
+        started = datetime.utcnow()
+        job.last_started = started
+        success = False
+        error = None
+        try:
+            with self.context_factory():
+                self._record(job.name, last_started=started)
+                self.logger.info(f"Job {job.name} started")
+                try:
+                    success = bool(job.func())
+                except Exception as e:
+                    error = str(e)
+                    self.logger.error(f"Job {job.name} raised: {error}")
+
+                duration = (datetime.utcnow() - started).total_seconds()
+                if success:
+                    job.last_success = datetime.utcnow()
+                    self._record(job.name, last_success=job.last_success,
+                                 last_duration=duration, last_error=None)
+                else:
+                    self._record(job.name, last_failure=datetime.utcnow(),
+                                 last_duration=duration, last_error=error or 'Job reported failure')
+                self.logger.info(f"Job {job.name} {'succeeded' if success else 'failed'} in {duration:.1f}s")
+        finally:
+            job.schedule_next(datetime.utcnow())
+            job.finish()
+        return success
+
+    def _record(self, name: str, **fields):
+        """Persist bookkeeping fields for a job"""
+        try:
+            state = db.session.get(SchedulerJobState, name) or SchedulerJobState(name=name)
+            for key, value in fields.items():
+                setattr(state, key, value)
+            db.session.add(state)
+            db.session.commit()
+        except Exception as e:
+            self.logger.error(f"Error saving state for job {name}: {str(e)}")
+            db.session.rollback()
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Describe every job for monitoring"""
+        return [{
+            'name': job.name,
+            'interval': job.interval,
+            'at': job.at,
+            'depends_on': list(job.depends_on),
+            'running': job.running,
+            'next_run': job.next_run.isoformat() if job.next_run else None,
+            'last_started': job.last_started.isoformat() if job.last_started else None,
+            'last_success': job.last_success.isoformat() if job.last_success else None
+        } for job in self.jobs.values()]
+
+    def shutdown(self):
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,64 @@
+import os
+import logging
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+class LeaderLock:
+    """Non-blocking exclusive lock on a file, held for the lifetime of the process.
+
+    Used to elect a single scheduler among several web workers. The operating
+    system releases the lock when the holder exits or crashes, so another
+    process can take over without any stale-lock cleanup.
+    """
+
+    def __init__(self, path: str):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self._handle: Optional[int] = None
+
+    @property
+    def is_held(self) -> bool:
+        return self._handle is not None
+
+    def try_acquire(self) -> bool:
+        """Try to take the lock without blocking"""
+        if self._handle is not None:
+            return True
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        handle = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(handle, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            os.close(handle)
+            return False
+
+        # Record the holder for operators inspecting the lock file
+        os.ftruncate(handle, 0)
+        os.write(handle, str(os.getpid()).encode())
+        self._handle = handle
+        self.logger.info(f"Process {os.getpid()} acquired leader lock {self.path}")
+        return True
+
+    def release(self):
+        """Release the lock if held"""
+        if self._handle is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._handle, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._handle, 0, os.SEEK_SET)
+                msvcrt.locking(self._handle, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._handle)
+            self._handle = None
+            self.logger.info(f"Process {os.getpid()} released leader lock {self.path}")
@@ -1,13 +1,18 @@
-import schedule
 import time
 import threading
 import logging
+from contextlib import ExitStack, contextmanager, nullcontext
 from datetime import datetime
-from typing import Callable, Optional
+from typing import Any, Callable, Dict, Iterable, Optional
+from flask import current_app
+from ..services.cache import cache_manager
 from ..services.credentials import credentials_manager
-from ..services.vcenter.collector import VCenterCollector
+from ..services.jobs import job_queue, parse_scope
 from ..services.database.manager import DatabaseManager
-from ..utils.config import UPDATE_SCHEDULE_TIME
+from ..utils.config import (VCENTERS, SCHEDULER_LOCK_FILE, SCHEDULER_LEADER_RETRY, COLLECTOR_POLL_INTERVAL,
+                            SCHEDULER_MAX_WORKERS, SCHEDULED_JOBS)
+from .leader import LeaderLock
+from .jobs import JobScheduler, ScheduledJob
 
 class SchedulerManager:
     def __init__(self):
@@ -15,6 +20,55 @@ class SchedulerManager:
         self.scheduler_thread: Optional[threading.Thread] = None
         self.is_running = False
         self.db_manager = DatabaseManager()
+        self.app = None
+        self.leader_lock = LeaderLock(SCHEDULER_LOCK_FILE)
+        self._election_thread: Optional[threading.Thread] = None
+        self._heartbeat_thread: Optional[threading.Thread] = None
+        self.current_job_id: Optional[int] = None
+        # Runs that collect the same section never overlap, whether scheduled or on demand;
+        # runs of different sections, e.g. vCenter health during an inventory run, do
+        self._section_locks: Dict[str, threading.Lock] = {}
+        self._section_locks_lock = threading.Lock()
+        # Open sessions and VM list an inventory run keeps for a job waiting on it (windows_guest)
+        self._handoff: Optional[Dict[str, Any]] = None
+        self._handoff_lock = threading.Lock()
+        self.job_scheduler = JobScheduler(max_workers=SCHEDULER_MAX_WORKERS,
+                                          context_factory=self._app_context)
+        self._register_jobs()
+
+    def _register_jobs(self):
+        """Register one scheduled job per data class from SCHEDULED_JOBS"""
+        handlers: Dict[str, Callable[[], bool]] = {
+            'inventory': lambda: self.perform_update(sections={'inventory'},
+                                                     hand_off=bool(self.job_scheduler.waiting_on('inventory'))),
+            'vcenter_health': lambda: self.perform_update(sections={'vcenter_info', 'affinity_rules'}),
+            'static_facts': lambda: self.perform_update(sections={'inventory'}, refresh_static=True),
+            'windows_guest': self.perform_windows_update
+        }
+        for name, settings in SCHEDULED_JOBS.items():
+            self.job_scheduler.register(ScheduledJob(name, handlers[name], **settings))
+
+    def init_app(self, app):
+        """Bind the scheduler to an app so jobs run inside its context"""
+        self.app = app
+
+    def start_when_leader(self, app):
+        """Start the scheduler only in the process holding the leader lock.
+
+        Every web worker calls this; the others keep retrying in the background
+        so a replacement worker takes over when the leader exits or is recycled.
+        """
+        self.init_app(app)
+        if self._election_thread:
+            return
+        self._election_thread = threading.Thread(target=self._run_election, daemon=True)
+        self._election_thread.start()
+
+    def _run_election(self):
+        """Retry the leader lock until this process wins it"""
+        while not self.leader_lock.try_acquire():
+            time.sleep(SCHEDULER_LEADER_RETRY)
+        self.start()
 
     def start(self):
         """Start the scheduler"""
@@ -24,42 +78,166 @@ class SchedulerManager:
             self.scheduler_thread.start()
             self.logger.info("Scheduler started")
 
+    def run(self):
+        """Run the scheduler in the foreground; used by the standalone collector process"""
+        self.is_running = True
+        self.logger.info("Scheduler running in the foreground")
+        self._run_scheduler()
+
     def stop(self):
         """Stop the scheduler"""
         self.is_running = False
         if self.scheduler_thread:
             self.scheduler_thread.join()
             self.logger.info("Scheduler stopped")
+        self.leader_lock.release()
+        self._take_handoff(close=True)
+
+    def _app_context(self):
+        return self.app.app_context() if self.app else nullcontext()
 
     def _run_scheduler(self):
-        """Run the scheduler loop"""
-        schedule.every().day.at(UPDATE_SCHEDULE_TIME).do(self.perform_update)
-        
+        """Run the scheduler loop: due scheduled jobs plus queued on-demand jobs"""
+        with self._app_context():
+            job_queue.fail_orphaned()
+            self.job_scheduler.load_state()
+
+        # Keep credentials loaded so jobs never wait for the provider
+        credentials_manager.start_renewal()
+
+        self._heartbeat_thread = threading.Thread(target=self._run_heartbeat, daemon=True)
+        self._heartbeat_thread.start()
+
+        try:
+            while self.is_running:
+                self.job_scheduler.run_pending()
+                with self._app_context():
+                    self.process_jobs()
+                time.sleep(COLLECTOR_POLL_INTERVAL)
+        finally:
+            self.job_scheduler.shutdown()
+            credentials_manager.stop_renewal()
+
+    def _run_heartbeat(self):
+        """Publish liveness independently of long-running jobs"""
         while self.is_running:
-            schedule.run_pending()
-            time.sleep(60)  # Check every minute
+            with self._app_context():
+                job_queue.heartbeat(self.current_job_id)
+            time.sleep(COLLECTOR_POLL_INTERVAL)
+
+    def request_update(self, requested_by: str = 'web', scope: str = 'all') -> int:
+        """Queue an update for the collector and return the id of the job that will run it"""
+        job, _ = job_queue.enqueue(scope=scope, requested_by=requested_by)
+        return job.id
+
+    def process_jobs(self):
+        """Run queued jobs one at a time until the queue is empty"""
+        job = job_queue.claim_next()
+        while job and self.is_running:
+            self.current_job_id = job.id
+            try:
+                scope = parse_scope(job.scope)
+                # A cluster refresh has no vCenter-wide data to collect
+                sections = {'inventory', 'affinity_rules'} if scope.get('cluster') else None
+                success = self.perform_update(job.id, sections=sections, scope=scope)
+                job_queue.finish(job.id, success, None if success else 'Update failed, see collector log')
+            except Exception as e:
+                job_queue.finish(job.id, False, str(e))
+            finally:
+                self.current_job_id = None
+            job = job_queue.claim_next()
+
+    def perform_update(self, job_id: Optional[int] = None, sections: Optional[Iterable[str]] = None,
+                       refresh_static: bool = False, scope: Optional[Dict[str, str]] = None,
+                       hand_off: bool = False) -> bool:
+        """Perform the database update, reporting progress to the job if given.
+
+        ``sections`` limits the run to some data classes (all by default),
+        ``refresh_static`` re-reads host facts that are otherwise cached and
+        ``scope`` (see parse_scope) restricts the run to one vCenter or cluster.
+        ``hand_off`` keeps the vCenter sessions and VM list of a successful
+        unscoped run open for the Windows guest stage (perform_windows_update).
+        A caller waits for runs in progress that collect any of the same
+        sections; runs of other sections go ahead in parallel.
+        """
+        from ..services.vcenter.collector import SECTIONS
+
+        with self._collecting(sections or SECTIONS):
+            return self._perform_update(job_id, sections, refresh_static, scope or {}, hand_off)
+
+    @contextmanager
+    def _collecting(self, sections: Iterable[str]):
+        """Hold the lock of every section, always taken in the same order so runs cannot deadlock"""
+        with self._section_locks_lock:
+            locks = [self._section_locks.setdefault(section, threading.Lock()) for section in sorted(sections)]
+        with ExitStack() as stack:
+            for lock in locks:
+                stack.enter_context(lock)
+            yield
+
+    def _perform_update(self, job_id: Optional[int], sections: Optional[Iterable[str]],
+                        refresh_static: bool, scope: Dict[str, str], hand_off: bool) -> bool:
+        # pyVmomi is only loaded by the process that actually collects
+        from ..services.vcenter.collector import VCenterCollector
+
+        def report(**progress):
+            if job_id is not None:
+                job_queue.update_progress(job_id, **progress)
 
-    def perform_update(self) -> bool:
-        """Perform the database update"""
+        collector = None
         try:
             self.logger.info(f"Starting scheduled update at {datetime.now()}")
             
             # Get credentials
+            report(stage='credentials')
             credentials = credentials_manager.get_credentials()
             
             # Initialize collector
-            collector = VCenterCollector(credentials)
+            hand_off = hand_off and not scope
+            collector = VCenterCollector(credentials, refresh_static=refresh_static, keep_sessions=hand_off)
             
             # Collect data
             self.logger.info("Collecting data from vCenters...")
-            vcenter_data = collector.collect_from_all_vcenters()
-            
+            targets = [scope['vcenter']] if scope.get('vcenter') else None
+            clusters = [scope['cluster']] if scope.get('cluster') else None
+            report(stage='collecting', vcenters={}, total_vcenters=len(targets or VCENTERS))
+            vcenters: Dict[str, Dict[str, Any]] = {}
+
+            def on_vcenter_done(host: str, result: Dict[str, Any]):
+                vcenters[host] = result
+                report(vcenters=vcenters)
+
+            vcenter_data = collector.collect_from_all_vcenters(progress_callback=on_vcenter_done,
+                                                               sections=sections, vcenters=targets,
+                                                               clusters=clusters)
+
+            # A failed vCenter would otherwise replace its rows with nothing
+            failed = [host for host, result in vcenters.items() if 'error' in result]
+            if failed and (scope or len(failed) == len(vcenters)):
+                self.logger.error(f"Update of {', '.join(failed)} failed, keeping existing data")
+                return False
+            if failed:
+                self.logger.warning(f"Keeping existing data of {', '.join(failed)}, which failed")
+
             # Update database
             self.logger.info("Updating database...")
-            success = self.db_manager.perform_full_update(vcenter_data)
+            report(stage='writing')
+            generations = cache_manager.get_generations()
+            success = self.db_manager.perform_full_update(vcenter_data, scope=scope, failed_vcenters=failed)
             
             if success:
                 self.logger.info("Scheduled update completed successfully")
+                if hand_off:
+                    self._put_handoff({'collector': collector, 'credentials': credentials,
+                                       'vms_data': vcenter_data.get('vms_data', [])})
+                    collector = None  # The waiting job closes the sessions
+                report(stage='warming', committed_at=datetime.utcnow().isoformat())
+                # Unchanged tables keep their generation, and their views are still warm
+                tables = [table for table, generation in cache_manager.get_generations().items()
+                          if generations.get(table) != generation]
+                if tables:
+                    cache_manager.warm(current_app._get_current_object(), tables)
+                report(stage='done')
             else:
                 self.logger.error("Scheduled update failed")
             
@@ -69,10 +247,69 @@ class SchedulerManager:
             self.logger.error(f"Error during scheduled update: {str(e)}")
             return False
 
-    def manual_update(self) -> bool:
-        """Trigger a manual update"""
+        finally:
+            if collector is not None:
+                collector.close_sessions()
+
+    def _put_handoff(self, handoff: Dict[str, Any]):
+        with self._handoff_lock:
+            previous, self._handoff = self._handoff, handoff
+        if previous is not None:
+            previous['collector'].close_sessions()  # Nobody took it; the new one is fresher
+
+    def _take_handoff(self, close: bool = False) -> Optional[Dict[str, Any]]:
+        with self._handoff_lock:
+            handoff, self._handoff = self._handoff, None
+        if handoff is not None and close:
+            handoff['collector'].close_sessions()
+            return None
+        return handoff
+
+    def perform_windows_update(self) -> bool:
+        """Probe Windows guests on the sessions and VM list the last inventory run handed over.
+
+        The windows_guest job depends on the inventory job, so it runs right
+        after an inventory run that started once it was due; that run keeps
+        its vCenter sessions open for it instead of closing them.
+        """
+        from ..services.vcenter.collector import COLLECTION_DURATION
+        from ..services.windows import WindowsGuestCollector
+
+        handoff = self._take_handoff()
+        if handoff is None:
+            self.logger.error("No inventory run handed over its sessions, skipping Windows guest collection")
+            return False
+
+        collector = handoff['collector']
+        try:
+            self.logger.info("Collecting Windows guest facts...")
+            windows_collector = WindowsGuestCollector(handoff['credentials'])
+            with COLLECTION_DURATION.time(vcenter='all', stage='windows_guests'):
+                rows = windows_collector.collect(collector.sessions, handoff['vms_data'])
+            collector.close_sessions()
+
+            with self._collecting({'windows_guests'}):
+                generations = cache_manager.get_generations()
+                # A vCenter can fail the guest stage alone, so Windows rows keep their own failures
+                success = self.db_manager.perform_full_update({'windows_vms': rows},
+                                                              failed_vcenters=windows_collector.failed_vcenters)
+                if success and cache_manager.get_generations().get('windows_vms') != generations.get('windows_vms'):
+                    cache_manager.warm(current_app._get_current_object(), ['windows_vms'])
+            self.logger.info(f"Windows guest collection {'completed' if success else 'failed'}: "
+                             f"{windows_collector.stats}")
+            return success
+
+        except Exception as e:
+            self.logger.error(f"Error during Windows guest collection: {str(e)}")
+            return False
+
+        finally:
+            collector.close_sessions()
+
+    def manual_update(self) -> int:
+        """Queue a manual update; returns the id of the job that will run it"""
         self.logger.info("Manual update triggered")
-        return self.perform_update()
+        return self.request_update('manual')
 
 # Create a singleton instance
-scheduler_manager = SchedulerManager()
\ No newline at end of file
+scheduler_manager = SchedulerManager()
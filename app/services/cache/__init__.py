@@ -0,0 +1,5 @@
+from .manager import cache_manager
+from .artifacts import artifact_store
+
+# Export the singleton instances
+__all__ = ['cache_manager', 'artifact_store']
@@ -0,0 +1,172 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import logging
+from typing import Dict, Optional
+from flask import Flask, request, send_file
+from ...utils.config import ARTIFACT_DIR, ARTIFACT_RETENTION, EXPORT_HTML_PAGES
+from ...utils.locks import file_lock
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always produced
+    brotli = None
+
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_LOCK = 'manifest.lock'
+
+class ArtifactStore:
+    """Pre-rendered, pre-compressed copies of cached views written after each commit.
+
+    Every payload is written once per content hash as ``.json``/``.html`` plus
+    ``.gz`` and ``.br`` siblings. A manifest maps each request path to the files
+    and to the generation token they were rendered for, so a view is only
+    served from disk while its data generation is unchanged.
+    """
+
+    def __init__(self, artifact_dir: str = ARTIFACT_DIR):
+        self.logger = logging.getLogger(__name__)
+        self.artifact_dir = artifact_dir
+        self._manifest: Dict[str, Dict] = {}
+        self._manifest_mtime: Optional[float] = None
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.artifact_dir, MANIFEST_FILE)
+
+    def _load_manifest(self) -> Dict[str, Dict]:
+        """Reload the manifest only when another process has rewritten it"""
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime
+        except OSError:
+            return {}
+
+        if mtime != self._manifest_mtime:
+            manifest = self._read_manifest()
+            if manifest is None:
+                return {}
+            self._manifest, self._manifest_mtime = manifest, mtime
+        return self._manifest
+
+    def _read_manifest(self) -> Optional[Dict[str, Dict]]:
+        try:
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Error reading artifact manifest: {str(e)}")
+            return None
+
+    def _write_atomic(self, path: str, data: bytes):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _write_variants(self, stem: str, extension: str, body: bytes) -> Dict[str, str]:
+        """Write the identity, gzip and brotli variants of a payload if not present yet"""
+        files = {'identity': f"{stem}.{extension}", 'gzip': f"{stem}.{extension}.gz"}
+        if brotli is not None:
+            files['br'] = f"{stem}.{extension}.br"
+
+        for encoding, filename in files.items():
+            path = os.path.join(self.artifact_dir, filename)
+            if os.path.exists(path):
+                continue  # Content-hashed files are immutable
+            if encoding == 'gzip':
+                data = gzip.compress(body, compresslevel=9, mtime=0)
+            elif encoding == 'br':
+                data = brotli.compress(body, quality=11)
+            else:
+                data = body
+            self._write_atomic(path, data)
+
+        return files
+
+    def export(self, app: Flask, path: str, view, token: str) -> bool:
+        """Render a view outside of any request and publish it as an artifact"""
+        try:
+            with app.test_request_context(path):
+                response = app.make_response(view.__wrapped__())
+                if response.status_code != 200:
+                    self.logger.warning(f"Not exporting {path}: view returned {response.status_code}")
+                    response.close()
+                    return False
+                if response.mimetype == 'text/html' and not EXPORT_HTML_PAGES:
+                    response.close()
+                    return False
+                body = response.get_data()  # Streamed views render while their body is read
+
+            digest = hashlib.sha256(body).hexdigest()[:16]
+            name = path.strip('/').replace('/', '_') or 'index'
+            extension = 'json' if response.mimetype == 'application/json' else 'html'
+
+            os.makedirs(self.artifact_dir, exist_ok=True)
+            files = self._write_variants(f"{name}-{digest}", extension, body)
+
+            # Web workers and the collector export concurrently; read and rewrite the manifest under one lock
+            with file_lock(os.path.join(self.artifact_dir, MANIFEST_LOCK)):
+                manifest = self._read_manifest() or {}
+                manifest[path] = {
+                    'token': token,
+                    'mimetype': response.mimetype,
+                    'hash': digest,
+                    'files': files
+                }
+                self._write_atomic(self.manifest_path, json.dumps(manifest, indent=2).encode())
+            self.logger.info(f"Exported {path} ({len(body)} bytes, {digest})")
+            return True
+
+        except Exception as e:
+            self.logger.error(f"Error exporting {path}: {str(e)}")
+            return False
+
+    def response_for(self, path: str, token: str):
+        """Serve a view's artifact if it matches the current generation, else None"""
+        entry = self._load_manifest().get(path)
+        if not entry or entry['token'] != token:
+            return None
+
+        accepted = request.accept_encodings
+        for encoding in ('br', 'gzip', 'identity'):
+            filename = entry['files'].get(encoding)
+            if not filename or (encoding != 'identity' and not accepted[encoding]):
+                continue
+
+            file_path = os.path.join(self.artifact_dir, filename)
+            if not os.path.exists(file_path):
+                continue
+
+            response = send_file(file_path, mimetype=entry['mimetype'],
+                                 conditional=False, etag=False)
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+            response.vary.add('Accept-Encoding')
+            return response
+
+        return None
+
+    def prune(self) -> int:
+        """Remove artifacts no longer referenced by the manifest once they are old enough"""
+        referenced = {MANIFEST_FILE, MANIFEST_LOCK}
+        for entry in self._load_manifest().values():
+            referenced.update(entry['files'].values())
+
+        removed = 0
+        cutoff = time.time() - ARTIFACT_RETENTION
+        for filename in os.listdir(self.artifact_dir):
+            path = os.path.join(self.artifact_dir, filename)
+            if filename in referenced or os.path.getmtime(path) > cutoff:
+                continue
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError as e:
+                self.logger.warning(f"Could not remove artifact {filename}: {str(e)}")
+        return removed
+
+# Create singleton instance
+artifact_store = ArtifactStore()
@@ -0,0 +1,294 @@
+import os
+import time
+import pickle
+import socket
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Optional
+from flask_caching.backends.base import BaseCache
+from ...utils.config import (CACHE_LOCAL_MAX_BYTES, CACHE_REDIS_TIMEOUT, CACHE_REDIS_RETRY,
+                             CACHE_INVALIDATION_CHANNEL)
+from ..metrics import metrics
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+BACKEND_REQUESTS = metrics.counter('infraweb_cache_backend_requests_total',
+                                   'Cache backend lookups by tier (local, redis) and result',
+                                   ('tier', 'result'))
+
+class LocalCache:
+    """Thread-safe LRU bounded by the pickled size of its values.
+
+    Values are kept unpickled and handed out as they are, so callers must
+    not mutate what they get.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_bytes // 4  # One huge page must not flush everything else
+        self.size = 0
+        self._items: OrderedDict = OrderedDict()  # key -> (expires, value, size)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                return None
+            expires, value, size = entry
+            if expires is not None and expires <= time.time():
+                del self._items[key]
+                self.size -= size
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: Any, size: int, expires: Optional[float]):
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= old[2]
+            if size > self.max_item_bytes:
+                return
+            self._items[key] = (expires, value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, _, evicted) = self._items.popitem(last=False)
+                self.size -= evicted
+
+    def discard(self, key: str):
+        with self._lock:
+            entry = self._items.pop(key, None)
+            if entry is not None:
+                self.size -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+
+class LayeredCache(BaseCache):
+    """Flask-Caching backend with an in-process LRU in front of Redis.
+
+    Hits on the local tier cost a dict lookup and no unpickling. Every write
+    or delete is published on CACHE_INVALIDATION_CHANNEL and the other
+    processes evict their copies of those keys; a process that loses its
+    subscription clears its local tier, since it may have missed messages.
+    Copies in other processes can therefore be stale for the few
+    milliseconds a message takes, which is harmless for the view cache whose
+    keys already change with every data generation.
+
+    When Redis fails, the cache runs from process memory alone for
+    CACHE_REDIS_RETRY seconds and then pings Redis again; the local tier is
+    cleared on reconnecting. Without a CACHE_REDIS_URL, or without the redis
+    package, it runs from process memory only.
+    """
+
+    def __init__(self, client=None, key_prefix: str = 'infraweb:', default_timeout: int = 300,
+                 max_bytes: int = CACHE_LOCAL_MAX_BYTES, channel: str = CACHE_INVALIDATION_CHANNEL):
+        super().__init__(default_timeout)
+        self.logger = logging.getLogger(__name__)
+        self.local = LocalCache(max_bytes)
+        self.client = client
+        self.key_prefix = key_prefix
+        self.channel = channel
+        self._down_until = 0.0
+        self._listener_pid = None
+        self._listener_lock = threading.Lock()
+        self._origin = ''
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        client = None
+        url = config.get('CACHE_REDIS_URL')
+        if url and redis is None:
+            app.logger.warning("redis is not installed; caching in process memory only")
+        elif url:
+            client = redis.Redis.from_url(url, socket_timeout=CACHE_REDIS_TIMEOUT,
+                                          socket_connect_timeout=CACHE_REDIS_TIMEOUT)
+        kwargs['key_prefix'] = config.get('CACHE_KEY_PREFIX') or 'infraweb:'
+        kwargs['max_bytes'] = config.get('CACHE_LOCAL_MAX_BYTES', CACHE_LOCAL_MAX_BYTES)
+        return cls(client, *args, **kwargs)
+
+    # Redis availability
+
+    def _available(self) -> bool:
+        if self.client is None:
+            return False
+        if self._down_until:
+            if time.monotonic() < self._down_until:
+                return False
+            try:
+                self.client.ping()
+            except redis.RedisError:
+                self._down_until = time.monotonic() + CACHE_REDIS_RETRY
+                return False
+            self._down_until = 0.0
+            self.local.clear()  # Invalidations sent during the outage were missed
+            self.logger.info("Redis is reachable again; using both cache tiers")
+        self._ensure_listener()
+        return True
+
+    def _failed(self, e: Exception):
+        if not self._down_until:
+            self.logger.warning(f"Redis unavailable, caching in process memory only "
+                                f"for {CACHE_REDIS_RETRY}s: {str(e)}")
+        self._down_until = time.monotonic() + CACHE_REDIS_RETRY
+        BACKEND_REQUESTS.inc(tier='redis', result='error')
+
+    def _ensure_listener(self):
+        """Subscribe to invalidations once per process; threads do not survive a fork"""
+        if self._listener_pid == os.getpid():
+            return
+        with self._listener_lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+            self._origin = f"{socket.gethostname()}:{os.getpid()}:{id(self)}"
+            threading.Thread(target=self._listen, daemon=True, name='cache-invalidation').start()
+
+    def _listen(self):
+        """Evict local copies of keys written or deleted by other processes"""
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                self.local.clear()  # Anything published before the subscription was missed
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    origin, _, keys = message['data'].decode().partition(' ')
+                    if origin == self._origin:
+                        continue
+                    if keys == '*':
+                        self.local.clear()
+                    else:
+                        for key in keys.split('\n'):
+                            self.local.discard(key)
+            except redis.RedisError as e:
+                self.logger.debug(f"Cache invalidation subscription lost: {str(e)}")
+                self.local.clear()
+                time.sleep(CACHE_REDIS_RETRY)
+            finally:
+                try:
+                    pubsub.close()
+                except redis.RedisError:
+                    pass
+
+    def _publish(self, pipe, *keys: str):
+        payload = '\n'.join(keys)
+        pipe.publish(self.channel, f"{self._origin} {payload}")
+
+    # BaseCache interface
+
+    def get(self, key: str) -> Any:
+        if self._down_until and time.monotonic() >= self._down_until:
+            self._available()  # Reconnect, and drop copies that may have missed invalidations, before serving any
+        value = self.local.get(key)
+        if value is not None:
+            BACKEND_REQUESTS.inc(tier='local', result='hit')
+            return value
+        if not self._available():
+            BACKEND_REQUESTS.inc(tier='local', result='miss')
+            return None
+
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.get(self.key_prefix + key)
+            pipe.pttl(self.key_prefix + key)
+            data, ttl_ms = pipe.execute()
+        except redis.RedisError as e:
+            self._failed(e)
+            return None
+        if data is None:
+            BACKEND_REQUESTS.inc(tier='redis', result='miss')
+            return None
+
+        BACKEND_REQUESTS.inc(tier='redis', result='hit')
+        value = pickle.loads(data)
+        self.local.put(key, value, len(data), time.time() + ttl_ms / 1000 if ttl_ms > 0 else None)
+        return value
+
+    def set(self, key: str, value: Any, timeout: Optional[int] = None) -> bool:
+        timeout = self._normalize_timeout(timeout)
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if self._available():
+            try:
+                pipe = self.client.pipeline(transaction=False)
+                if timeout:
+                    pipe.setex(self.key_prefix + key, timeout, data)
+                else:
+                    pipe.set(self.key_prefix + key, data)
+                self._publish(pipe, key)
+                pipe.execute()
+            except redis.RedisError as e:
+                self._failed(e)
+        self.local.put(key, value, len(data), time.time() + timeout if timeout else None)
+        return True
+
+    def add(self, key: str, value: Any, timeout: Optional[int] = None) -> bool:
+        if not self._available():
+            if self.local.get(key) is not None:
+                return False
+            return self.set(key, value, timeout)
+
+        timeout = self._normalize_timeout(timeout)
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        try:
+            added = self.client.set(self.key_prefix + key, data, ex=timeout or None, nx=True)
+        except redis.RedisError as e:
+            self._failed(e)
+            return False
+        if added:
+            self.local.put(key, value, len(data), time.time() + timeout if timeout else None)
+        return bool(added)
+
+    def has(self, key: str) -> bool:
+        if self.local.get(key) is not None:
+            return True
+        if not self._available():
+            return False
+        try:
+            return bool(self.client.exists(self.key_prefix + key))
+        except redis.RedisError as e:
+            self._failed(e)
+            return False
+
+    def delete(self, key: str) -> bool:
+        return self.delete_many(key)
+
+    def delete_many(self, *keys: str) -> bool:
+        for key in keys:
+            self.local.discard(key)
+        if not keys or not self._available():
+            return True
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.delete(*(self.key_prefix + key for key in keys))
+            self._publish(pipe, *keys)
+            pipe.execute()
+        except redis.RedisError as e:
+            self._failed(e)
+            return False
+        return True
+
+    def clear(self) -> bool:
+        self.local.clear()
+        if not self._available():
+            return True
+        try:
+            keys = list(self.client.scan_iter(match=f"{self.key_prefix}*"))
+            pipe = self.client.pipeline(transaction=False)
+            if keys:
+                pipe.delete(*keys)
+            self._publish(pipe, '*')
+            pipe.execute()
+        except redis.RedisError as e:
+            self._failed(e)
+            return False
+        return True
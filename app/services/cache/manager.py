@@ -0,0 +1,438 @@
+import os
+import math
+import time
+import random
+import zlib
+import hashlib
+import logging
+import threading
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Dict, Iterable, List, Optional, Tuple
+from flask import Flask, current_app, request
+from markupsafe import Markup
+from sqlalchemy import text
+from ...models.infra import db, cache, DataGeneration
+from ...models.read import read_model
+from ...utils.config import (CACHE_VIEW_TIMEOUT, EXPORT_HTML_PAGES, CACHE_LOCK_TIMEOUT, CACHE_LOCK_WAIT,
+                             CACHE_LOCK_POLL, CACHE_EARLY_REFRESH_BETA)
+from ..metrics import metrics
+from .artifacts import artifact_store
+
+# Upsert used by every writer (including the PowerShell import) to bump a table's generation
+BUMP_GENERATION_SQL = """
+    INSERT INTO data_generations (table_name, generation, updated_at, source)
+    VALUES (:table_name, 1, :updated_at, :source)
+    ON CONFLICT(table_name) DO UPDATE SET
+        generation = generation + 1,
+        updated_at = excluded.updated_at,
+        source = excluded.source
+"""
+
+CACHE_REQUESTS = metrics.counter('infraweb_cache_requests_total',
+                                 'Cached view lookups by outcome (hit, miss, not_modified, artifact, bypass, '
+                                 'coalesced, stale, early_refresh)',
+                                 ('endpoint', 'result'))
+
+ROW_FRAGMENTS = metrics.counter('infraweb_cache_row_fragments_total',
+                                'Rows of fragment-cached pages by outcome (hit, rendered)',
+                                ('template', 'result'))
+
+class CacheManager:
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._flights: Dict[str, threading.Event] = {}  # Views being rebuilt by this process
+        self._flights_lock = threading.Lock()
+        self._row_templates: Dict[str, tuple] = {}  # Row template name -> (template, row macro, cache key)
+
+    def get_generations(self) -> Dict[str, Tuple[int, Optional[datetime]]]:
+        """Get the current generation and commit time of every tracked table"""
+        return {
+            row.table_name: (row.generation, row.updated_at)
+            for row in DataGeneration.query.all()
+        }
+
+    def bump_generation(self, tables: Iterable[str], source: str):
+        """Bump the generation of the given tables inside the caller's transaction.
+
+        Must be called before the writer's own commit so the new data and the
+        new generation become visible together.
+        """
+        now = datetime.utcnow()
+        for table_name in tables:
+            db.session.execute(text(BUMP_GENERATION_SQL), {
+                'table_name': table_name,
+                'updated_at': now,
+                'source': source
+            })
+        self.logger.info(f"Bumped data generation for {', '.join(tables)} ({source})")
+
+    def generation_token(self, tables: Iterable[str],
+                         generations: Optional[Dict[str, Tuple[int, Optional[datetime]]]] = None) -> str:
+        """Build a short token identifying the data generation of the given tables"""
+        if generations is None:
+            generations = self.get_generations()
+        parts = [f"{table}:{generations.get(table, (0, None))[0]}" for table in sorted(tables)]
+        return hashlib.sha1('|'.join(parts).encode()).hexdigest()[:16]
+
+    def get_validators(self, tables: Iterable[str], bucket: Optional[int] = None) -> Tuple[str, Optional[datetime]]:
+        """Get the generation token and last commit time for the given tables"""
+        generations = self.get_generations()
+        token = self.generation_token(tables, generations)
+        commit_times = [generations[table][1] for table in tables
+                        if table in generations and generations[table][1]]
+        last_modified = max(commit_times) if commit_times else None
+
+        if bucket:
+            bucket_start = int(time.time() // bucket) * bucket
+            token = f"{token}.{bucket_start // bucket}"
+            bucket_time = datetime.utcfromtimestamp(bucket_start)
+            last_modified = max(last_modified, bucket_time) if last_modified else bucket_time
+
+        return token, last_modified
+
+    def _not_modified(self, token: str, last_modified: Optional[datetime]) -> bool:
+        """Check the request's conditional headers against the current validators"""
+        if request.if_none_match:
+            return request.if_none_match.contains_weak(token)
+        if request.if_modified_since and last_modified:
+            return last_modified.replace(microsecond=0, tzinfo=timezone.utc) <= request.if_modified_since
+        return False
+
+    def _set_validators(self, response, token: str, last_modified: Optional[datetime]):
+        """Attach ETag/Last-Modified and ask clients to revalidate on every use"""
+        response.set_etag(token, weak=True)
+        if last_modified:
+            response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+        response.cache_control.no_cache = True
+        return response
+
+    def _claim_rebuild(self, cache_key: str, wait: bool) -> bool:
+        """Make this request the only one rebuilding ``cache_key``, across threads and processes.
+
+        Returns True if the caller must rebuild and then call _release_rebuild.
+        Otherwise another request is rebuilding; with ``wait`` this returns once
+        it is done or after CACHE_LOCK_WAIT seconds.
+        """
+        with self._flights_lock:
+            flight = self._flights.get(cache_key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[cache_key] = threading.Event()
+        if not leader:
+            if wait:
+                flight.wait(CACHE_LOCK_WAIT)
+            return False
+
+        # cache.add is atomic in Redis, which makes this lock hold across workers
+        try:
+            if cache.add(f"lock/{cache_key}", os.getpid(), timeout=CACHE_LOCK_TIMEOUT):
+                return True
+        except Exception as e:
+            self.logger.warning(f"Error taking rebuild lock, rebuilding anyway: {str(e)}")
+            return True
+
+        if wait:
+            deadline = time.monotonic() + CACHE_LOCK_WAIT
+            while time.monotonic() < deadline and cache.get(cache_key) is None:
+                time.sleep(CACHE_LOCK_POLL)
+        self._release_rebuild(cache_key, locked=False)
+        return False
+
+    def _release_rebuild(self, cache_key: str, locked: bool = True):
+        if locked:
+            try:
+                cache.delete(f"lock/{cache_key}")
+            except Exception as e:
+                self.logger.warning(f"Error releasing rebuild lock: {str(e)}")
+        with self._flights_lock:
+            flight = self._flights.pop(cache_key, None)
+        if flight is not None:
+            flight.set()
+
+    @staticmethod
+    def _refresh_early(entry: tuple, beta: float) -> bool:
+        """Probabilistic early expiry: the closer to expiry and the slower to render, the likelier"""
+        if not beta or len(entry) < 5 or not entry[4]:
+            return False
+        render_seconds, expires_at = entry[3], entry[4]
+        return time.time() - render_seconds * beta * math.log(1.0 - random.random()) >= expires_at
+
+    def _stale_entry(self, path: str) -> Optional[Tuple[str, tuple]]:
+        """The last cached version of a view with the token it was cached under"""
+        token = cache.get(f"view-latest/{path}")
+        if token is None:
+            return None
+        entry = cache.get(f"view/{token}/{path}")
+        return (token, entry) if entry is not None else None
+
+    def cached(self, *tables: str, timeout: int = CACHE_VIEW_TIMEOUT, bucket: Optional[int] = None,
+               artifact: bool = False, serve_stale: bool = False,
+               early_refresh: float = CACHE_EARLY_REFRESH_BETA):
+        """Cache a view under a key that includes the generation of the tables it reads.
+
+        Entries are never served stale: a commit to any of the tables changes the
+        key. Views whose output also depends on the clock (e.g. certificate
+        expiry counts) pass a ``bucket`` in seconds to roll the key over as well.
+
+        The same generation token is sent as a weak ETag, with the tables' last
+        commit time as Last-Modified, and conditional requests are answered
+        with 304 before the cache or the database is touched.
+
+        Views marked as ``artifact`` are exported to pre-compressed files after
+        each commit and served from disk while their generation is current.
+
+        On a miss only one request, across all workers, renders the view; the
+        others wait for its result. Views that set ``serve_stale`` answer them
+        with the previous version instead, under its own ETag, so they neither
+        wait nor get a response that claims to be current. Entries close to
+        their TTL are re-rendered early by one request, with a probability
+        that grows with their render time and ``early_refresh``.
+        """
+        def decorator(f):
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                try:
+                    token, last_modified = self.get_validators(tables, bucket)
+                except Exception as e:
+                    current_app.logger.error(f"Error reading data generation, bypassing cache: {str(e)}")
+                    CACHE_REQUESTS.inc(endpoint=request.endpoint, result='bypass')
+                    return f(*args, **kwargs)
+
+                if self._not_modified(token, last_modified):
+                    CACHE_REQUESTS.inc(endpoint=request.endpoint, result='not_modified')
+                    response = current_app.response_class(status=304)
+                    return self._set_validators(response, token, last_modified)
+
+                if artifact and not request.args:
+                    response = artifact_store.response_for(request.path, token)
+                    if response is not None:
+                        CACHE_REQUESTS.inc(endpoint=request.endpoint, result='artifact')
+                        return self._set_validators(response, token, last_modified)
+
+                cache_key = f"view/{token}/{request.full_path}"
+
+                cached_response = cache.get(cache_key)
+                if cached_response is not None:
+                    if self._refresh_early(cached_response, early_refresh) and \
+                            self._claim_rebuild(cache_key, wait=False):
+                        CACHE_REQUESTS.inc(endpoint=request.endpoint, result='early_refresh')
+                        return self._render(f, args, kwargs, cache_key, timeout, token, last_modified, claimed=True)
+                    CACHE_REQUESTS.inc(endpoint=request.endpoint, result='hit')
+                    return self._entry_response(cached_response, token, last_modified)
+
+                stale = self._stale_entry(request.full_path) if serve_stale else None
+                if self._claim_rebuild(cache_key, wait=stale is None):
+                    CACHE_REQUESTS.inc(endpoint=request.endpoint, result='miss')
+                    return self._render(f, args, kwargs, cache_key, timeout, token, last_modified, claimed=True)
+
+                if stale is not None:
+                    CACHE_REQUESTS.inc(endpoint=request.endpoint, result='stale')
+                    return self._entry_response(stale[1], stale[0], None)
+
+                cached_response = cache.get(cache_key)
+                if cached_response is not None:
+                    CACHE_REQUESTS.inc(endpoint=request.endpoint, result='coalesced')
+                    return self._entry_response(cached_response, token, last_modified)
+
+                # The rebuild failed or is taking longer than CACHE_LOCK_WAIT
+                CACHE_REQUESTS.inc(endpoint=request.endpoint, result='miss')
+                return self._render(f, args, kwargs, cache_key, timeout, token, last_modified)
+
+            decorated_function.cache_tables = tables
+            decorated_function.artifact = artifact and not bucket
+            return decorated_function
+        return decorator
+
+    def rows(self, model) -> List[tuple]:
+        """Every row of a model's read model, loaded from SQLite once per generation.
+
+        Pages and APIs over the same table share this dataset instead of each
+        running their own query. It is cached as plain tuples, column-compact,
+        under the table's generation and fields, so a commit or a schema
+        change starts a new one.
+        """
+        reader = read_model(model)
+        try:
+            generation = self.get_generations().get(reader.table.name, (0, None))[0]
+        except Exception as e:
+            current_app.logger.error(f"Error reading data generation, bypassing dataset cache: {str(e)}")
+            return reader.wrap(reader.load())
+        fields_hash = zlib.crc32(','.join(reader.fields).encode())
+        cache_key = f"dataset/{reader.table.name}/{generation}/{fields_hash:08x}"
+
+        dataset = cache.get(cache_key)
+        if dataset is None:
+            claimed = self._claim_rebuild(cache_key, wait=True)
+            dataset = None if claimed else cache.get(cache_key)
+            try:
+                if dataset is None:
+                    dataset = reader.load()
+                    cache.set(cache_key, dataset, timeout=CACHE_VIEW_TIMEOUT)
+            finally:
+                if claimed:
+                    self._release_rebuild(cache_key)
+        return reader.wrap(dataset)
+
+    def _row_template(self, template_name: str) -> tuple:
+        """The ``row`` macro of a row template and the key its fragments are cached under.
+
+        The key carries a checksum of the template source, so changed markup
+        never reuses fragments rendered by the old one.
+        """
+        env = current_app.jinja_env
+        template = env.get_template(template_name)
+        known = self._row_templates.get(template_name)
+        if known is None or known[0] is not template:
+            source = env.loader.get_source(env, template_name)[0]
+            known = (template, template.module.row,
+                     f"fragments/{template_name}/{zlib.crc32(source.encode()):08x}")
+            self._row_templates[template_name] = known
+        return known[1:]
+
+    def row_fragments(self, template_name: str, rows: List[tuple]) -> Iterable[Markup]:
+        """The HTML of every row, reusing fragments cached by the row's RowHash.
+
+        Rows with a hash stored at write time are rendered once and then
+        looked up, so a page rebuild renders only rows that changed since the
+        last one. Fragments are yielded lazily so streamed pages still flush
+        early; once every row is out, the fragments of the current rows
+        replace the cached set, which drops rows that no longer exist.
+        """
+        render, cache_key = self._row_template(template_name)
+        known = cache.get(cache_key) or {}
+        current = {}
+        rendered = 0
+        for row in rows:
+            digest = row.RowHash
+            html = known.get(digest) if digest else None
+            if html is None:
+                html = str(render(row))
+                rendered += 1
+            if digest:
+                current[digest] = html
+            yield Markup(html)
+
+        ROW_FRAGMENTS.inc(len(rows) - rendered, template=template_name, result='hit')
+        ROW_FRAGMENTS.inc(rendered, template=template_name, result='rendered')
+        if current.keys() != known.keys():
+            cache.set(cache_key, current, timeout=CACHE_VIEW_TIMEOUT)
+
+    def _entry_response(self, entry: tuple, token: str, last_modified: Optional[datetime]):
+        body, status, mimetype = entry[:3]
+        response = current_app.response_class(body, status=status, mimetype=mimetype)
+        return self._set_validators(response, token, last_modified)
+
+    def _render(self, f, args, kwargs, cache_key: str, timeout: int, token: str,
+                last_modified: Optional[datetime], claimed: bool = False):
+        """Render the view and cache a successful response with its render time and expiry.
+
+        Streamed responses reach the client chunk by chunk and are cached once
+        the stream completes; a claimed rebuild is released only then, or when
+        the response is closed without its body being read.
+        """
+        release_lock = threading.Lock()
+
+        def release():
+            nonlocal claimed
+            with release_lock:
+                if not claimed:
+                    return
+                claimed = False
+            self._release_rebuild(cache_key)
+
+        start = time.perf_counter()
+        try:
+            response = current_app.make_response(f(*args, **kwargs))
+        except Exception:
+            release()
+            raise
+        if response.status_code != 200:
+            release()
+            return response
+
+        path, mimetype = request.full_path, response.mimetype
+
+        def store(body: bytes):
+            cache.set(cache_key,
+                      (body, 200, mimetype, time.perf_counter() - start,
+                       time.time() + timeout if timeout else None),
+                      timeout=timeout)
+            cache.set(f"view-latest/{path}", token, timeout=timeout)
+
+        self._set_validators(response, token, last_modified)
+        if response.is_streamed:
+            response.response = self._tee(response.response, store, release)
+            # A body that is never iterated (HEAD, client gone before the first chunk) never runs the tee's finally
+            response.call_on_close(release)
+            return response
+        try:
+            store(response.get_data())
+        finally:
+            release()
+        return response
+
+    def _tee(self, chunks, store, release):
+        """Pass a streamed body through and store it whole, unless the client went away midway"""
+        parts = []
+        complete = False
+        try:
+            for chunk in chunks:
+                parts.append(chunk.encode() if isinstance(chunk, str) else chunk)
+                yield chunk
+            complete = True
+        finally:
+            try:
+                if complete:
+                    store(b''.join(parts))
+            except Exception as e:
+                self.logger.error(f"Error caching streamed response: {str(e)}")
+            finally:
+                release()
+
+    def warm(self, app: Flask, tables: Optional[Iterable[str]] = None) -> List[str]:
+        """Pre-render every cached view that depends on the given tables.
+
+        Called after a collection or import commits so the first user after a
+        refresh never hits a cold cache. Artifact views are exported to disk,
+        everything else is rendered into the cache. Without ``tables`` every
+        view is warmed.
+        """
+        changed = set(tables) if tables else None
+        warmed = []
+        client = app.test_client()
+
+        for rule in app.url_map.iter_rules():
+            if 'GET' not in rule.methods or rule.arguments:
+                continue
+            view = app.view_functions.get(rule.endpoint)
+            view_tables = getattr(view, 'cache_tables', None)
+            if view_tables is None:
+                continue
+            if changed is not None and not changed.intersection(view_tables):
+                continue
+
+            if view.artifact and (rule.rule.startswith('/api/') or EXPORT_HTML_PAGES):
+                with app.app_context():
+                    token, _ = self.get_validators(view_tables)
+                if artifact_store.export(app, rule.rule, view, token):
+                    warmed.append(rule.rule)
+                    continue
+
+            try:
+                response = client.get(rule.rule, buffered=True)  # Streamed views render while being read
+                if response.status_code == 200:
+                    warmed.append(rule.rule)
+                else:
+                    self.logger.warning(f"Warming {rule.rule} returned {response.status_code}")
+            except Exception as e:
+                self.logger.error(f"Error warming {rule.rule}: {str(e)}")
+
+        if os.path.isdir(artifact_store.artifact_dir):
+            artifact_store.prune()
+
+        self.logger.info(f"Warmed {len(warmed)} cached views")
+        return warmed
+
+# Create singleton instance
+cache_manager = CacheManager()
@@ -1,4 +1,5 @@
 from .manager import credentials_manager
+from .providers import CredentialProvider, get_provider
 
 # Export the singleton instance
-__all__ = ['credentials_manager']
\ No newline at end of file
+__all__ = ['credentials_manager', 'CredentialProvider', 'get_provider']
\ No newline at end of file
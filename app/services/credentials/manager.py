@@ -1,34 +1,66 @@
 import os
 import json
-import subprocess
+import threading
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, Optional
-from ...utils.config import VCENTER_PASSWORD_ID, WINDOWS_PASSWORD_ID
+from ...utils.config import (CREDENTIAL_PROVIDER, CREDENTIAL_REFRESH_INTERVAL, CREDENTIAL_RENEW_BEFORE,
+                             CREDENTIAL_RETRY_INTERVAL, CREDENTIAL_CACHE_DIR, CREDENTIAL_CACHE_FILE,
+                             CREDENTIAL_CACHE_KEY_FILE, CREDENTIAL_CACHE_TTL)
+from .providers import CredentialProvider, get_provider
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:  # Without cryptography every cold start fetches from the provider
+    Fernet = None
 
 class CredentialsManager:
-    def __init__(self):
+    """Credentials from a pluggable provider, refreshed off the request path.
+
+    At most one refresh runs at a time; callers that arrive during a refresh
+    wait for it instead of starting their own. Once credentials are loaded,
+    ``get_credentials`` never blocks on the provider: a background thread
+    renews them shortly before they expire, and expired credentials are
+    served while a refresh runs. The last credentials are kept in a
+    short-lived encrypted file, readable by its owner only and stored
+    outside the repository (``INFRAWEB_CREDENTIAL_CACHE_DIR``), so a
+    restarted process does not have to wait for the provider.
+    """
+
+    def __init__(self, provider: Optional[CredentialProvider] = None):
         self.logger = logging.getLogger(__name__)
+        self._provider = provider
         self._credentials = None
         self._last_refresh = None
-        self._refresh_interval = timedelta(hours=1)
-        self.ps_script_path = os.path.join(
-            os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))),
-            'scripts',
-            'credential_script.ps1'
-        )
+        self._refresh_interval = timedelta(seconds=CREDENTIAL_REFRESH_INTERVAL)
+        self._refresh_lock = threading.Lock()
+        self._background_lock = threading.Lock()
+        self._background_refresh = False
+        self._renewal_thread: Optional[threading.Thread] = None
+        self._stop_renewal = threading.Event()
+
+    @property
+    def provider(self) -> CredentialProvider:
+        if self._provider is None:
+            self._provider = get_provider(CREDENTIAL_PROVIDER)
+        return self._provider
 
     def get_credentials(self, force_refresh: bool = False) -> Dict[str, Dict[str, str]]:
-        """Get credentials from cache or fetch new ones"""
+        """Get credentials, fetching them only when none are loaded yet"""
         try:
-            if self._should_refresh() or force_refresh:
-                self._refresh_credentials()
-            
+            if force_refresh:
+                self._refresh(force=True)
+            elif not self._credentials and not self._load_disk_cache():
+                self._refresh()
+            elif self._should_refresh():
+                # Serve what we have; the provider is called in the background
+                self._refresh_in_background()
+
             if not self._credentials:
                 raise Exception("No credentials available")
-                
+
             return self._credentials
-            
+
         except Exception as e:
             self.logger.error(f"Error getting credentials: {str(e)}")
             raise
@@ -37,79 +69,145 @@ class CredentialsManager:
         """Check if credentials should be refreshed"""
         if not self._credentials or not self._last_refresh:
             return True
-        
+
         return datetime.now() - self._last_refresh > self._refresh_interval
 
-    def _refresh_credentials(self):
-        """Refresh credentials using PowerShell script"""
-        try:
-            # Verify script exists
-            if not os.path.exists(self.ps_script_path):
-                self.logger.error(f"PowerShell script not found at: {self.ps_script_path}")
-                raise FileNotFoundError(f"Script not found: {self.ps_script_path}")
-
-            # Log the command we're about to run
-            command = [
-                "powershell",
-                "-ExecutionPolicy",
-                "Bypass",
-                "-File",
-                self.ps_script_path,
-                "-VCenterPasswordId",
-                VCENTER_PASSWORD_ID,
-                "-WindowsPasswordId",
-                WINDOWS_PASSWORD_ID
-            ]
-            self.logger.debug(f"Executing command: {' '.join(command)}")
-
-            # Run PowerShell script
-            result = subprocess.run(
-                command,
-                capture_output=True,
-                text=True
-            )
-
-            # Log the raw output for debugging
-            self.logger.debug(f"PowerShell stdout: {result.stdout}")
-            if result.stderr:
-                self.logger.warning(f"PowerShell stderr: {result.stderr}")
-
-            if result.returncode != 0:
-                raise subprocess.CalledProcessError(
-                    result.returncode, 
-                    command, 
-                    result.stdout, 
-                    result.stderr
-                )
-
-            # Try to find JSON in the output
+    def _refresh(self, force: bool = False):
+        """Fetch credentials from the provider, at most once at a time"""
+        with self._refresh_lock:
+            if not force and not self._should_refresh():
+                return  # Another caller refreshed while we waited or read the disk cache
+
             try:
-                # Look for JSON-like content in the output
-                json_start = result.stdout.find('{')
-                json_end = result.stdout.rfind('}') + 1
-                
-                if json_start >= 0 and json_end > json_start:
-                    json_content = result.stdout[json_start:json_end]
-                    credentials = json.loads(json_content)
-                else:
-                    raise ValueError("No JSON content found in script output")
-                
-            except json.JSONDecodeError as e:
-                self.logger.error(f"Failed to parse credentials JSON: {str(e)}")
-                self.logger.debug(f"JSON content attempted to parse: {json_content if 'json_content' in locals() else 'No JSON found'}")
+                credentials = self.provider.fetch()
+                if not self._validate_credentials(credentials):
+                    raise ValueError("Invalid credential format received")
+
+                self._credentials = credentials
+                self._last_refresh = datetime.now()
+                self._save_disk_cache(credentials)
+                self.logger.info(f"Credentials refreshed from {self.provider.name} provider")
+
+            except Exception as e:
+                self.logger.error(f"Error refreshing credentials: {str(e)}")
                 raise
-            
-            # Validate credential structure
+
+    def _refresh_quietly(self, force: bool = True) -> bool:
+        try:
+            self._refresh(force=force)
+            return True
+        except Exception:
+            return False
+
+    def _refresh_in_background(self):
+        """Start a refresh thread unless one has already been started"""
+        with self._background_lock:
+            if self._background_refresh:
+                return
+            self._background_refresh = True
+        threading.Thread(target=self._run_background_refresh, daemon=True,
+                         name='credentials-refresh').start()
+
+    def _run_background_refresh(self):
+        try:
+            # Not forced: a refresh that finished while this thread started is enough
+            self._refresh_quietly(force=False)
+        finally:
+            with self._background_lock:
+                self._background_refresh = False
+
+    def start_renewal(self):
+        """Renew credentials in the background before they expire.
+
+        Called by the process that runs collections, so jobs always find
+        valid credentials already loaded.
+        """
+        if self._renewal_thread and self._renewal_thread.is_alive():
+            return
+        self._stop_renewal.clear()
+        self._renewal_thread = threading.Thread(target=self._run_renewal, daemon=True,
+                                                name='credentials-renewal')
+        self._renewal_thread.start()
+
+    def stop_renewal(self):
+        self._stop_renewal.set()
+
+    def _run_renewal(self):
+        if not self._credentials:
+            self._load_disk_cache()
+
+        while not self._stop_renewal.is_set():
+            if self._credentials and self._last_refresh:
+                renew_at = self._last_refresh + self._refresh_interval - timedelta(seconds=CREDENTIAL_RENEW_BEFORE)
+                delay = (renew_at - datetime.now()).total_seconds()
+                if delay > 0:
+                    self._stop_renewal.wait(delay)
+                    continue
+
+            if not self._refresh_quietly():
+                self._stop_renewal.wait(CREDENTIAL_RETRY_INTERVAL)
+
+    def _cipher(self):
+        """Fernet cipher for the disk cache, or None when the cache is unavailable"""
+        if Fernet is None:
+            return None
+
+        key = os.environ.get('INFRAWEB_CREDENTIAL_KEY')
+        if not key:
+            try:
+                os.makedirs(os.path.dirname(CREDENTIAL_CACHE_KEY_FILE), mode=0o700, exist_ok=True)
+                if not os.path.exists(CREDENTIAL_CACHE_KEY_FILE):
+                    handle = os.open(CREDENTIAL_CACHE_KEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                    with os.fdopen(handle, 'wb') as f:
+                        f.write(Fernet.generate_key())
+                with open(CREDENTIAL_CACHE_KEY_FILE, 'rb') as f:
+                    key = f.read().strip()
+            except FileExistsError:
+                return self._cipher()  # Another process created the key first
+            except OSError as e:
+                self.logger.warning(f"Credential cache key unavailable: {str(e)}")
+                return None
+        return Fernet(key)
+
+    def _load_disk_cache(self) -> bool:
+        """Load credentials saved by a previous process if they are recent enough"""
+        cipher = self._cipher()
+        if cipher is None or not os.path.exists(CREDENTIAL_CACHE_FILE):
+            return False
+
+        try:
+            with open(CREDENTIAL_CACHE_FILE, 'rb') as f:
+                token = f.read()
+            credentials = json.loads(cipher.decrypt(token, ttl=CREDENTIAL_CACHE_TTL))
             if not self._validate_credentials(credentials):
-                raise ValueError("Invalid credential format received")
-            
-            self._credentials = credentials
-            self._last_refresh = datetime.now()
-            self.logger.info("Credentials refreshed successfully")
-            
-        except Exception as e:
-            self.logger.error(f"Error refreshing credentials: {str(e)}")
-            raise
+                return False
+        except InvalidToken:
+            self.logger.info("Cached credentials expired or unreadable, fetching new ones")
+            return False
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Error reading cached credentials: {str(e)}")
+            return False
+
+        with self._refresh_lock:
+            if not self._credentials:
+                self._credentials = credentials
+                self._last_refresh = datetime.fromtimestamp(cipher.extract_timestamp(token))
+        self.logger.info("Loaded credentials from the encrypted cache")
+        return True
+
+    def _save_disk_cache(self, credentials: Dict[str, Dict[str, str]]):
+        cipher = self._cipher()
+        if cipher is None:
+            return
+        try:
+            os.makedirs(CREDENTIAL_CACHE_DIR, mode=0o700, exist_ok=True)
+            tmp_path = f"{CREDENTIAL_CACHE_FILE}.{os.getpid()}.tmp"
+            handle = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(handle, 'wb') as f:
+                f.write(cipher.encrypt(json.dumps(credentials).encode()))
+            os.replace(tmp_path, CREDENTIAL_CACHE_FILE)
+        except OSError as e:
+            self.logger.warning(f"Error writing cached credentials: {str(e)}")
 
     def _validate_credentials(self, credentials: Dict) -> bool:
         """Validate the structure of retrieved credentials"""
@@ -121,21 +219,21 @@ class CredentialsManager:
                 if service not in credentials:
                     self.logger.error(f"Missing {service} credentials")
                     return False
-                
+
                 for field in required_fields:
                     if field not in credentials[service]:
                         self.logger.error(f"Missing {field} in {service} credentials")
                         return False
-                    
+
                     if not credentials[service][field]:
                         self.logger.error(f"Empty {field} in {service} credentials")
                         return False
 
             return True
-            
+
         except Exception as e:
             self.logger.error(f"Error validating credentials: {str(e)}")
             return False
 
 # Create singleton instance
-credentials_manager = CredentialsManager()
\ No newline at end of file
+credentials_manager = CredentialsManager()
@@ -0,0 +1,147 @@
+import os
+import json
+import subprocess
+import logging
+from typing import Dict
+from ...utils.config import (VCENTER_PASSWORD_ID, WINDOWS_PASSWORD_ID, CREDENTIAL_FILE,
+                             CREDENTIAL_KEYRING_SERVICE, CREDENTIAL_SCRIPT_TIMEOUT)
+
+try:
+    import keyring
+except ImportError:  # Only needed by the keyring provider
+    keyring = None
+
+SERVICES = ('vcenter', 'windows')
+
+class CredentialProvider:
+    """Source of vCenter and Windows credentials.
+
+    ``fetch`` returns ``{'vcenter': {'username', 'password'}, 'windows': {...}}``
+    and raises on failure. Providers do no caching of their own; the
+    credentials manager decides when to call them.
+    """
+
+    name = 'base'
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+
+    def fetch(self) -> Dict[str, Dict[str, str]]:
+        raise NotImplementedError
+
+class PowerShellProvider(CredentialProvider):
+    """Runs scripts/credential_script.ps1, which reads the password API"""
+
+    name = 'powershell'
+
+    def __init__(self, script_path: str = None):
+        super().__init__()
+        self.script_path = script_path or os.path.join(
+            os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))),
+            'scripts',
+            'credential_script.ps1'
+        )
+
+    def fetch(self) -> Dict[str, Dict[str, str]]:
+        # Verify script exists
+        if not os.path.exists(self.script_path):
+            self.logger.error(f"PowerShell script not found at: {self.script_path}")
+            raise FileNotFoundError(f"Script not found: {self.script_path}")
+
+        command = [
+            "powershell",
+            "-ExecutionPolicy",
+            "Bypass",
+            "-File",
+            self.script_path,
+            "-VCenterPasswordId",
+            VCENTER_PASSWORD_ID,
+            "-WindowsPasswordId",
+            WINDOWS_PASSWORD_ID
+        ]
+        self.logger.debug(f"Executing command: {' '.join(command)}")
+
+        result = subprocess.run(command, capture_output=True, text=True,
+                                timeout=CREDENTIAL_SCRIPT_TIMEOUT)
+
+        if result.stderr:
+            self.logger.warning(f"PowerShell stderr: {result.stderr}")
+
+        if result.returncode != 0:
+            raise subprocess.CalledProcessError(
+                result.returncode,
+                command,
+                result.stdout,
+                result.stderr
+            )
+
+        # The script may print progress before the JSON document
+        json_start = result.stdout.find('{')
+        json_end = result.stdout.rfind('}') + 1
+        if json_start < 0 or json_end <= json_start:
+            raise ValueError("No JSON content found in script output")
+        return json.loads(result.stdout[json_start:json_end])
+
+class EnvironmentProvider(CredentialProvider):
+    """Reads INFRAWEB_VCENTER_USERNAME, INFRAWEB_VCENTER_PASSWORD, INFRAWEB_WINDOWS_USERNAME, ..."""
+
+    name = 'env'
+
+    def fetch(self) -> Dict[str, Dict[str, str]]:
+        return {service: {
+            'username': os.environ.get(f'INFRAWEB_{service.upper()}_USERNAME', ''),
+            'password': os.environ.get(f'INFRAWEB_{service.upper()}_PASSWORD', '')
+        } for service in SERVICES}
+
+class FileProvider(CredentialProvider):
+    """Reads a JSON document in the same shape the PowerShell script prints"""
+
+    name = 'file'
+
+    def __init__(self, path: str = CREDENTIAL_FILE):
+        super().__init__()
+        self.path = path
+
+    def fetch(self) -> Dict[str, Dict[str, str]]:
+        with open(self.path, 'r') as f:
+            return json.load(f)
+
+class KeyringProvider(CredentialProvider):
+    """Reads usernames and passwords from the OS keyring (Windows Credential Manager, Keychain, Secret Service).
+
+    Entries are stored under CREDENTIAL_KEYRING_SERVICE with the user names
+    ``vcenter_username``, ``vcenter_password``, ``windows_username`` and
+    ``windows_password``.
+    """
+
+    name = 'keyring'
+
+    def fetch(self) -> Dict[str, Dict[str, str]]:
+        if keyring is None:
+            raise RuntimeError("The keyring provider needs the keyring package")
+        return {service: {
+            field: keyring.get_password(CREDENTIAL_KEYRING_SERVICE, f'{service}_{field}') or ''
+            for field in ('username', 'password')
+        } for service in SERVICES}
+
+class StaticProvider(CredentialProvider):
+    """Fixed credentials for local development and tests; never talks to anything"""
+
+    name = 'static'
+
+    def __init__(self, credentials: Dict[str, Dict[str, str]] = None):
+        super().__init__()
+        self.credentials = credentials or {service: {'username': f'{service}-user', 'password': 'changeme'}
+                                           for service in SERVICES}
+
+    def fetch(self) -> Dict[str, Dict[str, str]]:
+        return {service: dict(values) for service, values in self.credentials.items()}
+
+PROVIDERS = {provider.name: provider for provider in
+             (PowerShellProvider, EnvironmentProvider, FileProvider, KeyringProvider, StaticProvider)}
+
+def get_provider(name: str) -> CredentialProvider:
+    """Build the provider configured by name"""
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown credential provider '{name}', expected one of {', '.join(PROVIDERS)}")
+    return PROVIDERS[name]()
@@ -1,106 +1,271 @@
+import time
+from collections import Counter
 from datetime import datetime
-from typing import List, Dict, Any
-from ...models import db
-from ...models.infra import Hosts, Clusters, VirtualMachines, Snapshots
-from ..vcenter.collector import VCenterCollector
+from typing import List, Dict, Any, Iterable, Optional
+from ...models.infra import db, row_hash, stored_value, Hosts, Clusters, VirtualMachines, Snapshots, VCenterInfo, AffinityRule, WindowsVMs
+from ..cache import cache_manager
+from ..metrics import metrics
 import logging
 
+def _columns(model, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop collected fields that have no column in the model"""
+    names = model.__table__.columns.keys()
+    return {key: value for key, value in data.items() if key in names}
+
+def _with_row_hash(model, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Add the content hash list pages key their cached row fragments on"""
+    return {**data, 'RowHash': row_hash(model, data)}
+
+# Columns identifying the vCenter and cluster a row was collected from, for scoped refreshes
+SCOPE_COLUMNS = {
+    Hosts: ('VCenter', 'Cluster'),
+    Clusters: ('VCenter', 'ClusterName'),
+    VirtualMachines: ('VCenter', 'Cluster'),
+    Snapshots: ('vcenter', 'cluster'),
+    VCenterInfo: ('hostname', None),
+    AffinityRule: ('vcenter', 'cluster')
+}
+
+ROWS_WRITTEN = metrics.counter('infraweb_db_rows_written_total', 'Rows written per table', ('table',))
+WRITE_DURATION = metrics.histogram('infraweb_db_write_duration_seconds', 'Time to replace a table\'s rows', ('table',))
+
 class DatabaseManager:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
+        # Collected result key -> (update method, table name). Update methods only stage rows in
+        # the session; perform_full_update bumps generations and commits them together.
+        self.table_updates = {
+            'hosts_data': (self.update_hosts, 'hosts'),
+            'clusters_data': (self.update_clusters, 'clusters'),
+            'vms_data': (self.update_virtual_machines, 'virtual_machines'),
+            'snapshots_data': (self.update_snapshots, 'snapshots'),
+            'vcenter_info': (self.update_vcenter_info, 'vcenter_details'),
+            'affinity_rules': (self.update_affinity_rules, 'affinity_rules'),
+            'windows_vms': (self.update_windows_vms, 'windows_vms')
+        }
+
+    def _scoped(self, model, scope: Optional[Dict[str, Any]] = None):
+        """The rows a refresh replaces: all of them, or only those of one vCenter or cluster.
+
+        A scope's ``keep_vcenters`` leaves the rows of those vCenters out, so
+        they are neither compared nor replaced.
+        """
+        query = model.query
+        vcenter_column, cluster_column = SCOPE_COLUMNS[model]
+        if scope and scope.get('vcenter'):
+            query = query.filter(getattr(model, vcenter_column) == scope['vcenter'])
+        if scope and scope.get('keep_vcenters'):
+            column = getattr(model, vcenter_column)
+            query = query.filter(column.is_(None) | column.notin_(scope['keep_vcenters']))
+        if scope and scope.get('cluster') and cluster_column:
+            query = query.filter(getattr(model, cluster_column) == scope['cluster'])
+        return query
+
+    def _replace(self, model, rows: List[Dict[str, Any]], scope: Optional[Dict[str, str]] = None) -> bool:
+        """Replace the scoped rows of a table, unless they already hold the same content.
 
-    def update_hosts(self, hosts_data: List[Dict[str, Any]]) -> bool:
-        """Update hosts table with new data"""
+        Returns whether anything was written. Rows are compared as multisets
+        of content hashes, read from RowHash where the table stores it, so an
+        unchanged refresh keeps the table's generation and with it every
+        cached view, ETag and artifact.
+        """
+        query = self._scoped(model, scope)
+        if 'RowHash' in model.__table__.columns:
+            existing = Counter(digest for digest, in query.with_entities(model.RowHash))
+        else:
+            existing = Counter(row_hash(model, row._asdict())
+                               for row in query.with_entities(*model.__table__.columns))
+        if existing == Counter(row.get('RowHash') or row_hash(model, row) for row in rows):
+            return False
+
+        query.delete(synchronize_session=False)
+        db.session.add_all(model(**row) for row in rows)
+        return True
+
+    def update_hosts(self, hosts_data: List[Dict[str, Any]], scope: Optional[Dict[str, str]] = None) -> bool:
+        """Update hosts table with new data; returns whether it changed"""
         try:
-            # Clear existing data
-            Hosts.query.delete()
-            
-            # Insert new data
-            for host_data in hosts_data:
-                host = Hosts(**host_data)
-                db.session.add(host)
-            
-            db.session.commit()
-            self.logger.info(f"Successfully updated {len(hosts_data)} hosts")
-            return True
+            changed = self._replace(Hosts, [_with_row_hash(Hosts, _columns(Hosts, host_data))
+                                            for host_data in hosts_data], scope)
+            self.logger.info(f"Staged {len(hosts_data)} hosts, {'changed' if changed else 'unchanged'}")
+            return changed
         except Exception as e:
             self.logger.error(f"Error updating hosts: {str(e)}")
-            db.session.rollback()
-            return False
+            raise
 
-    def update_clusters(self, clusters_data: List[Dict[str, Any]]) -> bool:
-        """Update clusters table with new data"""
+    def update_clusters(self, clusters_data: List[Dict[str, Any]], scope: Optional[Dict[str, str]] = None) -> bool:
+        """Update clusters table with new data; returns whether it changed"""
         try:
-            Clusters.query.delete()
-            
-            for cluster_data in clusters_data:
-                cluster = Clusters(**cluster_data)
-                db.session.add(cluster)
-            
-            db.session.commit()
-            self.logger.info(f"Successfully updated {len(clusters_data)} clusters")
-            return True
+            changed = self._replace(Clusters, [_columns(Clusters, cluster_data)
+                                               for cluster_data in clusters_data], scope)
+            self.logger.info(f"Staged {len(clusters_data)} clusters, {'changed' if changed else 'unchanged'}")
+            return changed
         except Exception as e:
             self.logger.error(f"Error updating clusters: {str(e)}")
-            db.session.rollback()
-            return False
+            raise
 
-    def update_virtual_machines(self, vms_data: List[Dict[str, Any]]) -> bool:
-        """Update virtual machines table with new data"""
+    def update_virtual_machines(self, vms_data: List[Dict[str, Any]], scope: Optional[Dict[str, str]] = None) -> bool:
+        """Update virtual machines table with new data; returns whether it changed"""
         try:
-            VirtualMachines.query.delete()
-            
-            for vm_data in vms_data:
-                vm = VirtualMachines(**vm_data)
-                db.session.add(vm)
-            
-            db.session.commit()
-            self.logger.info(f"Successfully updated {len(vms_data)} virtual machines")
-            return True
+            rows = [_with_row_hash(VirtualMachines, _columns(VirtualMachines, vm_data)) for vm_data in vms_data]
+            changed = self._replace(VirtualMachines, rows, scope)
+            self.logger.info(f"Staged {len(vms_data)} virtual machines, {'changed' if changed else 'unchanged'}")
+            return changed
         except Exception as e:
             self.logger.error(f"Error updating virtual machines: {str(e)}")
-            db.session.rollback()
-            return False
+            raise
 
-    def update_snapshots(self, snapshots_data: List[Dict[str, Any]]) -> bool:
-        """Update snapshots table with new data"""
+    def update_snapshots(self, snapshots_data: List[Dict[str, Any]], scope: Optional[Dict[str, str]] = None) -> bool:
+        """Update snapshots table with new data; returns whether it changed"""
         try:
-            Snapshots.query.delete()
-            
-            for snapshot_data in snapshots_data:
-                snapshot = Snapshots(**snapshot_data)
-                db.session.add(snapshot)
-            
-            db.session.commit()
-            self.logger.info(f"Successfully updated {len(snapshots_data)} snapshots")
-            return True
+            changed = self._replace(Snapshots, [_columns(Snapshots, snapshot_data)
+                                                for snapshot_data in snapshots_data], scope)
+            self.logger.info(f"Staged {len(snapshots_data)} snapshots, {'changed' if changed else 'unchanged'}")
+            return changed
         except Exception as e:
             self.logger.error(f"Error updating snapshots: {str(e)}")
-            db.session.rollback()
-            return False
+            raise
 
-    def perform_full_update(self, vcenter_data: Dict[str, List[Dict[str, Any]]]) -> bool:
-        """Perform a full update of all tables"""
+    def update_vcenter_info(self, vcenter_info_data: List[Dict[str, Any]], scope: Optional[Dict[str, str]] = None) -> bool:
+        """Update vCenter details table with new data; returns whether it changed.
+
+        Every run records when each vCenter was checked, so it always does.
+        """
+        try:
+            rows = []
+            for vcenter_info in vcenter_info_data:
+                # Get SSL certificate info from certificates list
+                ssl_cert = next((cert for cert in vcenter_info.get('certificates', [])
+                                 if cert['type'] == 'SSL Certificate'), {})
+
+                ssl_expiration = None
+                if ssl_cert.get('expiration') and 'T' in ssl_cert['expiration']:
+                    try:
+                        ssl_expiration = datetime.strptime(ssl_cert['expiration'].split('.')[0],
+                                                           '%Y-%m-%dT%H:%M:%S')
+                    except ValueError as e:
+                        self.logger.error(f"Error parsing SSL expiration: {e}")
+
+                rows.append({**_columns(VCenterInfo, vcenter_info),
+                             'ssl_certificate_expiration': ssl_expiration,
+                             'ssl_issuer': ssl_cert.get('issuer'),
+                             'ssl_subject': ssl_cert.get('subject'),
+                             'status': vcenter_info.get('status', 'connected'),
+                             'last_checked': datetime.utcnow()})
+
+            changed = self._replace(VCenterInfo, rows, scope)
+            self.logger.info(f"Staged {len(vcenter_info_data)} vCenters")
+            return changed
+        except Exception as e:
+            self.logger.error(f"Error updating vCenter details: {str(e)}")
+            raise
+
+    def update_affinity_rules(self, rules_data: List[Dict[str, Any]], scope: Optional[Dict[str, str]] = None) -> bool:
+        """Update affinity rules table with new data; returns whether it changed.
+
+        Every run records when each rule was checked, so it always does.
+        """
+        try:
+            changed = self._replace(AffinityRule, [{**_columns(AffinityRule, rule_data),
+                                                    'last_checked': datetime.utcnow()}
+                                                   for rule_data in rules_data], scope)
+            self.logger.info(f"Staged {len(rules_data)} affinity rules")
+            return changed
+        except Exception as e:
+            self.logger.error(f"Error updating affinity rules: {str(e)}")
+            raise
+
+    def _normalise_row(self, model, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert values to what the columns read back as, so unchanged rows compare equal"""
+        columns = model.__table__.columns
+        return {key: stored_value(columns[key], value) for key, value in _columns(model, data).items()}
+
+    def update_windows_vms(self, vms_data: List[Dict[str, Any]], scope: Optional[Dict[str, Any]] = None) -> bool:
+        """Upsert Windows guest rows, touching only rows that changed.
+
+        Rows are keyed by vCenter and MoRef, since VM names are not unique
+        across vCenters; VMs missing from ``vms_data`` (no longer powered on,
+        or no longer Windows) are removed, as are duplicate rows of one VM.
+        Windows rows are collected across every vCenter at once, so the
+        update is never scoped to one, but the rows of a scope's
+        ``keep_vcenters``, whose VMs could not be probed, are never removed.
+        """
+        keep = set((scope or {}).get('keep_vcenters', ()))
         try:
-            # Start transaction
-            db.session.begin()
-            
-            # Update each table
-            success = all([
-                self.update_hosts(vcenter_data.get('hosts_data', [])),
-                self.update_clusters(vcenter_data.get('clusters_data', [])),
-                self.update_virtual_machines(vcenter_data.get('vms_data', [])),
-                self.update_snapshots(vcenter_data.get('snapshots_data', []))
-            ])
-            
-            if success:
-                db.session.commit()
-                self.logger.info("Full database update completed successfully")
-                return True
-            else:
-                raise Exception("One or more updates failed")
-                
+            existing = {}
+            changed = 0
+            for vm in WindowsVMs.query.all():
+                key = (vm.VCenter, vm.MoRef)
+                if key in existing:
+                    db.session.delete(vm)
+                    changed += 1
+                else:
+                    existing[key] = vm
+            seen = set()
+
+            for data in (self._normalise_row(WindowsVMs, row) for row in vms_data):
+                key = (data['VCenter'], data['MoRef'])
+                seen.add(key)
+                vm = existing.get(key)
+                if vm is None:
+                    db.session.add(WindowsVMs(**data))
+                    changed += 1
+                elif any(getattr(vm, column) != value for column, value in data.items()):
+                    for column, value in data.items():
+                        setattr(vm, column, value)
+                    changed += 1
+
+            for key, vm in existing.items():
+                if key not in seen and key[0] not in keep:
+                    db.session.delete(vm)
+                    changed += 1
+
+            self.logger.info(f"Staged Windows VMs, {changed} of {len(vms_data)} rows changed")
+            return changed > 0
         except Exception as e:
-            self.logger.error(f"Error during full update: {str(e)}")
+            self.logger.error(f"Error updating Windows VMs: {str(e)}")
+            raise
+
+    def perform_full_update(self, vcenter_data: Dict[str, List[Dict[str, Any]]],
+                            source: str = 'scheduler', scope: Optional[Dict[str, str]] = None,
+                            failed_vcenters: Iterable[str] = ()) -> bool:
+        """Update every table present in the collected data.
+
+        All tables are written, and their generations bumped, in one
+        transaction: readers see either the old data under the old generation
+        or the new data under the new one, and a failure commits nothing.
+        Tables whose key is missing (because their data class was not collected
+        in this run) are left untouched and keep their generation, and so do
+        tables whose collected rows match what is stored. With a
+        ``scope`` ({'vcenter': host} and/or {'cluster': name}) only the rows of
+        that vCenter or cluster are replaced. The rows of ``failed_vcenters``,
+        which returned nothing because they could not be collected, are kept.
+        """
+        failed_vcenters = tuple(failed_vcenters)
+        if failed_vcenters:
+            scope = {**(scope or {}), 'keep_vcenters': failed_vcenters}
+        try:
+            updates = [(key, method, table) for key, (method, table) in self.table_updates.items()
+                       if key in vcenter_data]
+
+            # Stage every table, then bump the generations of those that changed in the same transaction
+            changed = []
+            for key, method, table in updates:
+                start = time.perf_counter()
+                if method(vcenter_data[key], scope):
+                    changed.append(table)
+                    ROWS_WRITTEN.inc(len(vcenter_data[key]), table=table)
+                WRITE_DURATION.observe(time.perf_counter() - start, table=table)
+
+            if changed:
+                cache_manager.bump_generation(changed, source=source)
+            db.session.commit()
+            unchanged = [table for _, _, table in updates if table not in changed]
+            self.logger.info(f"Database update completed successfully, changed: {', '.join(changed) or 'none'}"
+                             + (f", unchanged: {', '.join(unchanged)}" if unchanged else ''))
+            return True
+
+        except Exception as e:
+            self.logger.error(f"Error during full update, nothing was committed: {str(e)}")
             db.session.rollback()
-            return False
\ No newline at end of file
+            return False
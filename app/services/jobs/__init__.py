@@ -0,0 +1,4 @@
+from .manager import job_queue, parse_scope
+
+# Export the singleton instance
+__all__ = ['job_queue', 'parse_scope']
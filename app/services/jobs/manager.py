@@ -0,0 +1,258 @@
+import os
+import json
+import socket
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy import text
+from ...models.infra import db, CollectionJob, CollectorHeartbeat, Clusters
+from ...utils.config import COLLECTOR_POLL_INTERVAL, VCENTERS
+from ..metrics import metrics
+
+SCOPE_KINDS = ('vcenter', 'cluster')
+
+def parse_scope(scope: str) -> Dict[str, str]:
+    """Turn 'all', 'vcenter:<host>' or 'cluster:<name>' into a scope filter.
+
+    A cluster scope also carries the cluster's vCenter when the inventory
+    already knows it. Raises ValueError for anything else.
+    """
+    if scope == 'all':
+        return {}
+
+    kind, _, name = scope.partition(':')
+    if kind not in SCOPE_KINDS or not name:
+        raise ValueError(f"Invalid scope '{scope}', expected all, vcenter:<host> or cluster:<name>")
+
+    if kind == 'vcenter':
+        if name not in [vcenter['host'] for vcenter in VCENTERS]:
+            raise ValueError(f"Unknown vCenter {name}")
+        return {'vcenter': name}
+
+    cluster = Clusters.query.filter_by(ClusterName=name).first()
+    if not cluster:
+        raise ValueError(f"Unknown cluster {name}")
+    return {'cluster': name, 'vcenter': cluster.VCenter} if cluster.VCenter else {'cluster': name}
+
+def scope_covers(outer: Dict[str, str], inner: Dict[str, str]) -> bool:
+    """Whether refreshing ``outer`` also refreshes everything in ``inner``"""
+    return all(inner.get(key) == value for key, value in outer.items())
+
+class JobQueue:
+    """SQLite-backed control channel between the web tier and the collector process.
+
+    The web tier enqueues jobs and reads their progress; the collector claims
+    queued jobs, reports progress and marks them finished. Committed data is
+    announced through the data generation table, which the cache layer
+    already watches.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+
+    def _lock(self):
+        """Take SQLite's write lock before reading the queue.
+
+        Web workers enqueue concurrently; holding the lock across the read and
+        the insert means two identical requests can never both create a job.
+        """
+        db.session.execute(text("UPDATE collection_jobs SET id = id WHERE 0"))
+
+    def enqueue(self, scope: str = 'all', requested_by: str = 'web') -> Tuple[CollectionJob, bool]:
+        """Queue a collection run, coalescing it with jobs already in flight.
+
+        Returns the job that will satisfy the request and whether the request
+        was coalesced. A queued or running job whose scope covers the request
+        absorbs it; a new wider request widens the oldest queued narrower job
+        and merges any other queued jobs it covers.
+        """
+        wanted = parse_scope(scope)
+        try:
+            self._lock()
+            in_flight = (CollectionJob.query.filter(CollectionJob.status.in_(['queued', 'running']))
+                         .order_by(CollectionJob.requested_at).all())
+            # Only the incoming scope is validated; a stored one can stop parsing, e.g. when its
+            # cluster disappears from the inventory, and must not block every new request
+            scopes = {}
+            for job in in_flight:
+                try:
+                    scopes[job.id] = parse_scope(job.scope)
+                except ValueError as e:
+                    self.logger.warning(f"Not coalescing with job {job.id}: {str(e)}")
+            in_flight = [job for job in in_flight if job.id in scopes]
+
+            for job in in_flight:
+                if scope_covers(scopes[job.id], wanted):
+                    job.request_count = (job.request_count or 1) + 1
+                    db.session.commit()
+                    self.logger.info(f"Coalesced {scope} request from {requested_by} into job {job.id}")
+                    return job, True
+
+            covered = [job for job in in_flight
+                       if job.status == 'queued' and scope_covers(wanted, scopes[job.id])]
+            if covered:
+                job = covered[0]
+                job.scope = scope
+                job.request_count = sum((other.request_count or 1) for other in covered) + 1
+                for other in covered[1:]:
+                    other.status = 'merged'
+                    other.merged_into = job.id
+                    other.finished_at = datetime.utcnow()
+                db.session.commit()
+                self.logger.info(f"Widened job {job.id} to {scope} for {requested_by}")
+                return job, True
+
+            job = CollectionJob(scope=scope, status='queued', requested_by=requested_by,
+                                requested_at=datetime.utcnow(), request_count=1,
+                                progress=json.dumps({}))
+            db.session.add(job)
+            db.session.commit()
+            self.logger.info(f"Queued collection job {job.id} ({scope}) for {requested_by}")
+            return job, False
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Get a job as a JSON-serialisable dict"""
+        job = db.session.get(CollectionJob, job_id)
+        return self.to_dict(job) if job else None
+
+    def to_dict(self, job: CollectionJob) -> Dict[str, Any]:
+        progress = json.loads(job.progress) if job.progress else {}
+        return {
+            'id': job.id,
+            'scope': job.scope,
+            'status': job.status,
+            'requested_by': job.requested_by,
+            'request_count': job.request_count or 1,
+            'merged_into': job.merged_into,
+            'requested_at': job.requested_at.isoformat() if job.requested_at else None,
+            'started_at': job.started_at.isoformat() if job.started_at else None,
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+            'progress': progress,
+            'completion': self._completion(job, progress),
+            'error_message': job.error_message
+        }
+
+    def _completion(self, job: CollectionJob, progress: Dict[str, Any]) -> Dict[str, Any]:
+        """Per-vCenter completion and an estimate of the time remaining"""
+        done = len(progress.get('vcenters', {}))
+        total = progress.get('total_vcenters') or 0
+        completion = {
+            'vcenters_done': done,
+            'vcenters_total': total,
+            'percent': round(done / total * 100, 1) if total else (100.0 if job.status == 'succeeded' else 0.0),
+            'eta_seconds': None
+        }
+
+        if job.status != 'running' or not job.started_at:
+            return completion
+
+        elapsed = (datetime.utcnow() - job.started_at).total_seconds()
+        if done and total:
+            completion['eta_seconds'] = round(elapsed / done * (total - done))
+        else:
+            # Nothing finished yet: go by recent runs of the same scope
+            previous = (CollectionJob.query
+                        .filter_by(scope=job.scope, status='succeeded')
+                        .order_by(CollectionJob.finished_at.desc()).limit(5).all())
+            durations = [(p.finished_at - p.started_at).total_seconds()
+                         for p in previous if p.started_at and p.finished_at]
+            if durations:
+                completion['eta_seconds'] = max(round(sum(durations) / len(durations) - elapsed), 0)
+        return completion
+
+    def claim_next(self) -> Optional[CollectionJob]:
+        """Atomically move the oldest queued job to running"""
+        job = (CollectionJob.query.filter_by(status='queued')
+               .order_by(CollectionJob.requested_at).first())
+        if not job:
+            return None
+
+        claimed = (CollectionJob.query
+                   .filter_by(id=job.id, status='queued')
+                   .update({'status': 'running', 'started_at': datetime.utcnow()}))
+        db.session.commit()
+        if not claimed:
+            return None
+
+        db.session.refresh(job)
+        self.logger.info(f"Claimed collection job {job.id} ({job.scope})")
+        return job
+
+    def update_progress(self, job_id: int, **progress):
+        """Merge new keys into the job's progress document"""
+        try:
+            job = db.session.get(CollectionJob, job_id)
+            document = json.loads(job.progress) if job.progress else {}
+            document.update(progress)
+            document['updated_at'] = datetime.utcnow().isoformat()
+            job.progress = json.dumps(document)
+            db.session.commit()
+        except Exception as e:
+            self.logger.error(f"Error updating progress for job {job_id}: {str(e)}")
+            db.session.rollback()
+
+    def finish(self, job_id: int, success: bool, error_message: Optional[str] = None):
+        """Mark a job as succeeded or failed"""
+        job = db.session.get(CollectionJob, job_id)
+        job.status = 'succeeded' if success else 'failed'
+        job.finished_at = datetime.utcnow()
+        job.error_message = error_message
+        db.session.commit()
+        self.logger.info(f"Collection job {job_id} {job.status}")
+
+    def fail_orphaned(self) -> int:
+        """Fail jobs left running by a collector that crashed or was killed"""
+        count = (CollectionJob.query.filter_by(status='running')
+                 .update({'status': 'failed', 'finished_at': datetime.utcnow(),
+                          'error_message': 'Collector stopped while the job was running'}))
+        db.session.commit()
+        if count:
+            self.logger.warning(f"Marked {count} orphaned collection jobs as failed")
+        return count
+
+    def depth(self) -> Dict[Tuple[str], int]:
+        """Queued and running jobs, for the queue depth gauge"""
+        counts = dict(db.session.query(CollectionJob.status, db.func.count(CollectionJob.id))
+                      .filter(CollectionJob.status.in_(['queued', 'running']))
+                      .group_by(CollectionJob.status).all())
+        return {(status,): counts.get(status, 0) for status in ('queued', 'running')}
+
+    def heartbeat(self, current_job_id: Optional[int] = None):
+        """Record that the collector process is alive"""
+        try:
+            beat = db.session.get(CollectorHeartbeat, 1)
+            now = datetime.utcnow()
+            if not beat or beat.pid != os.getpid():
+                beat = beat or CollectorHeartbeat(id=1)
+                beat.hostname = socket.gethostname()
+                beat.pid = os.getpid()
+                beat.started_at = now
+                db.session.add(beat)
+            beat.last_seen = now
+            beat.current_job_id = current_job_id
+            db.session.commit()
+        except Exception as e:
+            self.logger.error(f"Error writing collector heartbeat: {str(e)}")
+            db.session.rollback()
+
+    def collector_status(self) -> Dict[str, Any]:
+        """Report whether a collector process is alive and what it is doing"""
+        beat = db.session.get(CollectorHeartbeat, 1)
+        if not beat:
+            return {'alive': False}
+        return {
+            'alive': datetime.utcnow() - beat.last_seen < timedelta(seconds=COLLECTOR_POLL_INTERVAL * 6),
+            'hostname': beat.hostname,
+            'pid': beat.pid,
+            'started_at': beat.started_at.isoformat() if beat.started_at else None,
+            'last_seen': beat.last_seen.isoformat() if beat.last_seen else None,
+            'current_job_id': beat.current_job_id
+        }
+
+# Create singleton instance
+job_queue = JobQueue()
+
+metrics.gauge('infraweb_collection_jobs', 'Collection jobs waiting or running', ('status',), job_queue.depth)
@@ -0,0 +1,5 @@
+from .registry import metrics, Counter, Histogram, Gauge
+from .routes import metrics_bp
+
+# Export the singleton instance
+__all__ = ['metrics', 'metrics_bp', 'Counter', 'Histogram', 'Gauge']
@@ -0,0 +1,350 @@
+import os
+import json
+import time
+import atexit
+import bisect
+import threading
+import logging
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from ...utils.config import METRICS_DIR, METRICS_FLUSH_INTERVAL, METRICS_STALE_AFTER
+from ...utils.locks import file_lock
+
+# Seconds; covers fast SOAP calls up to full collection runs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# Final values of exited processes, kept so totals survive worker recycling
+RETIRED_SNAPSHOT = 'retired.json'
+
+class Metric:
+    """Base for metrics whose values live in per-thread shards.
+
+    Recording only touches the calling thread's own dict, so the hot path
+    takes no lock; shards are summed when the registry is scraped. Shards of
+    threads that have exited are folded into ``_retired`` at scrape time.
+    """
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards: List[Tuple[threading.Thread, Dict]] = []
+        self._retired: Dict[Tuple, object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def _shard(self) -> Dict:
+        try:
+            return self._local.values
+        except AttributeError:
+            values = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), values))
+            self._local.values = values
+            return values
+
+    def _merge(self, into: Dict, key: Tuple, value):
+        raise NotImplementedError
+
+    def values(self) -> Dict[Tuple, object]:
+        """Sum every shard into one value per label set"""
+        with self._lock:
+            live = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    live.append((thread, shard))
+                else:
+                    for key, value in list(shard.items()):
+                        self._merge(self._retired, key, value)
+            self._shards = live
+            merged = {}
+            for key, value in self._retired.items():
+                self._merge(merged, key, value)
+        for _, shard in live:
+            # list() copies the items without releasing the GIL, so writers never break the iteration
+            for key, value in list(shard.items()):
+                self._merge(merged, key, value)
+        return merged
+
+    def reset(self):
+        """Forget all values, e.g. in a freshly forked worker"""
+        with self._lock:
+            self._shards = []
+            self._retired = {}
+            self._local = threading.local()
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def _merge(self, into: Dict, key: Tuple, value):
+        into[key] = into.get(key, 0) + value
+
+class Histogram(Metric):
+    """Histogram with fixed buckets; each value is [count per bucket..., +Inf count, sum]"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        entry = shard.get(key)
+        if entry is None:
+            entry = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        entry[bisect.bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+    def time(self, **labels) -> '_Timer':
+        """Context manager observing the duration of its block"""
+        return _Timer(self, labels)
+
+    def _merge(self, into: Dict, key: Tuple, value):
+        entry = into.get(key)
+        if entry is None:
+            into[key] = list(value)
+        else:
+            for i, v in enumerate(value):
+                entry[i] += v
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+class Gauge:
+    """Value computed at scrape time by a callback returning {label tuple: value}"""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str], func: Callable[[], Dict[Tuple, float]]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.func = func
+
+class MetricsRegistry:
+    """Process-wide metrics, exposed in the Prometheus text format.
+
+    Web workers and the collector are separate processes, so every process
+    periodically writes its values to METRICS_DIR and a scrape of any worker
+    sums its own live values with the other processes' recent snapshots.
+    Snapshots of processes that stopped writing for METRICS_STALE_AFTER
+    seconds are folded into RETIRED_SNAPSHOT, so counters and histograms
+    keep counting what recycled workers recorded instead of moving
+    backwards, which Prometheus would read as a reset.
+    """
+
+    def __init__(self, metrics_dir: str = METRICS_DIR):
+        self.logger = logging.getLogger(__name__)
+        self.metrics_dir = metrics_dir
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        self._flush_at_exit = False
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str],
+              func: Callable[[], Dict[Tuple, float]]) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, func))
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """This process's counters and histograms in a JSON-serialisable form"""
+        return {
+            metric.name: {'samples': [[list(key), value] for key, value in metric.values().items()]}
+            for metric in list(self._metrics.values()) if isinstance(metric, Metric)
+        }
+
+    @property
+    def _snapshot_path(self) -> str:
+        return os.path.join(self.metrics_dir, f"{os.getpid()}.json")
+
+    def flush(self):
+        """Write this process's snapshot for the other processes to read"""
+        try:
+            os.makedirs(self.metrics_dir, exist_ok=True)
+            _write_atomic(self._snapshot_path, self.snapshot())
+        except OSError as e:
+            self.logger.warning(f"Error writing metrics snapshot: {str(e)}")
+
+    def _other_snapshots(self) -> List[Dict[str, Dict]]:
+        """Recent snapshots of the other processes, plus the retired values of exited ones"""
+        snapshots = []
+        if not os.path.isdir(self.metrics_dir):
+            return snapshots
+        cutoff = time.time() - METRICS_STALE_AFTER
+        own = os.path.basename(self._snapshot_path)
+        retired_path = os.path.join(self.metrics_dir, RETIRED_SNAPSHOT)
+
+        # Every process folds under the same lock, so an exited process is counted exactly once
+        with file_lock(os.path.join(self.metrics_dir, 'retire.lock')):
+            retired = _read_snapshot(retired_path) or {}
+            exited = []
+            for filename in os.listdir(self.metrics_dir):
+                if filename in (own, RETIRED_SNAPSHOT) or not filename.endswith('.json'):
+                    continue
+                path = os.path.join(self.metrics_dir, filename)
+                try:
+                    stale = os.path.getmtime(path) < cutoff
+                except OSError:
+                    continue
+                snapshot = _read_snapshot(path)
+                if snapshot is None:
+                    continue  # Removed or being replaced by its owner
+                if stale:
+                    _fold(retired, snapshot)
+                    exited.append(path)
+                else:
+                    snapshots.append(snapshot)
+
+            if exited:
+                try:
+                    _write_atomic(retired_path, retired)
+                    for path in exited:
+                        os.remove(path)
+                except OSError as e:
+                    self.logger.warning(f"Error retiring metrics snapshots: {str(e)}")
+                    retired = _read_snapshot(retired_path) or {}
+
+        snapshots.append(retired)
+        return snapshots
+
+    def start_flushing(self):
+        """Write snapshots in the background so scrapes of other processes see this one"""
+        if self._flusher and self._flusher.is_alive():
+            return
+        if not self._flush_at_exit:
+            atexit.register(self.flush)  # Leave the final values for retirement; inherited by forks
+            self._flush_at_exit = True
+        self._flusher = threading.Thread(target=self._run_flusher, daemon=True, name='metrics-flush')
+        self._flusher.start()
+
+    def _run_flusher(self):
+        while True:
+            self.flush()
+            time.sleep(METRICS_FLUSH_INTERVAL)
+
+    def _after_fork(self):
+        """Start a forked worker from zero, with its own flush thread if the parent had one"""
+        had_flusher = self._flusher is not None
+        self._flusher = None
+        for metric in self._metrics.values():
+            if isinstance(metric, Metric):
+                metric.reset()
+        if had_flusher:
+            self.start_flushing()
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        others = self._other_snapshots()
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+
+            if isinstance(metric, Gauge):
+                try:
+                    values = metric.func()
+                except Exception as e:
+                    self.logger.error(f"Error computing {metric.name}: {str(e)}")
+                    continue
+                for key, value in values.items():
+                    lines.append(f"{metric.name}{_labels(metric.labelnames, key)} {_number(value)}")
+                continue
+
+            values = metric.values()
+            for snapshot in others:
+                for key, value in snapshot.get(metric.name, {}).get('samples', []):
+                    metric._merge(values, tuple(key), value)
+
+            for key, value in sorted(values.items()):
+                if isinstance(metric, Histogram):
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets + (float('inf'),), value[:-1]):
+                        cumulative += count
+                        le = '+Inf' if bound == float('inf') else _number(bound)
+                        lines.append(f"{metric.name}_bucket"
+                                     f"{_labels(metric.labelnames + ('le',), key + (le,))} {cumulative}")
+                    lines.append(f"{metric.name}_sum{_labels(metric.labelnames, key)} {_number(value[-1])}")
+                    lines.append(f"{metric.name}_count{_labels(metric.labelnames, key)} {cumulative}")
+                else:
+                    lines.append(f"{metric.name}{_labels(metric.labelnames, key)} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+def _read_snapshot(path: str) -> Optional[Dict[str, Dict]]:
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_atomic(path: str, snapshot: Dict[str, Dict]):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, path)
+
+def _fold(into: Dict[str, Dict], snapshot: Dict[str, Dict]):
+    """Add a snapshot's samples to ``into``; counters add up, histograms add up bucket by bucket"""
+    for name, data in snapshot.items():
+        merged = {tuple(key): value for key, value in into.get(name, {}).get('samples', [])}
+        for key, value in data.get('samples', []):
+            key = tuple(key)
+            if key not in merged:
+                merged[key] = value
+            elif isinstance(value, list):
+                merged[key] = [a + b for a, b in zip(merged[key], value)]
+            else:
+                merged[key] += value
+        into[name] = {'samples': [[list(key), value] for key, value in merged.items()]}
+
+def _labels(names: Tuple[str, ...], values: Tuple) -> str:
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return f"{{{pairs}}}"
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+# Create singleton instance
+metrics = MetricsRegistry()
@@ -0,0 +1,36 @@
+import time
+from flask import Blueprint, Response, g, request
+from .registry import metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+REQUEST_DURATION = metrics.histogram('infraweb_http_request_duration_seconds',
+                                     'Time to answer HTTP requests', ('endpoint', 'method', 'status'))
+
+@metrics_bp.before_app_request
+def start_timer():
+    g.metrics_start = time.perf_counter()
+
+@metrics_bp.after_app_request
+def observe_request(response):
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return response
+    labels = {'endpoint': request.endpoint or 'unmatched', 'method': request.method,
+              'status': response.status_code}
+
+    def observe():
+        REQUEST_DURATION.observe(time.perf_counter() - start, **labels)
+
+    if response.direct_passthrough:
+        # The server sends files itself and never closes the response, so time up to the handoff
+        observe()
+    else:
+        # Streamed pages render while being sent; the server closes the response after the last chunk
+        response.call_on_close(observe)
+    return response
+
+@metrics_bp.route('/metrics')
+def metrics_view():
+    """Prometheus scrape endpoint"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
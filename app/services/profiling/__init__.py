@@ -0,0 +1,5 @@
+from .profiler import profiler
+from .routes import profiling_bp
+
+# Export the singleton instance
+__all__ = ['profiler', 'profiling_bp']
@@ -0,0 +1,279 @@
+import sys
+import time
+import pstats
+import random
+import cProfile
+import threading
+import logging
+from io import StringIO
+from collections import Counter, deque
+from itertools import count
+from typing import Any, Dict, List, Optional
+from flask import Flask, request, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from ...models.infra import db, cache
+from ...models.read import ReadModel
+from ...utils.config import (PROFILING_SLOW_MS, PROFILING_SAMPLE_RATE, PROFILING_BUFFER_SIZE,
+                             PROFILING_STACK_INTERVAL, PROFILING_N_PLUS_ONE)
+
+# The engine, model and cache hooks are process-wide, so they are installed once however many apps are built
+_installed = False
+
+class RequestProfile:
+    """What one request spent its time on"""
+
+    def __init__(self, profile_id: int, thread_id: int, sampled: bool):
+        self.id = profile_id
+        self.thread_id = thread_id
+        self.method = request.method
+        self.path = request.full_path.rstrip('?')
+        self.endpoint = request.endpoint
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.status = None
+        self.streamed = False
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.statements: Dict[str, List[float]] = {}  # SQL text -> [count, seconds]
+        self.rows_hydrated = 0
+        self.template_time = 0.0
+        self.template_starts: List[float] = []
+        self.cache_calls = Counter()
+        self.cache_time = Counter()
+        self.stacks = Counter()  # Folded stacks from the sampler
+        self.profiler = cProfile.Profile() if sampled else None
+        self.pstats: Optional[str] = None
+
+    def n_plus_one(self) -> List[Dict[str, Any]]:
+        """Statements repeated often enough within the request to suggest a query per row"""
+        return [{'statement': statement, 'count': int(calls), 'seconds': round(seconds, 4)}
+                for statement, (calls, seconds) in sorted(self.statements.items(), key=lambda i: -i[1][0])
+                if calls >= PROFILING_N_PLUS_ONE]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'method': self.method,
+            'path': self.path,
+            'endpoint': self.endpoint,
+            'status': self.status,
+            'started_at': self.started_at,
+            'duration_ms': round(self.duration * 1000, 1),
+            'sql_count': self.sql_count,
+            'sql_ms': round(self.sql_time * 1000, 1),
+            'rows_hydrated': self.rows_hydrated,
+            'template_ms': round(self.template_time * 1000, 1),
+            'cache_calls': dict(self.cache_calls),
+            'cache_ms': {op: round(seconds * 1000, 1) for op, seconds in self.cache_time.items()},
+            'n_plus_one': self.n_plus_one(),
+            'sampled': self.pstats is not None
+        }
+
+    def folded(self) -> str:
+        """Stacks in the folded format read by flamegraph.pl and speedscope"""
+        return ''.join(f"{stack} {samples}\n" for stack, samples in self.stacks.most_common())
+
+class RequestProfiler:
+    """Opt-in per-request accounting of SQL, ORM hydration, templates and cache calls.
+
+    Enabled with INFRAWEB_PROFILING=1. Every request gets counters, reported
+    in a Server-Timing header; requests slower than PROFILING_SLOW_MS are
+    kept with their sampled stacks in a ring buffer, and a random
+    PROFILING_SAMPLE_RATE share of requests is also run under cProfile.
+    The buffer is per process, so with several workers each keeps its own.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.profiles: deque = deque(maxlen=PROFILING_BUFFER_SIZE)
+        self._ids = count(1)
+        self._local = threading.local()
+        self._active: Dict[int, RequestProfile] = {}
+        self._wakeup = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    @property
+    def current(self) -> Optional[RequestProfile]:
+        return getattr(self._local, 'profile', None)
+
+    def init_app(self, app: Flask):
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._teardown)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+
+        global _installed
+        if not _installed:
+            event.listen(Engine, 'before_cursor_execute', self._before_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_execute)
+            event.listen(db.Model, 'load', self._on_load, propagate=True)
+            ReadModel.load = self._counted_load(ReadModel.load)
+            for operation in ('get', 'set', 'get_many', 'set_many', 'delete'):
+                setattr(cache, operation, self._timed_cache(operation, getattr(cache, operation)))
+            _installed = True
+
+        self.logger.warning("Request profiling is enabled; expect extra overhead")
+
+    def _start(self):
+        profile = RequestProfile(next(self._ids), threading.get_ident(),
+                                 sampled=random.random() < PROFILING_SAMPLE_RATE)
+        self._local.profile = profile
+        self._active[profile.thread_id] = profile
+        self._ensure_sampler()
+        if profile.profiler:
+            try:
+                profile.profiler.enable()
+            except ValueError:  # Another request is already being profiled (Python 3.12+)
+                profile.profiler = None
+
+    def _finish(self, response):
+        profile = self.current
+        if profile is None:
+            return response
+        profile.status = response.status_code
+
+        # Headers go out before a streamed body, so for streams this is the time to the first byte
+        timings = [f"sql;dur={profile.sql_time * 1000:.1f};desc=\"{profile.sql_count} statements\"",
+                   f"template;dur={profile.template_time * 1000:.1f}",
+                   f"cache;dur={sum(profile.cache_time.values()) * 1000:.1f}",
+                   f"total;dur={(time.perf_counter() - profile.start) * 1000:.1f}"]
+        response.headers.add('Server-Timing', ', '.join(timings))
+
+        if response.is_streamed and not response.direct_passthrough:
+            # Templates render, and may query, while the body is sent, after this hook has run.
+            # Passthrough bodies (files) are handed to the server as is and never close the response
+            profile.streamed = True
+            response.call_on_close(lambda: self._complete(profile))
+        else:
+            self._complete(profile)
+        return response
+
+    def _complete(self, profile: RequestProfile):
+        """Stop a finished request's profile and keep it if it was slow or sampled"""
+        self._stop(profile)
+        if self.current is profile:
+            self._local.profile = None
+        if profile.pstats is not None or profile.duration * 1000 >= PROFILING_SLOW_MS:
+            self.profiles.append(profile)
+            if profile.duration * 1000 >= PROFILING_SLOW_MS:
+                self.logger.warning(f"Slow request {profile.method} {profile.path}: "
+                                    f"{profile.duration * 1000:.0f} ms, {profile.sql_count} SQL statements")
+        if profile.n_plus_one():
+            self.logger.warning(f"Possible N+1 queries in {profile.method} {profile.path}: "
+                                f"{', '.join(str(n['count']) for n in profile.n_plus_one())} repeats")
+
+    def _teardown(self, exc):
+        profile = self.current
+        if profile is None or profile.streamed:
+            return  # Streamed profiles are completed when the body is closed
+        self._stop(profile)  # The request failed before after_request
+        self._local.profile = None
+
+    def _stop(self, profile: RequestProfile):
+        if self._active.pop(profile.thread_id, None) is None:
+            return
+        profile.duration = time.perf_counter() - profile.start
+        if profile.profiler:
+            profile.profiler.disable()
+            output = StringIO()
+            pstats.Stats(profile.profiler, stream=output).sort_stats('cumulative').print_stats(40)
+            profile.pstats = output.getvalue()
+            profile.profiler = None
+
+    def get(self, profile_id: int) -> Optional[RequestProfile]:
+        return next((p for p in list(self.profiles) if p.id == profile_id), None)
+
+    # SQLAlchemy events
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.current is not None:
+            conn.info.setdefault('profiling_start', []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        profile = self.current
+        if profile is None or not conn.info.get('profiling_start'):
+            return
+        elapsed = time.perf_counter() - conn.info['profiling_start'].pop()
+        profile.sql_count += 1
+        profile.sql_time += elapsed
+        totals = profile.statements.setdefault(statement, [0, 0.0])
+        totals[0] += 1
+        totals[1] += elapsed
+
+    def _on_load(self, target, context):
+        profile = self.current
+        if profile is not None:
+            profile.rows_hydrated += 1
+
+    def _counted_load(self, load):
+        """Count the rows of Core read models, which build no ORM instances for the load event"""
+        def counted(read_model):
+            rows = load(read_model)
+            profile = self.current
+            if profile is not None:
+                profile.rows_hydrated += len(rows)
+            return rows
+        return counted
+
+    # Template signals
+
+    def _before_render(self, sender, template, context, **extra):
+        profile = self.current
+        if profile is not None:
+            profile.template_starts.append(time.perf_counter())
+
+    def _after_render(self, sender, template, context, **extra):
+        profile = self.current
+        if profile is not None and profile.template_starts:
+            elapsed = time.perf_counter() - profile.template_starts.pop()
+            if not profile.template_starts:
+                profile.template_time += elapsed  # Nested renders are part of the outer one
+
+    def _timed_cache(self, operation: str, func):
+        def timed(*args, **kwargs):
+            profile = self.current
+            if profile is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.cache_calls[operation] += 1
+                profile.cache_time[operation] += time.perf_counter() - start
+        return timed
+
+    # Stack sampler
+
+    def _ensure_sampler(self):
+        self._wakeup.set()
+        if self._sampler is None or not self._sampler.is_alive():
+            self._sampler = threading.Thread(target=self._run_sampler, daemon=True, name='profiling-sampler')
+            self._sampler.start()
+
+    def _run_sampler(self):
+        """Record the stack of every thread serving a profiled request, every PROFILING_STACK_INTERVAL"""
+        while True:
+            if not self._active:
+                self._wakeup.clear()
+                if not self._active:
+                    self._wakeup.wait()
+            frames = sys._current_frames()
+            for thread_id, profile in list(self._active.items()):
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    profile.stacks[_fold(frame)] += 1
+            time.sleep(PROFILING_STACK_INTERVAL)
+
+def _fold(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+# Create singleton instance
+profiler = RequestProfiler()
@@ -0,0 +1,27 @@
+from flask import Blueprint, Response, jsonify
+from .profiler import profiler
+
+profiling_bp = Blueprint('profiling', __name__, url_prefix='/_debug')
+
+@profiling_bp.route('/profiles')
+def list_profiles():
+    """Slow and sampled requests captured by this worker, newest first"""
+    return jsonify([profile.summary() for profile in reversed(list(profiler.profiles))])
+
+@profiling_bp.route('/profiles/<int:profile_id>')
+def get_profile(profile_id):
+    profile = profiler.get(profile_id)
+    if not profile:
+        return jsonify({'error': 'Profile not found'}), 404
+    return jsonify(dict(profile.summary(),
+                        statements=[{'statement': statement, 'count': int(calls), 'seconds': round(seconds, 4)}
+                                    for statement, (calls, seconds) in profile.statements.items()],
+                        pstats=profile.pstats))
+
+@profiling_bp.route('/profiles/<int:profile_id>/folded')
+def get_folded_stacks(profile_id):
+    """Sampled stacks, ready for flamegraph.pl or speedscope"""
+    profile = profiler.get(profile_id)
+    if not profile:
+        return jsonify({'error': 'Profile not found'}), 404
+    return Response(profile.folded(), mimetype='text/plain')
@@ -1,29 +1,91 @@
 import ssl
+import time
 import socket
 import requests
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Callable, Iterable, Optional
 from pyVim.connect import SmartConnect, Disconnect
 from pyVmomi import vim
 import logging
+import threading
 from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import urllib3
 from ...utils.config import VCENTERS
+from ..metrics import metrics
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# Data classes that can be collected independently, and the result keys each produces
+SECTIONS = {
+    'inventory': ['hosts_data', 'clusters_data', 'vms_data', 'snapshots_data'],
+    'vcenter_info': ['vcenter_info'],
+    'affinity_rules': ['affinity_rules']
+}
+
+# Host fields that only change with hardware or configuration work
+STATIC_HOST_FIELDS = ['NumCPU', 'NumCores', 'DNS', 'NTP', 'Vendor', 'Model', 'ServiceTag']
+
+COLLECTION_DURATION = metrics.histogram('infraweb_collection_duration_seconds',
+                                        'Collection time per vCenter and stage', ('vcenter', 'stage'))
+VCENTER_CALLS = metrics.counter('infraweb_vcenter_calls_total',
+                                'vCenter SOAP and REST calls', ('vcenter', 'api', 'call', 'outcome'))
+VCENTER_CALL_DURATION = metrics.histogram('infraweb_vcenter_call_duration_seconds',
+                                          'vCenter SOAP and REST call latency', ('vcenter', 'api', 'call'))
+
+def observe_call(vcenter: str, api: str, call: str, outcome: str, start: float):
+    """Record one vCenter API call that started at ``start`` (perf_counter)"""
+    VCENTER_CALLS.inc(vcenter=vcenter, api=api, call=call, outcome=outcome)
+    VCENTER_CALL_DURATION.observe(time.perf_counter() - start, vcenter=vcenter, api=api, call=call)
+
+def instrument_soap(si: vim.ServiceInstance, vcenter: str):
+    """Count and time every SOAP call made through a connection, property reads included"""
+    stub = si._stub
+    invoke = stub.InvokeMethod
+
+    def timed_invoke(mo, info, args, outerStub=None):
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            result = invoke(mo, info, args, outerStub)
+            outcome = 'ok'
+            return result
+        finally:
+            observe_call(vcenter, 'soap', info.wsdlName, outcome, start)
+
+    stub.InvokeMethod = timed_invoke
+
 class VCenterCollector:
-    def __init__(self, credentials: Dict[str, str]):
+    # Static host facts survive between runs in a long-lived collector process
+    _static_host_facts: Dict[str, Dict[str, Any]] = {}
+    _static_lock = threading.Lock()
+
+    def __init__(self, credentials: Dict[str, str], refresh_static: bool = False, keep_sessions: bool = False):
         self.logger = logging.getLogger(__name__)
         self.credentials = credentials
         self._context = self._create_ssl_context()
         self.session_ids = {}
+        self.refresh_static = refresh_static
+        # With keep_sessions, connections stay open for later pipeline stages until close_sessions()
+        self.keep_sessions = keep_sessions
+        self.sessions: Dict[str, Dict[str, Any]] = {}
+        self._sessions_lock = threading.Lock()
 
     def _create_ssl_context(self) -> ssl.SSLContext:
         context = ssl.SSLContext(ssl.PROTOCOL_TLS)
         context.verify_mode = ssl.CERT_NONE
         return context
 
+    def _rest(self, method: str, hostname: str, call: str, url: str, **kwargs) -> requests.Response:
+        """Make a vCenter REST call, recording it in the call metrics"""
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            response = requests.request(method, url, verify=False, **kwargs)
+            outcome = 'ok' if response.ok else 'error'
+            return response
+        finally:
+            observe_call(hostname, 'rest', call, outcome, start)
+
     def _get_session_id(self, hostname: str) -> str:
         if hostname in self.session_ids:
             return self.session_ids[hostname]
@@ -33,7 +95,7 @@ class VCenterCollector:
             auth = (self.credentials['vcenter']['username'], 
                    self.credentials['vcenter']['password'])
             
-            response = requests.post(url, auth=auth, verify=False)
+            response = self._rest('post', hostname, 'session', url, auth=auth)
             if response.ok:
                 session_id = response.json()
                 self.session_ids[hostname] = session_id
@@ -54,25 +116,59 @@ class VCenterCollector:
                 pwd=self.credentials['vcenter']['password'],
                 sslContext=self._context
             )
+            instrument_soap(si, host)
             self.logger.info(f"Successfully connected to vCenter: {host}")
             return si
         except Exception as e:
             self.logger.error(f"Failed to connect to vCenter {host}: {str(e)}")
             raise
-    def collect_from_all_vcenters(self) -> Dict[str, List[Dict[str, Any]]]:
-        all_data = {
-            'hosts_data': [],
-            'clusters_data': [],
-            'vms_data': [],
-            'snapshots_data': [],
-            'vcenter_info': [],
-            'affinity_rules': []
-        }
+
+    def open_sessions(self, hosts: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Connect to several vCenters in parallel and keep the sessions; unreachable ones are left out"""
+        def connect(host):
+            try:
+                si = self.connect_vcenter(host)
+                return host, {'si': si, 'content': si.RetrieveContent()}
+            except Exception:
+                return host, None
+
+        hosts = list(hosts)
+        with ThreadPoolExecutor(max_workers=max(len(hosts), 1)) as executor:
+            for host, session in executor.map(connect, hosts):
+                if session:
+                    with self._sessions_lock:
+                        self.sessions[host] = session
+        return self.sessions
+
+    def close_sessions(self):
+        """Disconnect every session kept open for later stages"""
+        with self._sessions_lock:
+            sessions, self.sessions = self.sessions, {}
+        for host, session in sessions.items():
+            try:
+                Disconnect(session['si'])
+            except Exception as e:
+                self.logger.warning(f"Error disconnecting from {host}: {str(e)}")
+    def collect_from_all_vcenters(self, progress_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                                  sections: Optional[Iterable[str]] = None,
+                                  vcenters: Optional[Iterable[str]] = None,
+                                  clusters: Optional[Iterable[str]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """Collect from every vCenter in parallel.
+
+        ``sections`` limits collection to some data classes (see SECTIONS);
+        only their keys are present in the result. ``vcenters`` and ``clusters``
+        restrict a refresh to some vCenter hosts or cluster names.
+        ``progress_callback(host, result)`` is called as each vCenter finishes,
+        with per-table row counts or an ``error`` entry.
+        """
+        sections = set(sections or SECTIONS)
+        all_data = {key: [] for section in sections for key in SECTIONS[section]}
+        targets = [vcenter for vcenter in VCENTERS if not vcenters or vcenter['host'] in vcenters]
         
-        with ThreadPoolExecutor(max_workers=len(VCENTERS)) as executor:
+        with ThreadPoolExecutor(max_workers=max(len(targets), 1)) as executor:
             future_to_vcenter = {
-                executor.submit(self.collect_data_from_vcenter, vcenter): vcenter 
-                for vcenter in VCENTERS
+                executor.submit(self.collect_data_from_vcenter, vcenter, sections, clusters): vcenter 
+                for vcenter in targets
             }
             
             for future in as_completed(future_to_vcenter):
@@ -81,8 +177,12 @@ class VCenterCollector:
                     data = future.result()
                     for key in all_data:
                         all_data[key].extend(data.get(key, []))
+                    if progress_callback:
+                        progress_callback(vcenter['host'], {key: len(data.get(key, [])) for key in all_data})
                 except Exception as e:
                     self.logger.error(f"Error processing {vcenter['host']}: {str(e)}")
+                    if progress_callback:
+                        progress_callback(vcenter['host'], {'error': str(e)})
                     continue
         
         return all_data
@@ -98,7 +198,7 @@ class VCenterCollector:
                 # Get TLS certificate info
                 tls_url = f"https://{hostname}/api/vcenter/certificate-management/vcenter/tls"
                 try:
-                    tls_response = requests.get(tls_url, headers=headers, verify=False)
+                    tls_response = self._rest('get', hostname, 'certificate_tls', tls_url, headers=headers)
                     if tls_response.ok:
                         tls_info = tls_response.json()
                         cert_results.append({
@@ -114,7 +214,8 @@ class VCenterCollector:
                 # Get signing certificate info
                 signing_url = f"https://{hostname}/api/vcenter/certificate-management/vcenter/signing-certificate"
                 try:
-                    signing_response = requests.get(signing_url, headers=headers, verify=False)
+                    signing_response = self._rest('get', hostname, 'signing_certificate', signing_url,
+                                                  headers=headers)
                     if signing_response.ok:
                         signing_info = signing_response.json()
                         if signing_info.get('active_cert_chain'):
@@ -140,10 +241,22 @@ class VCenterCollector:
                 'mode': None
             }
             
-    def collect_data_from_vcenter(self, vcenter: Dict[str, str]) -> Dict[str, List[Dict[str, Any]]]:
+    def collect_data_from_vcenter(self, vcenter: Dict[str, str],
+                                  sections: Optional[Iterable[str]] = None,
+                                  clusters: Optional[Iterable[str]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        sections = set(sections or SECTIONS)
+        clusters = set(clusters) if clusters else None
+        # Seconds spent per stage; inventory and affinity rules interleave per cluster
+        durations = {}
+
+        def timed(stage, start):
+            durations[stage] = durations.get(stage, 0) + time.perf_counter() - start
+
         try:
+            start = time.perf_counter()
             si = self.connect_vcenter(vcenter['host'])
             content = si.RetrieveContent()
+            timed('connect', start)
             
             hosts_data = []
             clusters_data = []
@@ -152,45 +265,73 @@ class VCenterCollector:
             affinity_rules = []
             
             # Collect vCenter info with certificates
-            vcenter_info = self._process_vcenter_info(content, vcenter)
+            if 'vcenter_info' in sections:
+                start = time.perf_counter()
+                vcenter_info = self._process_vcenter_info(content, vcenter)
+                timed('vcenter_info', start)
             
             for datacenter in content.rootFolder.childEntity:
                 self.logger.info(f"Processing datacenter: {datacenter.name}")
                 
                 for cluster in datacenter.hostFolder.childEntity:
-                    # Process cluster
-                    cluster_info = self._process_cluster(cluster, datacenter.name, vcenter['DeployType'])
-                    clusters_data.append(cluster_info)
-                    
-                    # Process hosts in cluster
-                    for host in cluster.host:
-                        host_info = self._process_host(host, datacenter.name, cluster.name)
-                        hosts_data.append(host_info)
+                    if clusters is not None and cluster.name not in clusters:
+                        continue
+
+                    if 'inventory' in sections:
+                        start = time.perf_counter()
+                        # Process cluster
+                        cluster_info = self._process_cluster(cluster, datacenter.name, vcenter['DeployType'])
+                        cluster_info['VCenter'] = vcenter['host']
+                        clusters_data.append(cluster_info)
                         
-                        # Process VMs on host
-                        for vm in host.vm:
-                            vm_info = self._process_vm(vm, datacenter.name, cluster.name, host.name)
-                            vms_data.append(vm_info)
+                        # Process hosts in cluster
+                        for host in cluster.host:
+                            host_info = self._process_host(host, datacenter.name, cluster.name)
+                            host_info['VCenter'] = vcenter['host']
+                            hosts_data.append(host_info)
                             
-                            # Process snapshots
-                            if vm.snapshot:
-                                for snap in vm.snapshot.rootSnapshotList:
-                                    snap_info = self._process_snapshot(snap, vm)
-                                    snapshots_data.append(snap_info)
+                            # Process VMs on host
+                            for vm in host.vm:
+                                vm_info = self._process_vm(vm, datacenter.name, cluster.name, host.name)
+                                vm_info['VCenter'] = vcenter['host']
+                                vms_data.append(vm_info)
+                                
+                                # Process snapshots
+                                if vm.snapshot:
+                                    for snap in vm.snapshot.rootSnapshotList:
+                                        snap_info = self._process_snapshot(snap, vm)
+                                        snap_info.update(vcenter=vcenter['host'], cluster=cluster.name)
+                                        snapshots_data.append(snap_info)
+                        timed('inventory', start)
                     
                     # Collect affinity rules
-                    cluster_rules = self._process_affinity_rules(cluster, vcenter['host'])
-                    affinity_rules.extend(cluster_rules)
+                    if 'affinity_rules' in sections:
+                        start = time.perf_counter()
+                        cluster_rules = self._process_affinity_rules(cluster, vcenter['host'])
+                        affinity_rules.extend(cluster_rules)
+                        timed('affinity_rules', start)
             
-            Disconnect(si)
-            return {
-                'hosts_data': hosts_data,
-                'clusters_data': clusters_data,
-                'vms_data': vms_data,
-                'snapshots_data': snapshots_data,
-                'vcenter_info': [vcenter_info],
-                'affinity_rules': affinity_rules
-            }
+            if self.keep_sessions:
+                with self._sessions_lock:
+                    self.sessions[vcenter['host']] = {'si': si, 'content': content}
+            else:
+                Disconnect(si)
+            data = {}
+            if 'inventory' in sections:
+                data.update({
+                    'hosts_data': hosts_data,
+                    'clusters_data': clusters_data,
+                    'vms_data': vms_data,
+                    'snapshots_data': snapshots_data
+                })
+            if 'vcenter_info' in sections:
+                data['vcenter_info'] = [vcenter_info]
+            if 'affinity_rules' in sections:
+                data['affinity_rules'] = affinity_rules
+
+            for stage, seconds in durations.items():
+                COLLECTION_DURATION.observe(seconds, vcenter=vcenter['host'], stage=stage)
+            return data
             
         except Exception as e:
             self.logger.error(f"Error collecting data from {vcenter['host']}: {str(e)}")
@@ -448,33 +589,55 @@ class VCenterCollector:
                 'error_message': str(e)
             }
 
+    def _get_static_host_facts(self, host: vim.HostSystem, host_name: str) -> Dict[str, Any]:
+        """Read hardware and DNS/NTP facts once, then reuse them until a static refresh"""
+        with self._static_lock:
+            facts = None if self.refresh_static else self._static_host_facts.get(host_name)
+        if facts is not None:
+            return facts
+
+        facts = {
+            'NumCPU': host.hardware.cpuInfo.numCpuPackages,
+            'NumCores': host.hardware.cpuInfo.numCpuCores,
+            'DNS': ', '.join(host.config.network.dnsConfig.address),
+            'NTP': ', '.join(host.config.dateTimeInfo.ntpConfig.server),
+            'Vendor': host.hardware.systemInfo.vendor,
+            'Model': host.hardware.systemInfo.model,
+            'ServiceTag': host.hardware.systemInfo.serialNumber
+        }
+        with self._static_lock:
+            self._static_host_facts[host_name] = facts
+        return facts
+
     def _process_host(self, host: vim.HostSystem, datacenter: str, cluster: str) -> Dict[str, Any]:
         try:
+            host_name = host.name
             cpu_usage = host.summary.quickStats.overallCpuUsage
             total_cpu = host.summary.hardware.cpuMhz * host.summary.hardware.numCpuCores
             memory_usage = host.summary.quickStats.overallMemoryUsage
             total_memory = host.summary.hardware.memorySize / (1024 * 1024)
+            static = self._get_static_host_facts(host, host_name)
 
             return {
-                'Host': host.name,
+                'Host': host_name,
                 'Datacenter': datacenter,
                 'Cluster': cluster,
-                'NumCPU': host.hardware.cpuInfo.numCpuPackages,
-                'NumCores': host.hardware.cpuInfo.numCpuCores,
+                'NumCPU': static['NumCPU'],
+                'NumCores': static['NumCores'],
                 'CPUUsage': str(cpu_usage),
                 'CPUUsagePercentage': round((cpu_usage / total_cpu * 100) if total_cpu > 0 else 0, 2),
                 'Mem': round(total_memory / 1024, 2),
                 'MemoryUsage': str(memory_usage),
                 'MemoryUsagePercentage': round((memory_usage / total_memory * 100) if total_memory > 0 else 0, 2),
                 'TotalVMs': len(host.vm),
-                'DNS': ', '.join(host.config.network.dnsConfig.address),
-                'NTP': ', '.join(host.config.dateTimeInfo.ntpConfig.server),
+                'DNS': static['DNS'],
+                'NTP': static['NTP'],
                 'IP': ', '.join([nic.spec.ip.ipAddress for nic in host.config.network.vnic]),
                 'MAC': ', '.join([nic.spec.mac for nic in host.config.network.vnic]),
                 'PowerPolicy': host.config.powerSystemInfo.currentPolicy.shortName,
-                'Vendor': host.hardware.systemInfo.vendor,
-                'Model': host.hardware.systemInfo.model,
-                'ServiceTag': host.hardware.systemInfo.serialNumber
+                'Vendor': static['Vendor'],
+                'Model': static['Model'],
+                'ServiceTag': static['ServiceTag']
             }
         except Exception as e:
             self.logger.error(f"Error processing host {host.name}: {str(e)}")
@@ -547,6 +710,8 @@ class VCenterCollector:
 
             return {
                 'VMName': vm.name,
+                'MoRef': vm._moId,
+                'InstanceUuid': vm.config.instanceUuid,
                 'OS': vm.summary.config.guestFullName,
                 'Site': datacenter,
                 'State': vm.summary.runtime.powerState,
@@ -645,4 +810,4 @@ class VCenterCollector:
         except Exception as e:
             self.logger.error(f"Error processing rules for cluster {cluster.name}: {str(e)}")
         
-        return rules
\ No newline at end of file
+        return rules
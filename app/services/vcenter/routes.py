@@ -1,9 +1,10 @@
-from flask import Blueprint, render_template, jsonify, current_app
+from flask import Blueprint, render_template, stream_template, jsonify, current_app, request, url_for
 from ...models.infra import (Hosts, Clusters, VirtualMachines, WindowsVMs, 
                            UsersGroups, Snapshots, UpdateStats, ProdUsers, DevUsers, 
-                           VCenterInfo, AffinityRule, cache)
-from ..credentials import credentials_manager
-from .collector import VCenterCollector
+                           VCenterInfo, AffinityRule)
+from ..cache import cache_manager
+from ..jobs import job_queue
+from ...utils.config import TEMPLATE_STREAM_CHUNK
 from datetime import datetime
 import os
 import json
@@ -34,21 +35,39 @@ def format_date(date):
         return date.strftime('%Y-%m-%d %H:%M:%S')
     return None
 
+def stream_page(template_name, **context):
+    """Render a list page as a stream: the page chrome goes out at once and rows follow in chunks"""
+    return current_app.response_class(_chunked(stream_template(template_name, **context)), mimetype='text/html')
+
+def _chunked(pieces, size=TEMPLATE_STREAM_CHUNK):
+    """Join Jinja's many small output pieces into chunks of about ``size`` characters"""
+    buffer, buffered = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered >= size:
+            yield ''.join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
 @vcenter_bp.route('/')
-@cache.cached(timeout=300)
+@cache_manager.cached('virtual_machines', 'clusters', 'hosts', 'vcenter_details', 'update_stats', bucket=3600,
+                      serve_stale=True)
 def dashboard():
     # Get VMs by state
-    powered_on_vms = VirtualMachines.query.filter_by(State='poweredOn').all()
-    powered_off_vms = VirtualMachines.query.filter_by(State='poweredOff').all()
+    vms = cache_manager.rows(VirtualMachines)
+    powered_on_vms = [vm for vm in vms if vm.State == 'poweredOn']
+    powered_off_vms = [vm for vm in vms if vm.State == 'poweredOff']
     
     # Count VMs by OS type
     total_vms = len(powered_on_vms)
-    windows_vms = len([vm for vm in powered_on_vms if 'windows' in vm.OS.lower()])
-    redhat_vms = len([vm for vm in powered_on_vms if 'red hat' in vm.OS.lower()])
+    windows_vms = len([vm for vm in powered_on_vms if 'windows' in (vm.OS or '').lower()])
+    redhat_vms = len([vm for vm in powered_on_vms if 'red hat' in (vm.OS or '').lower()])
     
     # Get cluster storage info
     cluster_storage = {}
-    for cluster in Clusters.query.all():
+    for cluster in cache_manager.rows(Clusters):
         if cluster.vSANEnabled:
             cluster_storage[cluster.ClusterName] = round(cluster.vSANFreeTiB, 2)
     
@@ -67,7 +86,7 @@ def dashboard():
             powered_off_by_site[vm.Site] = powered_off_by_site.get(vm.Site, 0) + 1
     
     # Count hosts by site
-    for host in Hosts.query.all():
+    for host in cache_manager.rows(Hosts):
         if host.Datacenter:  # Ensure Datacenter is not None
             hosts_by_site[host.Datacenter] = hosts_by_site.get(host.Datacenter, 0) + 1
     
@@ -78,7 +97,7 @@ def dashboard():
     
     # Get vCenter health metrics
     now = datetime.utcnow()
-    vcenters = VCenterInfo.query.all()
+    vcenters = cache_manager.rows(VCenterInfo)
     certs_expiring = 0
     drs_disabled = 0
     ha_disabled = 0
@@ -125,7 +144,7 @@ def dashboard():
                          vcenter_issues=vcenter_issues)
 
 @vcenter_bp.route('/vcenters')
-@cache.cached(timeout=300)
+@cache_manager.cached('vcenter_details', bucket=3600)
 def vcenters():
     """Route for vCenter overview page"""
     try:
@@ -133,10 +152,10 @@ def vcenters():
         now = datetime.utcnow()  # Add this line
         
         # Get all vCenter information
-        vcenters = VCenterInfo.query.all()
+        vcenters = cache_manager.rows(VCenterInfo)
         
         # Add some debug logging
-        print(f"Found {len(vcenters)} vCenters in database")  # Add this line
+        current_app.logger.debug(f"Found {len(vcenters)} vCenters in database")
         
         # Initialize counters
         expiring_soon = 0
@@ -148,7 +167,6 @@ def vcenters():
             # Check certificate expiration
             if vcenter.ssl_certificate_expiration:
                 days_until_expiry = (vcenter.ssl_certificate_expiration - now).days
-                vcenter.ssl_expiring_soon = days_until_expiry < 30
                 if days_until_expiry < 30:
                     expiring_soon += 1
 
@@ -180,87 +198,81 @@ def vcenters():
                             now=datetime.utcnow())  # Add this parameter
 
 @vcenter_bp.route('/hosts')
-@cache.cached(timeout=300)
+@cache_manager.cached('hosts', artifact=True)
 def hosts():
-    hosts_data = Hosts.query.all()
-    return render_template('hosts.html', hosts=hosts_data)
+    hosts_data = cache_manager.rows(Hosts)
+    return stream_page('hosts.html', hosts=hosts_data,
+                       rows=cache_manager.row_fragments('rows/hosts.html', hosts_data))
 
 @vcenter_bp.route('/clusters')
-@cache.cached(timeout=300)
+@cache_manager.cached('clusters', artifact=True)
 def clusters():
-    clusters_data = Clusters.query.all()
-    return render_template('clusters.html', clusters=clusters_data)
+    clusters_data = cache_manager.rows(Clusters)
+    return stream_page('clusters.html', clusters=clusters_data)
 
 @vcenter_bp.route('/rules')
-@cache.cached(timeout=300)
+@cache_manager.cached('affinity_rules', artifact=True)
 def rules():
     """Route for affinity rules overview page"""
     try:
-        rules = AffinityRule.query.all()
-        return render_template('rules.html', rules=rules)
+        rules = cache_manager.rows(AffinityRule)
     except Exception as e:
         current_app.logger.error(f"Error in rules route: {str(e)}")
-        return render_template('rules.html', rules=[])
+        rules = []
+    return stream_page('rules.html', rules=rules)
 
 @vcenter_bp.route('/virtual_machines')
-@cache.cached(timeout=300)
+@cache_manager.cached('virtual_machines', artifact=True, serve_stale=True)
 def virtual_machines():
-    vms_data = VirtualMachines.query.all()
-    return render_template('virtual_machines.html', vms=vms_data)
+    vms_data = cache_manager.rows(VirtualMachines)
+    return stream_page('virtual_machines.html', vms=vms_data,
+                       rows=cache_manager.row_fragments('rows/virtual_machines.html', vms_data))
 
 @vcenter_bp.route('/snapshots')
-@cache.cached(timeout=300)
+@cache_manager.cached('snapshots', artifact=True)
 def snapshots():
-    snapshots_data = Snapshots.query.all()
-    return render_template('snapshots.html', snapshots=snapshots_data)
+    snapshots_data = cache_manager.rows(Snapshots)
+    return stream_page('snapshots.html', snapshots=snapshots_data)
 
 @vcenter_bp.route('/users_groups')
-@cache.cached(timeout=300)
+@cache_manager.cached('users_groups', artifact=True)
 def users_groups():
-    users_data = UsersGroups.query.all()
-    return render_template('users_groups.html', users=users_data)
+    users_data = cache_manager.rows(UsersGroups)
+    return stream_page('users_groups.html', users=users_data)
 
 @vcenter_bp.route('/windows_vms')
-@cache.cached(timeout=300)
+@cache_manager.cached('windows_vms', artifact=True)
 def windows_vms():
-    vms_data = WindowsVMs.query.all()
-    return render_template('windows_vms.html', windows_vms=vms_data)
+    vms_data = cache_manager.rows(WindowsVMs)
+    return stream_page('windows_vms.html', windows_vms=vms_data)
 
 @vcenter_bp.route('/prod_users')
-@cache.cached(timeout=300)
+@cache_manager.cached('prod_users', artifact=True)
 def prod_users():
-    users_data = ProdUsers.query.all()
-    formatted_users = []
-    for user in users_data:
-        formatted_user = user.__dict__.copy()
-        formatted_user['CreationDate'] = format_date(user.CreationDate)
-        formatted_user['LastLogin'] = format_date(user.LastLogin)
-        formatted_users.append(formatted_user)
-    return render_template('prod_users.html', users=formatted_users)
+    users_data = cache_manager.rows(ProdUsers)
+    formatted_users = [dict(user._asdict(), CreationDate=user.CreationDate_text, LastLogin=user.LastLogin_text)
+                       for user in users_data]
+    return stream_page('prod_users.html', users=formatted_users)
 
 @vcenter_bp.route('/dev_users')
-@cache.cached(timeout=300)
+@cache_manager.cached('dev_users', artifact=True)
 def dev_users():
-    users_data = DevUsers.query.all()
-    formatted_users = []
-    for user in users_data:
-        formatted_user = user.__dict__.copy()
-        formatted_user['CreationDate'] = format_date(user.CreationDate)
-        formatted_user['LastLogin'] = format_date(user.LastLogin)
-        formatted_users.append(formatted_user)
-    return render_template('dev_users.html', users=formatted_users)
+    users_data = cache_manager.rows(DevUsers)
+    formatted_users = [dict(user._asdict(), CreationDate=user.CreationDate_text, LastLogin=user.LastLogin_text)
+                       for user in users_data]
+    return stream_page('dev_users.html', users=formatted_users)
 
 # API Endpoints
 @vcenter_bp.route('/api/vcenters')
-@cache.cached(timeout=300)
+@cache_manager.cached('vcenter_details', artifact=True)
 def api_vcenters():
-    vcenters = VCenterInfo.query.all()
+    vcenters = cache_manager.rows(VCenterInfo)
     return jsonify([{
         'hostname': vc.hostname,
         'version': vc.version,
         'build_number': vc.build_number,
         'deploy_type': vc.deploy_type,
-        'ssl_expiration': format_date(vc.ssl_certificate_expiration),
+        'ssl_expiration': vc.ssl_certificate_expiration_text,
         'ssl_issuer': vc.ssl_issuer,
         'ssl_subject': vc.ssl_subject,
         'storage_health': {
@@ -291,14 +303,14 @@ def api_vcenters():
         },
         'ha_status': vc.ha_status,
         'status': vc.status,
-        'last_checked': format_date(vc.last_checked),
+        'last_checked': vc.last_checked_text,
         'error_message': vc.error_message
     } for vc in vcenters])
 
 @vcenter_bp.route('/api/hosts')
-@cache.cached(timeout=300)
+@cache_manager.cached('hosts', artifact=True)
 def api_hosts():
-    hosts = Hosts.query.all()
+    hosts = cache_manager.rows(Hosts)
     return jsonify([{
         'id': host.id,
         'Host': host.Host,
@@ -321,9 +333,9 @@ def api_hosts():
     } for host in hosts])
 
 @vcenter_bp.route('/api/clusters')
-@cache.cached(timeout=300)
+@cache_manager.cached('clusters', artifact=True)
 def api_clusters():
-    clusters = Clusters.query.all()
+    clusters = cache_manager.rows(Clusters)
     return jsonify([{
         'id': cluster.id,
         'ClusterName': cluster.ClusterName,
@@ -348,16 +360,16 @@ def api_clusters():
     } for cluster in clusters])
 
 @vcenter_bp.route('/api/virtual_machines')
-@cache.cached(timeout=300)
+@cache_manager.cached('virtual_machines', artifact=True, serve_stale=True)
 def api_virtual_machines():
-    vms = VirtualMachines.query.all()
+    vms = cache_manager.rows(VirtualMachines)
     return jsonify([{
         'id': vm.id,
         'VMName': vm.VMName,
         'OS': vm.OS,
         'Site': vm.Site,
         'State': vm.State,
-        'Created': format_date(vm.Created),
+        'Created': vm.Created_text,
         'SizeGB': vm.SizeGB,
         'InUseGB': vm.InUseGB,
         'IP': vm.IP,
@@ -370,9 +382,9 @@ def api_virtual_machines():
     } for vm in vms])
 
 @vcenter_bp.route('/api/windows_vms')
-@cache.cached(timeout=300)
+@cache_manager.cached('windows_vms', artifact=True)
 def api_windows_vms():
-    vms = WindowsVMs.query.all()
+    vms = cache_manager.rows(WindowsVMs)
     return jsonify([{
         'id': vm.id,
         'VMName': vm.VMName,
@@ -394,52 +406,52 @@ def api_windows_vms():
     } for vm in vms])
 
 @vcenter_bp.route('/api/users_groups')
-@cache.cached(timeout=300)
+@cache_manager.cached('users_groups', artifact=True)
 def api_users_groups():
-    users = UsersGroups.query.all()
+    users = cache_manager.rows(UsersGroups)
     return jsonify([{
         'id': user.id,
         'Name': user.Name,
         'Samaccountname': user.Samaccountname,
         'Role': user.Role,
         'Enabled': user.Enabled,
-        'CreationDate': format_date(user.CreationDate),
-        'LastLogin': format_date(user.LastLogin)
+        'CreationDate': user.CreationDate_text,
+        'LastLogin': user.LastLogin_text
     } for user in users])
 
 @vcenter_bp.route('/api/prod_users')
-@cache.cached(timeout=300)
+@cache_manager.cached('prod_users', artifact=True)
 def api_prod_users():
-    users = ProdUsers.query.all()
+    users = cache_manager.rows(ProdUsers)
     return jsonify([{
         'id': user.id,
         'Name': user.Name,
         'Samaccountname': user.Samaccountname,
         'Role': user.Role,
         'Enabled': user.Enabled,
-        'CreationDate': format_date(user.CreationDate),
-        'LastLogin': format_date(user.LastLogin)
+        'CreationDate': user.CreationDate_text,
+        'LastLogin': user.LastLogin_text
     } for user in users])
 
 @vcenter_bp.route('/api/dev_users')
-@cache.cached(timeout=300)
+@cache_manager.cached('dev_users', artifact=True)
 def api_dev_users():
-    users = DevUsers.query.all()
+    users = cache_manager.rows(DevUsers)
     return jsonify([{
         'id': user.id,
         'Name': user.Name,
         'Samaccountname': user.Samaccountname,
         'Role': user.Role,
         'Enabled': user.Enabled,
-        'CreationDate': format_date(user.CreationDate),
-        'LastLogin': format_date(user.LastLogin)
+        'CreationDate': user.CreationDate_text,
+        'LastLogin': user.LastLogin_text
     } for user in users])
 
 
 @vcenter_bp.route('/api/affinity_rules')
-@cache.cached(timeout=300)
+@cache_manager.cached('affinity_rules', artifact=True)
 def api_affinity_rules():
-    rules = AffinityRule.query.all()
+    rules = cache_manager.rows(AffinityRule)
     return jsonify([{
         'vcenter': rule.vcenter,
         'rule_name': rule.rule_name,
@@ -450,23 +462,59 @@ def api_affinity_rules():
         'hosts': rule.hosts.split(',') if rule.hosts else [],
         'mandatory': rule.mandatory,
         'description': rule.description,
-        'last_checked': format_date(rule.last_checked)
+        'last_checked': rule.last_checked_text
     } for rule in rules])
 
 @vcenter_bp.route('/api/snapshots')
-@cache.cached(timeout=300)
+@cache_manager.cached('snapshots', artifact=True)
 def api_snapshots():
-    snapshots = Snapshots.query.all()
+    snapshots = cache_manager.rows(Snapshots)
     return jsonify([{
         'id': snapshot.id,
         'vm_id': snapshot.vm_id,
         'vm_name': snapshot.vm_name,
         'snapshot': snapshot.snapshot,
-        'created': format_date(snapshot.created)
+        'created': snapshot.created_text
     } for snapshot in snapshots])
 
+@vcenter_bp.route('/api/refresh', methods=['POST'])
+def api_refresh():
+    """Request a collection of everything, one vCenter or one cluster.
+
+    Identical or overlapping requests share one job, so the response may point
+    at a job someone else already started.
+    """
+    payload = request.get_json(silent=True) or request.form
+    if not isinstance(payload, dict):
+        return jsonify({'status': 'error', 'message': 'Expected a JSON object or form fields'}), 400
+    scope = payload.get('scope', 'all')
+    if not isinstance(scope, str):
+        return jsonify({'status': 'error', 'message': 'Scope must be a string'}), 400
+    try:
+        job, coalesced = job_queue.enqueue(scope=scope, requested_by=request.remote_addr or 'web')
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    response = jsonify({
+        'job': job_queue.to_dict(job),
+        'coalesced': coalesced,
+        'collector': job_queue.collector_status()
+    })
+    response.status_code = 202
+    response.headers['Location'] = url_for('vcenter.api_job', job_id=job.id)
+    return response
+
+@vcenter_bp.route('/api/jobs/<int:job_id>')
+def api_job(job_id):
+    """Progress of a collection job"""
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({'status': 'error', 'message': f"Job {job_id} not found"}), 404
+    return jsonify(job)
+
 @vcenter_bp.route('/api/health')
-@cache.cached(timeout=60)
+@cache_manager.cached('virtual_machines', 'hosts', 'clusters', 'snapshots',
+                        'vcenter_details', 'affinity_rules', 'update_stats')
 def health_check():
     """API endpoint for system health check"""
     try:
@@ -491,4 +539,4 @@ def health_check():
         return jsonify({
             'status': 'error',
             'message': str(e)
-        }), 500
\ No newline at end of file
+        }), 500
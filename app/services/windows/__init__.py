@@ -0,0 +1,3 @@
+from .collector import WindowsGuestCollector
+
+__all__ = ['WindowsGuestCollector']
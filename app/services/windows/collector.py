@@ -0,0 +1,467 @@
+import json
+import time
+import base64
+import hashlib
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from pyVmomi import vim, vmodl
+from ...models.infra import db, WindowsGuestFacts
+from ..vcenter.collector import observe_call
+from ...utils.config import (VCENTERS, GUEST_PROBE_TIMEOUT, GUEST_PROBE_POLL_INTERVAL, GUEST_PROBE_OUTPUT,
+                             WINDOWS_COLLECTION_WORKERS, WINDOWS_COLLECTION_PER_VCENTER,
+                             WINDOWS_COLLECTION_PER_HOST, WINDOWS_FACT_TTLS)
+
+# Gathers the requested groups of Windows facts in one PowerShell run and writes them as JSON.
+# __OUTPUT__ is replaced with GUEST_PROBE_OUTPUT; INFRAWEB_FACTS lists the groups to gather.
+PROBE_SCRIPT = r"""
+$ErrorActionPreference = 'SilentlyContinue'
+$out = '__OUTPUT__'
+$wanted = $env:INFRAWEB_FACTS -split ','
+Remove-Item -Path $out -Force
+
+function Get-RegValue($path, $name) {
+    $item = Get-ItemProperty -Path $path -Name $name
+    if ($item) { return $item.$name }
+    return $null
+}
+
+$facts = @{}
+if ($wanted -contains 'os') {
+    $facts.os = (Get-WmiObject Win32_OperatingSystem).Caption
+}
+if ($wanted -contains 'services') {
+    $facts.cortex = [string](Get-Service -Name cyserver).Status
+    $facts.vr = [string](Get-Service -Name vrevo).Status
+}
+if ($wanted -contains 'cortex_version') {
+    $facts.cortex_version = $null
+    $cortex = Get-WmiObject Win32_Service -Filter "Name='cyserver'"
+    if ($cortex -and $cortex.PathName) {
+        $cortexPath = $cortex.PathName.Trim('"').Split('"')[0]
+        $facts.cortex_version = (Get-Item -Path $cortexPath).VersionInfo.ProductVersion
+    }
+}
+if ($wanted -contains 'target_group') {
+    $facts.target_group = Get-RegValue 'HKLM:\Software\Policies\Microsoft\Windows\WindowsUpdate' 'TargetGroup'
+}
+if ($wanted -contains 'ciphers') {
+    $schannel = 'HKLM:\SYSTEM\CurrentControlSet\Control\SecurityProviders\SCHANNEL\Protocols'
+    $facts.ssl3_client_enabled = Get-RegValue "$schannel\SSL 3.0\Client" 'Enabled'
+    $facts.tls11_client_enabled = Get-RegValue "$schannel\TLS 1.1\Client" 'Enabled'
+}
+
+try {
+    $facts | ConvertTo-Json -Compress | Set-Content -Path $out -Encoding UTF8 -ErrorAction Stop
+} catch {
+    exit 1
+}
+exit 0
+"""
+
+
+class GuestProbe:
+    """Runs PROBE_SCRIPT inside a guest and reads back its JSON result.
+
+    One StartProgram, a few ListProcessesInGuest polls while the script runs,
+    and one file transfer over a pooled HTTP session per VM.
+    """
+
+    def __init__(self, logger: logging.Logger, pool_size: int = 10):
+        self.logger = logger
+        self.http = requests.Session()
+        self.http.verify = False
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.http.mount('https://', adapter)
+        script = PROBE_SCRIPT.replace('__OUTPUT__', GUEST_PROBE_OUTPUT)
+        self.encoded_script = base64.b64encode(script.encode('utf-16-le')).decode('ascii')
+
+    def run(self, content, vm: vim.VirtualMachine, creds, groups: list, vcenter: str = '') -> dict:
+        """Probe some fact groups in a VM; returns the facts, or None if the probe failed"""
+        pm = content.guestOperationsManager.processManager
+        fm = content.guestOperationsManager.fileManager
+
+        spec = vim.vm.guest.ProcessManager.ProgramSpec(
+            programPath="C:\\Windows\\System32\\WindowsPowerShell\\v1.0\\powershell.exe",
+            arguments=f"-NoProfile -NonInteractive -ExecutionPolicy Bypass -EncodedCommand {self.encoded_script}",
+            envVariables=[f"INFRAWEB_FACTS={','.join(groups)}"]
+        )
+        pid = pm.StartProgram(vm=vm, auth=creds, spec=spec)
+
+        exit_code = self._wait_for_exit(pm, vm, creds, pid)
+        if exit_code != 0:
+            self.logger.error(f"Probe in {vm.name} exited with code {exit_code}")
+            return None
+
+        transfer = fm.InitiateFileTransferFromGuest(vm=vm, auth=creds, guestFilePath=GUEST_PROBE_OUTPUT)
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            response = self.http.get(transfer.url, timeout=30)
+            response.raise_for_status()
+            outcome = 'ok'
+        finally:
+            observe_call(vcenter, 'rest', 'guest_file_transfer', outcome, start)
+        return json.loads(response.content.decode('utf-8-sig'))
+
+    def _wait_for_exit(self, pm, vm, creds, pid: int) -> int:
+        """Poll the guest process until it exits, backing off between polls"""
+        deadline = time.monotonic() + GUEST_PROBE_TIMEOUT
+        delay = GUEST_PROBE_POLL_INTERVAL
+        while time.monotonic() < deadline:
+            processes = pm.ListProcessesInGuest(vm=vm, auth=creds, pids=[pid])
+            if processes and processes[0].endTime is not None:
+                return processes[0].exitCode
+            time.sleep(delay)
+            delay = min(delay * 2, 2)
+        raise TimeoutError(f"Probe did not finish within {GUEST_PROBE_TIMEOUT} seconds")
+
+class WindowsGuestCollector:
+    """Pipeline stage that probes powered-on Windows VMs for guest facts.
+
+    Works on inventory rows (from the pass that just ran, or from the
+    virtual_machines table) and on open vCenter sessions, and returns
+    windows_vms rows for the database writer. Facts are cached per VM, by
+    vCenter and MoRef, in windows_guest_facts; only VMs with expired or
+    invalidated facts are probed.
+    """
+
+    def __init__(self, credentials: Dict[str, Any]):
+        self.logger = logging.getLogger(__name__)
+        self.credentials = credentials
+        self.probe = GuestProbe(self.logger, pool_size=WINDOWS_COLLECTION_WORKERS)
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'total_windows_vms': 0,
+            'powered_on_vms': 0,
+            'successful_collections': 0,
+            'failed_collections': 0,
+            'vm_not_found': 0,
+            'duplicate_vm_names': 0,
+            'probes_skipped': 0,
+            'probes_triggered': 0,
+            'misroutes_avoided': 0,
+            'routed_by_guess': 0,
+            'found_by_moref': 0,
+            'unreachable_vcenter_vms': 0
+        }
+        self.failed_vcenters: List[str] = []  # vCenters of the last collect whose VMs could not be probed
+
+    def _count(self, key: str, amount: int = 1):
+        """Increment a statistic; workers for every vCenter update them concurrently"""
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def select_vms(self, vms_data: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Pick the powered-on Windows VMs out of inventory rows"""
+        windows_vms = [vm for vm in vms_data if vm.get('OS') and 'windows' in vm['OS'].lower()]
+        self.stats['total_windows_vms'] = len(windows_vms)
+
+        selected = []
+        for vm in windows_vms:
+            if vm.get('State') != 'poweredOn':
+                continue
+            # Clean up NIC type format
+            nic_types = [nic.strip().replace('vim.vm.device.', '')
+                         for nic in (vm.get('NICType') or '').split(',') if nic.strip()]
+            selected.append(dict(vm, NICType=','.join(nic_types)))
+
+        self.stats['powered_on_vms'] = len(selected)
+        self.logger.info(f"Found {len(selected)} powered on of {len(windows_vms)} Windows VMs")
+        return selected
+
+    def group_by_vcenter(self, vms: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        """Group VMs by the vCenter the inventory collected them from"""
+        vcenter_groups = {}
+        for vm in vms:
+            guess = self._extract_vcenter_from_cluster(vm.get('Cluster'))
+            if vm.get('VCenter'):
+                vcenter = vm['VCenter']
+                if guess != vcenter:
+                    # The cluster-name guess would have searched the wrong vCenter
+                    self._count('misroutes_avoided')
+            else:
+                # Rows collected before the inventory recorded vCenters
+                vcenter = guess
+                self._count('routed_by_guess')
+            if vcenter:
+                vcenter_groups.setdefault(vcenter, []).append(vm)
+        return vcenter_groups
+
+    def _extract_vcenter_from_cluster(self, cluster: Optional[str]) -> Optional[str]:
+        """Guess vCenter hostname from cluster name, for VMs without a recorded vCenter"""
+        if not cluster:
+            return None
+        site_prefix = cluster.split('-')[0].lower()
+        return next((vc['host'] for vc in VCENTERS if vc['host'].startswith(site_prefix)), None)
+
+    def _load_fact_cache(self) -> Dict[tuple, WindowsGuestFacts]:
+        """Cached guest facts keyed by (vCenter, MoRef)"""
+        return {(entry.VCenter, entry.MoRef): entry for entry in WindowsGuestFacts.query.all()}
+
+    def _due_groups(self, vm_name: str, runtime: Dict[str, Any], cached: Optional[WindowsGuestFacts],
+                    now: datetime) -> List[str]:
+        """Fact groups a VM must be probed for: all of them on a trigger, else the expired ones"""
+        if cached is None:
+            return list(WINDOWS_FACT_TTLS)
+        if runtime.get('boot_time') and runtime['boot_time'] != cached.boot_time:
+            return list(WINDOWS_FACT_TTLS)  # Rebooted or newly powered on
+        if runtime.get('tools_version') and runtime['tools_version'] != cached.tools_version:
+            return list(WINDOWS_FACT_TTLS)  # VMware Tools upgraded
+
+        fact_times = json.loads(cached.fact_times or '{}')
+        due = []
+        for group, ttl in WINDOWS_FACT_TTLS.items():
+            probed = fact_times.get(group)
+            # Spread expiry over the last quarter of the TTL, stable per VM and group
+            spread = int(hashlib.md5(f"{vm_name}:{group}".encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+            if not probed or now - datetime.fromisoformat(probed) > timedelta(seconds=ttl * (0.75 + 0.25 * spread)):
+                due.append(group)
+        return due
+
+    def _store_facts(self, key: tuple, vm_name: str, runtime: Dict[str, Any], cached: Optional[WindowsGuestFacts],
+                     groups: List[str], facts: Dict[str, Any], duration: float, now: datetime) -> WindowsGuestFacts:
+        """Merge freshly probed fact groups into the cache entry of the VM with this (vCenter, MoRef)"""
+        entry = cached or WindowsGuestFacts(VCenter=key[0], MoRef=key[1])
+        entry.VMName = vm_name  # Follows renames
+        merged = json.loads(entry.facts or '{}')
+        merged.update(facts)
+        fact_times = json.loads(entry.fact_times or '{}')
+        fact_times.update({group: now.isoformat() for group in groups})
+
+        entry.facts = json.dumps(merged)
+        entry.fact_times = json.dumps(fact_times)
+        entry.boot_time = runtime.get('boot_time')
+        entry.tools_version = runtime.get('tools_version')
+        entry.last_probe = now
+        entry.last_duration = round(duration, 2)
+        entry.last_error = None
+        db.session.add(entry)
+        return entry
+
+    def collect(self, sessions: Dict[str, Dict[str, Any]], vms_data: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Probe Windows VMs on every vCenter at once and return windows_vms rows.
+
+        ``sessions`` maps vCenter hosts to open ``{'si', 'content'}`` sessions.
+        Only VMs with expired or invalidated facts are probed, and only for
+        the fact groups that need it; the others, and VMs on vCenters without
+        a session, are reported from the fact cache. Probes are dispatched from
+        one queue, slowest VMs first (by last probe time; VMs never probed
+        count as slowest), under a global worker budget. A VM only starts when
+        its vCenter and its ESXi host are below their own caps, so guest
+        operations never pile up on one host.
+        """
+        vcenter_groups = self.group_by_vcenter(self.select_vms(vms_data))
+        self.failed_vcenters = []
+        now = datetime.utcnow()
+        cache = self._load_fact_cache()
+        rows = []
+        pending = []
+        for vcenter, vms in vcenter_groups.items():
+            session = sessions.get(vcenter)
+            index = None
+            if session:
+                try:
+                    index = self._index_vms(session['content'], vms)
+                except Exception as e:
+                    self.logger.error(f"Error indexing Windows VMs on {vcenter}: {str(e)}")
+            if index is None:
+                # Keep reporting what we knew about an unreachable vCenter's VMs
+                self.failed_vcenters.append(vcenter)
+                for vm_info in vms:
+                    cached = cache.get((vcenter, vm_info.get('MoRef')))
+                    if cached:
+                        self._count('unreachable_vcenter_vms')
+                        rows.append(self._build_row(dict(vm_info, VCenter=vcenter),
+                                                    json.loads(cached.facts or '{}')))
+                continue
+
+            for vm_info in vms:
+                vm = self._find_vm(index, vm_info)
+                if not vm:
+                    self._count('vm_not_found')
+                    continue
+                vm_info = dict(vm_info, VCenter=vcenter, MoRef=vm._moId)
+                runtime = index['runtime'].get(vm._moId, {})
+                cached = cache.get((vcenter, vm._moId))
+                groups = self._due_groups(vm_info['VMName'], runtime, cached, now)
+                if groups:
+                    if len(groups) == len(WINDOWS_FACT_TTLS) and cached:
+                        self._count('probes_triggered')
+                    pending.append((vcenter, vm, vm_info, runtime, groups))
+                else:
+                    self._count('probes_skipped')
+                    rows.append(self._build_row(vm_info, json.loads(cached.facts or '{}')))
+
+        pending.sort(key=lambda item: cache[item[0], item[1]._moId].last_duration or 0
+                     if (item[0], item[1]._moId) in cache else float('inf'), reverse=True)
+        self.logger.info(f"Probing {len(pending)} Windows VMs, {self.stats['probes_skipped']} up to date")
+
+        running_per_vcenter = Counter()
+        running_per_host = Counter()
+        with ThreadPoolExecutor(max_workers=WINDOWS_COLLECTION_WORKERS,
+                                thread_name_prefix='guest-probe') as executor:
+            in_flight = {}
+            while pending or in_flight:
+                # Start everything the caps allow, keeping the slowest-first order
+                waiting = []
+                for item in pending:
+                    vcenter, vm, vm_info = item[:3]
+                    if (len(in_flight) < WINDOWS_COLLECTION_WORKERS
+                            and running_per_vcenter[vcenter] < WINDOWS_COLLECTION_PER_VCENTER
+                            and running_per_host[vm_info['Host']] < WINDOWS_COLLECTION_PER_HOST):
+                        future = executor.submit(self._timed_probe, vcenter, sessions[vcenter]['content'],
+                                                 vm, vm_info, item[4])
+                        in_flight[future] = item
+                        running_per_vcenter[vcenter] += 1
+                        running_per_host[vm_info['Host']] += 1
+                    else:
+                        waiting.append(item)
+                pending = waiting
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    vcenter, vm, vm_info, runtime, groups = in_flight.pop(future)
+                    running_per_vcenter[vcenter] -= 1
+                    running_per_host[vm_info['Host']] -= 1
+                    cached = cache.get((vcenter, vm._moId))
+                    facts, duration = future.result()
+
+                    if facts is not None:
+                        entry = self._store_facts((vcenter, vm._moId), vm_info['VMName'], runtime, cached,
+                                                  groups, facts, duration, now)
+                        rows.append(self._build_row(vm_info, json.loads(entry.facts)))
+                        self._count('successful_collections')
+                    else:
+                        self._count('failed_collections')
+                        if cached:
+                            # Report what we knew rather than dropping the VM
+                            cached.last_error = 'Probe failed'
+                            rows.append(self._build_row(vm_info, json.loads(cached.facts or '{}')))
+
+        db.session.commit()
+        return rows
+
+    def _timed_probe(self, vcenter: str, content, vm: vim.VirtualMachine, vm_info: Dict[str, Any],
+                     groups: List[str]):
+        start = time.monotonic()
+        try:
+            creds = vim.vm.guest.NamePasswordAuthentication(
+                username=self.credentials['windows']['username'],
+                password=self.credentials['windows']['password']
+            )
+            facts = self.probe.run(content, vm, creds, groups, vcenter)
+        except Exception as e:
+            self.logger.error(f"Error processing VM {vm_info['VMName']}: {str(e)}")
+            facts = None
+        return facts, time.monotonic() - start
+
+    def _build_row(self, vm_info: Dict[str, Any], facts: Dict[str, Any]) -> Dict[str, Any]:
+        """Combine inventory fields and guest facts into a windows_vms row"""
+        # SCHANNEL "Enabled" is 0 when the protocol is explicitly disabled
+        ssl_disabled = facts.get('ssl3_client_enabled') == 0
+        tls_disabled = facts.get('tls11_client_enabled') == 0
+
+        return {
+            'VCenter': vm_info['VCenter'],
+            'MoRef': vm_info['MoRef'],
+            'VMName': vm_info['VMName'],
+            'OS': facts.get('os') or vm_info['OS'],
+            'Site': vm_info['Site'],
+            'State': vm_info['State'],
+            'Size': vm_info['SizeGB'],
+            'IP': vm_info['IP'],
+            'NICType': vm_info['NICType'],
+            'VMToolsVersion': vm_info['VMTools'],
+            'VMHardwareVersion': vm_info['VMVersion'],
+            'Cortex': facts.get('cortex') == 'Running',
+            'CortexVersion': facts.get('cortex_version'),
+            'VR': facts.get('vr') == 'Running',
+            'UpdateTG': facts.get('target_group'),
+            'Ciphers': ssl_disabled and tls_disabled,
+            'Notes': vm_info['Notes']
+        }
+
+    def _index_vms(self, content, vms: List[Dict[str, Any]]) -> Dict[str, Dict]:
+        """Resolve VMs to references plus the boot time and Tools version that invalidate cached facts.
+
+        VMs with a MoRef from the inventory are read directly in one bulk
+        call; a container view over every VM is only used when some VMs have
+        no MoRef or one no longer exists.
+        """
+        stub = content.propertyCollector._stub
+        refs = [vim.VirtualMachine(vm['MoRef'], stub) for vm in vms if vm.get('MoRef')]
+        if refs and len(refs) == len(vms):
+            try:
+                return self._retrieve_index(content, [
+                    vim.PropertyCollector.ObjectSpec(obj=ref, skip=False) for ref in refs
+                ])
+            except vmodl.fault.ManagedObjectNotFound:
+                self.logger.info("A recorded VM no longer exists, indexing all VMs instead")
+
+        container = content.viewManager.CreateContainerView(content.rootFolder, [vim.VirtualMachine], True)
+        try:
+            traversal = vim.PropertyCollector.TraversalSpec(
+                name='traverseView', type=vim.view.ContainerView, path='view', skip=False
+            )
+            return self._retrieve_index(content, [
+                vim.PropertyCollector.ObjectSpec(obj=container, skip=True, selectSet=[traversal])
+            ])
+        finally:
+            container.Destroy()
+
+    def _retrieve_index(self, content, object_specs: list) -> Dict[str, Dict]:
+        """Read name, instance UUID, boot time and Tools version for VMs with one paged retrieval"""
+        index = {'name': {}, 'uuid': {}, 'moref': {}, 'runtime': {}}
+        filter_spec = vim.PropertyCollector.FilterSpec(
+            objectSet=object_specs,
+            propSet=[vim.PropertyCollector.PropertySpec(
+                type=vim.VirtualMachine,
+                pathSet=['name', 'config.instanceUuid', 'runtime.bootTime', 'guest.toolsVersion']
+            )]
+        )
+        collector = content.propertyCollector
+        result = collector.RetrievePropertiesEx([filter_spec], vim.PropertyCollector.RetrieveOptions())
+
+        while result:
+            for obj in result.objects:
+                props = {prop.name: prop.val for prop in obj.propSet}
+                name = props.get('name')
+                if name in index['name']:
+                    # Names are not unique across folders; MoRef and UUID lookups still work
+                    self._count('duplicate_vm_names')
+                    self.logger.warning(f"Duplicate VM name {name}, using the first match")
+                else:
+                    index['name'][name] = obj.obj
+                if props.get('config.instanceUuid'):
+                    index['uuid'][props['config.instanceUuid']] = obj.obj
+                index['moref'][obj.obj._moId] = obj.obj
+                boot_time = props.get('runtime.bootTime')
+                index['runtime'][obj.obj._moId] = {
+                    # Stored naive UTC like every other timestamp in the database
+                    'boot_time': boot_time.astimezone(timezone.utc).replace(tzinfo=None) if boot_time else None,
+                    'tools_version': props.get('guest.toolsVersion')
+                }
+
+            if not result.token:
+                break
+            result = collector.ContinueRetrievePropertiesEx(result.token)
+
+        return index
+
+    def _find_vm(self, index: Dict[str, Dict], vm_info: Dict[str, Any]) -> Optional[vim.VirtualMachine]:
+        """Find a VM object in the index by MoRef, then instance UUID, then name"""
+        vm = index['moref'].get(vm_info.get('MoRef'))
+        if vm:
+            self._count('found_by_moref')
+            return vm
+        if vm_info.get('InstanceUuid'):
+            vm = index['uuid'].get(vm_info['InstanceUuid'])
+            if vm:
+                return vm
+        return index['name'].get(vm_info['VMName'])
@@ -37,15 +37,104 @@ VCENTERS: List[Dict[str, str]] = [
 # Credential configuration
 VCENTER_PASSWORD_ID = "28417"
 WINDOWS_PASSWORD_ID = "13579"
+CREDENTIAL_PROVIDER = os.environ.get('INFRAWEB_CREDENTIAL_PROVIDER', 'powershell')  # powershell, env, file, keyring or static
+CREDENTIAL_SCRIPT_TIMEOUT = 120  # Seconds to wait for the PowerShell credential script
+CREDENTIAL_FILE = os.environ.get('INFRAWEB_CREDENTIAL_FILE', os.path.join(DATA_DIR, 'credentials.json'))  # file provider
+CREDENTIAL_KEYRING_SERVICE = 'infraweb'  # keyring provider
+CREDENTIAL_REFRESH_INTERVAL = 3600  # Seconds credentials are used before being fetched again
+CREDENTIAL_RENEW_BEFORE = 600  # Background renewal starts this many seconds before expiry
+CREDENTIAL_RETRY_INTERVAL = 60  # Seconds between renewal attempts after a failure
+# Kept outside the repository, owner-only; created on first use
+CREDENTIAL_CACHE_DIR = os.environ.get('INFRAWEB_CREDENTIAL_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.infraweb'))
+CREDENTIAL_CACHE_FILE = os.path.join(CREDENTIAL_CACHE_DIR, 'credentials.cache')  # Encrypted, for fast cold starts
+CREDENTIAL_CACHE_KEY_FILE = os.environ.get('INFRAWEB_CREDENTIAL_KEY_FILE',
+                                           os.path.join(CREDENTIAL_CACHE_DIR, 'credentials.key'))
+CREDENTIAL_CACHE_TTL = 3600  # Cached credentials older than this are ignored
 
 # Logging configuration
 LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 LOG_FILE = os.path.join(LOG_DIR, 'app.log')
 LOG_LEVEL = 'INFO'
 
+# Cache configuration
+CACHE_VIEW_TIMEOUT = 86400  # Views are keyed by data generation, so long TTLs are safe
+CACHE_LOCK_TIMEOUT = 60  # Seconds before the rebuild lock of a crashed request expires
+CACHE_LOCK_WAIT = 10  # Seconds other requests wait for a rebuild before rendering themselves
+CACHE_LOCK_POLL = 0.05  # Seconds between checks for a rebuild finished by another process
+CACHE_EARLY_REFRESH_BETA = 1.0  # Eagerness of probabilistic refresh before expiry; 0 disables it
+TEMPLATE_STREAM_CHUNK = 32768  # Characters of a streamed list page sent per chunk
+# Flask-Caching backend; the default keeps hot entries in process memory in front of Redis
+CACHE_TYPE = os.environ.get('INFRAWEB_CACHE_TYPE', 'app.services.cache.layered.LayeredCache')
+CACHE_REDIS_URL = os.environ.get('INFRAWEB_REDIS_URL', 'redis://redis:6379/0')  # Empty for process memory only
+CACHE_LOCAL_MAX_BYTES = int(os.environ.get('INFRAWEB_CACHE_LOCAL_MAX_MB', 128)) * 1024 * 1024  # Per process
+CACHE_REDIS_TIMEOUT = 0.5  # Seconds before a Redis call counts as failed
+CACHE_REDIS_RETRY = 30  # Seconds in process-memory-only mode after Redis fails
+CACHE_INVALIDATION_CHANNEL = 'infraweb:cache:invalidate'  # Pub/sub channel evicting other processes' copies
+
+# Pre-rendered artifact configuration
+ARTIFACT_DIR = os.path.join(DATA_DIR, 'artifacts')
+ARTIFACT_RETENTION = 3600  # Seconds to keep superseded artifacts for in-flight downloads
+EXPORT_HTML_PAGES = False  # Also export list pages, not just /api/* payloads
+
+# Metrics configuration
+METRICS_DIR = os.path.join(DATA_DIR, 'metrics')  # Per-process snapshots summed by /metrics
+METRICS_FLUSH_INTERVAL = 15  # Seconds between snapshot writes
+METRICS_STALE_AFTER = 120  # Snapshots older than this belong to exited processes
+
+# Request profiling (development and troubleshooting only)
+PROFILING_ENABLED = os.environ.get('INFRAWEB_PROFILING', '0') == '1'  # Also exposes /_debug/profiles
+PROFILING_SLOW_MS = int(os.environ.get('INFRAWEB_PROFILING_SLOW_MS', 500))  # Keep requests slower than this
+PROFILING_SAMPLE_RATE = float(os.environ.get('INFRAWEB_PROFILING_SAMPLE_RATE', 0.01))  # Share run under cProfile
+PROFILING_BUFFER_SIZE = 50  # Captured requests kept per worker
+PROFILING_STACK_INTERVAL = 0.005  # Seconds between stack samples of profiled requests
+PROFILING_N_PLUS_ONE = 10  # Repeats of one SQL statement in a request flagged as N+1
+
 # Scheduler configuration
 UPDATE_SCHEDULE_TIME = "07:00"  # Daily update time
+SCHEDULER_MAX_WORKERS = 3  # Scheduled jobs that may run at the same time
+
+# Jobs per data class: an interval in seconds or a daily "HH:MM", plus dependencies and jitter
+SCHEDULED_JOBS = {
+    # Power state, quickStats, snapshots and VM placement
+    'inventory': {'interval': 600, 'jitter': 60},
+    # Certificates, health checks and affinity rules
+    'vcenter_health': {'interval': 3600, 'jitter': 300},
+    # Host hardware vendor/model/serial and DNS/NTP configuration
+    'static_facts': {'interval': 7 * 86400, 'jitter': 3600},
+    # Guest operations inside Windows VMs, on the sessions and VM list of the next inventory run
+    'windows_guest': {'at': UPDATE_SCHEDULE_TIME, 'depends_on': ['inventory'], 'jitter': 300},
+}
+SCHEDULER_LOCK_FILE = os.path.join(DATA_DIR, 'scheduler.lock')  # Only the holder runs the scheduler
+SCHEDULER_LEADER_RETRY = 30  # Seconds between leader lock attempts by standby workers
+
+# Collector process configuration
+COLLECTOR_MODE = os.environ.get('INFRAWEB_COLLECTOR_MODE', 'external')  # 'external' (run_collector.py) or 'embedded'
+COLLECTOR_POLL_INTERVAL = 5  # Seconds between job queue polls
+COLLECTOR_NICE = 10  # Scheduling priority decrement for the collector process (POSIX only)
+COLLECTOR_MEMORY_LIMIT_MB = int(os.environ.get('INFRAWEB_COLLECTOR_MEMORY_LIMIT_MB', 0))  # 0 = unlimited
+
+# Windows guest probe configuration
+GUEST_PROBE_TIMEOUT = 120  # Seconds to wait for the probe script inside a VM
+GUEST_PROBE_POLL_INTERVAL = 0.25  # First delay between process status polls, doubled up to 2 s
+GUEST_PROBE_OUTPUT = 'C:\\Windows\\Temp\\infraweb_probe.json'  # Overwritten by every run
+WINDOWS_COLLECTION_WORKERS = 32  # Guest probes running at once across all vCenters
+WINDOWS_COLLECTION_PER_VCENTER = 12  # Guest probes running at once on one vCenter
+WINDOWS_COLLECTION_PER_HOST = 3  # Guest probes running at once on one ESXi host
+# Seconds each group of guest facts stays fresh; a reboot, power-on or Tools upgrade re-probes all of them.
+# Expiry is spread over the last quarter of the TTL per VM so the fleet does not expire on the same night.
+WINDOWS_FACT_TTLS = {
+    'os': 30 * 86400,
+    'target_group': 7 * 86400,
+    'ciphers': 7 * 86400,
+    'cortex_version': 3 * 86400,
+    'services': 2 * 86400,
+}
 
 # Application configuration
 DEBUG = True  # Set to False in production
-PORT = 5005
\ No newline at end of file
+PORT = 5005
+
+# Production server configuration (gunicorn.conf.py)
+WORKERS = int(os.environ.get('INFRAWEB_WORKERS', (os.cpu_count() or 1) * 2 + 1))
+THREADS = int(os.environ.get('INFRAWEB_THREADS', 4))
+WORKER_TIMEOUT = int(os.environ.get('INFRAWEB_WORKER_TIMEOUT', 120))
@@ -0,0 +1,46 @@
+"""Production server settings: gunicorn -c gunicorn.conf.py wsgi:app
+
+Workers are pre-forked from a master that has already imported and built the
+app (preload_app), so forks share its memory and start instantly. Send HUP to
+re-fork workers gracefully with new settings; for new code use USR2 followed by
+WINCH/TERM on the old master.
+
+By default collection runs in the separate run_collector.py process and the
+workers only queue jobs. With INFRAWEB_COLLECTOR_MODE=embedded exactly one
+worker runs the scheduler instead, elected through the leader lock in
+app/scheduler/leader.py.
+"""
+from app.utils.config import PORT, WORKERS, THREADS, WORKER_TIMEOUT, COLLECTOR_MODE
+
+bind = f"0.0.0.0:{PORT}"
+workers = WORKERS
+threads = THREADS
+worker_class = 'gthread'
+preload_app = True
+
+timeout = WORKER_TIMEOUT
+graceful_timeout = WORKER_TIMEOUT
+keepalive = 5
+
+# Recycle workers periodically to bound memory growth; the jitter avoids recycling all at once.
+# An embedded scheduler lives in one of the workers and recycling it would kill a running
+# collection, so workers are only recycled when collection runs in run_collector.py.
+max_requests = 0 if COLLECTOR_MODE == 'embedded' else 1000
+max_requests_jitter = 100
+
+accesslog = '-'
+errorlog = '-'
+
+def post_worker_init(worker):
+    """Drop connections inherited from the master, share metrics and, if embedded, join the scheduler election"""
+    from app.models.infra import db
+    from app.services.metrics import metrics
+
+    app = worker.wsgi
+    with app.app_context():
+        db.engine.dispose(close=False)
+    # Each worker writes its snapshot so a scrape answered by any worker sums all of them
+    metrics.start_flushing()
+    if COLLECTOR_MODE == 'embedded':
+        from app.scheduler import scheduler_manager
+        scheduler_manager.start_when_leader(app)
@@ -0,0 +1,71 @@
+from app import create_app, create_missing_tables
+import os
+import signal
+import sys
+import logging
+from app.scheduler import scheduler_manager
+from app.services.metrics import metrics
+from app.utils.config import (LOG_FORMAT, LOG_DIR, COLLECTOR_NICE,
+                              COLLECTOR_MEMORY_LIMIT_MB)
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format=LOG_FORMAT,
+    handlers=[
+        logging.FileHandler(os.path.join(LOG_DIR, 'collector.log')),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+def signal_handler(sig, frame):
+    """Handle shutdown signals; the loop exits after the current poll or job"""
+    logger.info("Shutdown signal received. Stopping collector...")
+    scheduler_manager.is_running = False
+
+def apply_resource_limits():
+    """Lower the collector's priority and cap its memory so it cannot starve the web tier"""
+    try:
+        import resource
+    except ImportError:
+        logger.info("Resource limits are not supported on this platform")
+        return
+
+    if COLLECTOR_NICE:
+        os.nice(COLLECTOR_NICE)
+        logger.info(f"Collector niceness increased by {COLLECTOR_NICE}")
+
+    if COLLECTOR_MEMORY_LIMIT_MB:
+        limit = COLLECTOR_MEMORY_LIMIT_MB * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        logger.info(f"Collector address space limited to {COLLECTOR_MEMORY_LIMIT_MB} MB")
+
+def main():
+    """Run the scheduler and job queue as a standalone collector service"""
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
+    apply_resource_limits()
+
+    if not scheduler_manager.leader_lock.try_acquire():
+        logger.error("Another collector or embedded scheduler already holds the leader lock")
+        sys.exit(1)
+
+    try:
+        app = create_app()
+        create_missing_tables(app)
+        metrics.start_flushing()  # The web workers render what the collector counts
+        scheduler_manager.init_app(app)
+        logger.info(f"Collector service started (pid {os.getpid()})")
+        scheduler_manager.run()
+    except Exception as e:
+        logger.error(f"Collector service failed: {str(e)}")
+        sys.exit(1)
+    finally:
+        scheduler_manager.leader_lock.release()
+        logger.info("Collector service stopped")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import os
+import sys
+import argparse
+import subprocess
+from typing import Dict, List, Tuple
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Entry point -> (statement run with -X importtime, budget in ms, modules it must never load)
+ENTRY_POINTS: Dict[str, Tuple[str, int, Tuple[str, ...]]] = {
+    # Every gunicorn worker; the web tier never collects
+    'wsgi': ('import wsgi', 1500, ('pyVmomi', 'pyVim', 'requests')),
+    # Maintenance scripts that build the app
+    'warm_cache': ('import warm_cache', 1500, ('pyVmomi', 'pyVim', 'requests')),
+    'init_db': ('import init_db', 1500, ('pyVmomi', 'pyVim', 'requests')),
+    # Collector process; pyVmomi is loaded by the first collection, not at startup
+    'run_collector': ('import run_collector', 2000, ('pyVmomi', 'pyVim')),
+}
+
+def measure(statement: str) -> List[Tuple[int, int, int, str]]:
+    """Run a statement in a fresh interpreter and parse its -X importtime output.
+
+    Returns (depth, self_us, cumulative_us, module) for every import.
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([BASE_DIR, os.path.join(BASE_DIR, 'scripts')]))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            cwd=BASE_DIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"'{statement}' failed:\n{result.stderr[-2000:]}")
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((depth, int(self_us), int(cumulative_us), name.strip()))
+    return imports
+
+def total_ms(imports: List[Tuple[int, int, int, str]]) -> float:
+    return sum(i[2] for i in imports if i[0] == 0) / 1000
+
+def fastest(statement: str, runs: int) -> List[Tuple[int, int, int, str]]:
+    """The imports of the fastest of several runs, which filters out disk cache and scheduling noise"""
+    return min((measure(statement) for _ in range(runs)), key=total_ms)
+
+def leaked_modules(imports: List[Tuple[int, int, int, str]], forbidden: Tuple[str, ...]) -> List[str]:
+    """The forbidden modules, or submodules of them, that were imported"""
+    loaded = {i[3] for i in imports}
+    return sorted(module for module in forbidden
+                  if module in loaded or any(m.startswith(f"{module}.") for m in loaded))
+
+def report(name: str, statement: str, budget_ms: int, forbidden: Tuple[str, ...],
+           runs: int, top: int) -> bool:
+    """Print the import cost of one entry point and whether it is within budget"""
+    imports = fastest(statement, runs)
+    elapsed_ms = total_ms(imports)
+    leaked = leaked_modules(imports, forbidden)
+    ok = elapsed_ms <= budget_ms and not leaked
+
+    print(f"\n{name}: {elapsed_ms:.0f} ms of {budget_ms} ms budget, "
+          f"{len(imports)} modules - {'PASS' if ok else 'FAIL'}")
+    print("-" * 50)
+    heaviest = sorted((i for i in imports if i[0] <= 2), key=lambda i: i[2], reverse=True)[:top]
+    for depth, _, cumulative_us, module in heaviest:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {'  ' * depth}{module}")
+    if leaked:
+        print(f"  Loads modules it must not import: {', '.join(leaked)}")
+    return ok
+
+def main():
+    """Report import time per entry point and fail when one exceeds its budget"""
+    parser = argparse.ArgumentParser(description='Report and check import time of the entry points')
+    parser.add_argument('entry_points', nargs='*',
+                        help=f"Entry points to check: {', '.join(ENTRY_POINTS)} (default: all)")
+    parser.add_argument('--runs', type=int, default=3, help='Runs per entry point, the fastest counts')
+    parser.add_argument('--top', type=int, default=15, help='Heaviest imports to list')
+    args = parser.parse_args()
+    unknown = set(args.entry_points) - set(ENTRY_POINTS)
+    if unknown:
+        parser.error(f"Unknown entry points: {', '.join(sorted(unknown))}")
+
+    results = {}
+    for name in args.entry_points or ENTRY_POINTS:
+        statement, budget_ms, forbidden = ENTRY_POINTS[name]
+        results[name] = report(name, statement, budget_ms, forbidden, args.runs, args.top)
+
+    failed = [name for name, ok in results.items() if not ok]
+    print(f"\n{len(results) - len(failed)} of {len(results)} entry points within budget")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -63,7 +63,6 @@ def check_prerequisites():
         'flask',
         'flask-sqlalchemy',
         'pyvmomi',
-        'schedule',
         'requests'
     ]
 
@@ -148,4 +147,4 @@ def main():
     print(f"\nOverall Status: {results['status'].upper()}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,257 @@
+import os
+import sys
+import json
+import random
+import argparse
+from datetime import datetime, timedelta
+
+# Add the parent directory to the Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.models.infra import (db, VCenterInfo, AffinityRule, Hosts, Clusters, VirtualMachines, WindowsVMs,
+                              ProdUsers, DevUsers, UsersGroups, Snapshots, UpdateStats, DataGeneration,
+                              CollectionJob, WindowsGuestFacts, CollectorHeartbeat, SchedulerJobState, row_hash)
+from app.utils.config import VCENTERS, DATABASE_PATH, SCHEDULED_JOBS, WINDOWS_FACT_TTLS
+
+# Per vCenter at scale 1.0; roughly the size of the production estate
+CLUSTERS_PER_VCENTER = 4
+HOSTS_PER_CLUSTER = (6, 16)
+VMS_PER_HOST = (10, 40)
+USERS = {'prod_users': 2000, 'dev_users': 600, 'users_groups': 3500}
+BATCH_SIZE = 5000
+
+# (value, weight)
+OS_STRINGS = [
+    ('Microsoft Windows Server 2019 (64-bit)', 30),
+    ('Microsoft Windows Server 2022 (64-bit)', 18),
+    ('Microsoft Windows Server 2016 or later (64-bit)', 8),
+    ('Microsoft Windows 10 (64-bit)', 3),
+    ('Red Hat Enterprise Linux 8 (64-bit)', 16),
+    ('Red Hat Enterprise Linux 9 (64-bit)', 7),
+    ('Ubuntu Linux (64-bit)', 8),
+    ('VMware Photon OS (64-bit)', 4),
+    ('Other 3.x or later Linux (64-bit)', 3),
+    (None, 3)  # Tools not running, OS unknown
+]
+HOST_MODELS = [('Dell Inc.', 'PowerEdge R750'), ('Dell Inc.', 'PowerEdge R740xd'),
+               ('HPE', 'ProLiant DL380 Gen10'), ('Cisco Systems Inc', 'UCSC-C240-M5SX')]
+NIC_TYPES = ['vim.vm.device.VirtualVmxnet3', 'vim.vm.device.VirtualE1000e', 'vim.vm.device.VirtualE1000']
+ROLES = ['Administrator', 'Operator', 'Read-Only', 'Backup Operator', 'Auditor']
+TARGET_GROUPS = ['Servers-Pilot', 'Servers-Prod-Wave1', 'Servers-Prod-Wave2', 'Servers-Critical']
+
+def weighted(rng: random.Random, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights=weights)[0]
+
+def insert(model, rows):
+    """Bulk insert rows in batches through Core, bypassing ORM unit-of-work overhead"""
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(model.__table__.insert(), rows[start:start + BATCH_SIZE])
+
+def snapshot_age(rng: random.Random) -> timedelta:
+    """Most snapshots are a few days old, a long tail is forgotten for months"""
+    return timedelta(days=min(rng.expovariate(1 / 20), 900), hours=rng.randint(0, 23))
+
+def generate(db_path: str, scale: float = 1.0, seed: int = 42) -> dict:
+    """Create a database at db_path filled with synthetic data; returns row counts per table"""
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.abspath(db_path)}',
+                      'CACHE_TYPE': 'NullCache'})
+
+    rows = {model: [] for model in (VCenterInfo, AffinityRule, Hosts, Clusters, VirtualMachines, WindowsVMs,
+                                    ProdUsers, DevUsers, UsersGroups, Snapshots, UpdateStats, DataGeneration,
+                                    CollectionJob, WindowsGuestFacts, CollectorHeartbeat, SchedulerJobState)}
+    vm_number = 0
+    clusters_per_vcenter = max(1, round(CLUSTERS_PER_VCENTER * scale))
+
+    for vcenter in VCENTERS:
+        site = vcenter['host'].split('-vcenter')[0]
+        rows[VCenterInfo].append({
+            'hostname': vcenter['host'], 'version': rng.choice(['8.0.2', '8.0.3', '7.0.3']),
+            'build_number': str(rng.randint(22000000, 24000000)), 'deploy_type': vcenter['DeployType'],
+            'ssl_certificate_expiration': now + timedelta(days=rng.randint(-10, 700)),
+            'ssl_issuer': f'CN=CA, DC=vsphere, DC=local, C=US, ST=California, O={site}',
+            'ssl_subject': f"CN={vcenter['host']}", 'idp_type': rng.choice(['vsphere.local', 'Okta']),
+            'idp_token_expiration': now + timedelta(days=rng.randint(1, 365)), 'status': 'green',
+            'license_type': 'VCF' if vcenter['DeployType'] == 'VCF' else 'vSphere Foundation',
+            'license_expiry': now + timedelta(days=rng.randint(30, 1000)),
+            'storage_health_status': weighted(rng, [('Healthy', 8), ('Warning', 2), ('Critical', 1)]),
+            'disk_health_status': 'Normal', 'storage_capacity_used': round(rng.uniform(30, 90), 1),
+            'network_status': 'Normal', 'network_details': 'All Links Up',
+            'vsan_health_status': 'Healthy', 'vsan_disk_status': 'Normal', 'vsan_network_status': 'Normal',
+            'avg_latency': round(rng.uniform(0.5, 6), 2), 'cpu_overcommitment': round(rng.uniform(80, 400), 1),
+            'memory_overcommitment': round(rng.uniform(50, 150), 1),
+            'storage_overcommitment': round(rng.uniform(40, 180), 1),
+            'drs_status': 'Active', 'drs_balance': rng.choice(['Optimal', 'Good', 'Fair']),
+            'ha_status': 'Enabled', 'last_checked': now
+        })
+
+        for c in range(clusters_per_vcenter):
+            cluster = f"{site}-cl{c + 1:02d}"
+            datacenter = f"{site.upper()}-DC"
+            num_hosts = rng.randint(*HOSTS_PER_CLUSTER)
+            capacity = round(num_hosts * rng.uniform(7, 30), 2)
+            used = round(capacity * rng.uniform(0.3, 0.85), 2)
+            rows[Clusters].append({
+                'ClusterName': cluster, 'VCenter': vcenter['host'], 'DeployType': vcenter['DeployType'],
+                'CPUUtilization': round(rng.uniform(10, 80), 1), 'MemoryUtilization': round(rng.uniform(30, 90), 1),
+                'StorageUtilization': round(used / capacity * 100, 1), 'vSANEnabled': True,
+                'vSANCapacityTiB': capacity, 'vSANUsedTiB': used, 'vSANFreeTiB': round(capacity - used, 2),
+                'vSANUtilization': round(used / capacity * 100, 1), 'NumHosts': num_hosts,
+                'NumCPUSockets': num_hosts * 2, 'NumCPUCores': num_hosts * 64,
+                'FoundationLicenseCoreCount': num_hosts * 64, 'EntitledVSANLicenseTiBCount': num_hosts * 64 * 0.25,
+                'RequiredVSANTiBCapacity': capacity, 'VSANLicenseTiBCount': capacity,
+                'RequiredVVFComputeLicenses': num_hosts * 64, 'RequiredVSANAddOnLicenses': 0.0
+            })
+
+            hosts = []
+            for h in range(num_hosts):
+                host = f"{site}-esx{c + 1:02d}{h + 1:02d}.{vcenter['host'].split('.', 1)[1]}"
+                vendor, model = rng.choice(HOST_MODELS)
+                hosts.append(host)
+                rows[Hosts].append({
+                    'Host': host, 'VCenter': vcenter['host'], 'Datacenter': datacenter, 'Cluster': cluster,
+                    'NumCPU': 2, 'NumCores': 64, 'CPUUsagePercentage': round(rng.uniform(5, 85), 1),
+                    'Mem': 1024.0, 'MemoryUsagePercentage': round(rng.uniform(30, 90), 1),
+                    'TotalVMs': 0, 'DNS': '10.0.0.10, 10.0.0.11', 'NTP': 'ntp1.local, ntp2.local',
+                    'IP': f"10.{len(rows[Hosts]) // 250 % 250}.{len(rows[Hosts]) % 250}.10",
+                    'MAC': ':'.join(f"{rng.randint(0, 255):02x}" for _ in range(6)),
+                    'PowerPolicy': 'High performance', 'Vendor': vendor, 'Model': model,
+                    'ServiceTag': f"{rng.randint(0, 36 ** 7):07X}"
+                })
+
+            for h, host in enumerate(hosts):
+                num_vms = rng.randint(*VMS_PER_HOST)
+                rows[Hosts][len(rows[Hosts]) - len(hosts) + h]['TotalVMs'] = num_vms
+                for _ in range(num_vms):
+                    vm_number += 1
+                    name = f"{site.upper()}{weighted(rng, [('APP', 5), ('DB', 2), ('WEB', 3), ('UTIL', 1)])}{vm_number:05d}"
+                    os_name = weighted(rng, OS_STRINGS)
+                    state = weighted(rng, [('poweredOn', 88), ('poweredOff', 11), ('suspended', 1)])
+                    size = round(rng.choice([60, 100, 150, 250, 500, 1024]) * rng.uniform(0.9, 1.3), 2)
+                    nics = weighted(rng, [(NIC_TYPES[0], 8), (NIC_TYPES[1], 2), (NIC_TYPES[2], 1)])
+                    if rng.random() < 0.2:
+                        nics += f",{NIC_TYPES[0]}"  # Second NIC on a backup or storage network
+                    ip = f"10.{100 + vm_number // 62500 % 100}.{vm_number // 250 % 250}.{vm_number % 250 + 1}"
+                    vm = {
+                        'VMName': name, 'VCenter': vcenter['host'], 'MoRef': f"vm-{1000 + vm_number}",
+                        'InstanceUuid': f"{rng.getrandbits(128):032x}", 'OS': os_name, 'Site': site,
+                        'State': state, 'Created': now - timedelta(days=rng.randint(1, 2500)),
+                        'SizeGB': size, 'InUseGB': round(size * rng.uniform(0.2, 0.95), 2),
+                        'IP': ip if state == 'poweredOn' else None, 'NICType': nics,
+                        'VMTools': weighted(rng, [('toolsOk', 85), ('toolsOld', 10), ('toolsNotRunning', 5)]),
+                        'VMVersion': rng.choice([14, 15, 17, 19, 19, 20, 21]), 'Host': host, 'Cluster': cluster,
+                        'Notes': rng.choice(['', '', 'Owner: platform team', 'Decommission after migration'])
+                    }
+                    rows[VirtualMachines].append(vm)
+
+                    if rng.random() < 0.15:
+                        for s in range(rng.choice([1, 1, 1, 2, 3])):
+                            rows[Snapshots].append({
+                                'vm_id': vm['MoRef'], 'vm_name': name, 'snapshot': f"Before patching {s + 1}",
+                                'created': now - snapshot_age(rng), 'vcenter': vcenter['host'], 'cluster': cluster
+                            })
+
+                    if os_name and 'windows' in os_name.lower() and state == 'poweredOn':
+                        ssl_off = rng.random() < 0.8
+                        facts = {'os': os_name.split(' (')[0], 'cortex': 'Running', 'vr': 'Running',
+                                 'cortex_version': f"8.{rng.randint(1, 5)}.{rng.randint(0, 9)}",
+                                 'target_group': rng.choice(TARGET_GROUPS)}
+                        rows[WindowsVMs].append({
+                            'VCenter': vcenter['host'], 'MoRef': vm['MoRef'], 'VMName': name, 'OS': facts['os'], 'Site': site, 'State': state, 'Size': size,
+                            'IP': vm['IP'], 'NICType': nics.replace('vim.vm.device.', ''),
+                            'VMToolsVersion': vm['VMTools'], 'VMHardwareVersion': str(vm['VMVersion']),
+                            'Cortex': rng.random() < 0.95, 'CortexVersion': facts['cortex_version'],
+                            'VR': rng.random() < 0.9, 'UpdateTG': facts['target_group'],
+                            'Ciphers': str(int(ssl_off)), 'Notes': vm['Notes'], 'Tag': None
+                        })
+                        rows[WindowsGuestFacts].append({
+                            'VCenter': vcenter['host'], 'MoRef': vm['MoRef'], 'VMName': name,
+                            'boot_time': now - timedelta(days=rng.randint(0, 90)),
+                            'tools_version': '12352', 'facts': json.dumps(facts),
+                            'fact_times': json.dumps({group: (now - timedelta(hours=rng.randint(1, 48))).isoformat()
+                                                      for group in WINDOWS_FACT_TTLS}),
+                            'last_probe': now - timedelta(hours=rng.randint(1, 24)),
+                            'last_duration': round(rng.uniform(2, 40), 2), 'last_error': None
+                        })
+
+            for r in range(3):
+                members = [vm['VMName'] for vm in rng.sample(rows[VirtualMachines][-50:], 2)]
+                rows[AffinityRule].append({
+                    'vcenter': vcenter['host'], 'rule_name': f"{cluster}-rule{r + 1}",
+                    'rule_type': rng.choice(['affinity', 'anti-affinity', 'vm-host']),
+                    'enabled': rng.random() < 0.9, 'cluster': cluster, 'vms': ','.join(members),
+                    'hosts': ','.join(hosts[:2]) if r == 2 else '', 'mandatory': r == 2,
+                    'description': '', 'last_checked': now
+                })
+
+    for table, model in (('prod_users', ProdUsers), ('dev_users', DevUsers), ('users_groups', UsersGroups)):
+        for i in range(max(1, round(USERS[table] * scale))):
+            created = now - timedelta(days=rng.randint(1, 3000))
+            rows[model].append({
+                'Name': f"User {i:05d}", 'Samaccountname': f"u{i:05d}", 'Role': rng.choice(ROLES),
+                'Enabled': rng.random() < 0.85, 'CreationDate': created,
+                'LastLogin': None if rng.random() < 0.1 else created + timedelta(days=rng.randint(0, 2999))
+            })
+
+    for i in range(30):
+        rows[UpdateStats].append({'last_run': now - timedelta(days=i), 'duration': round(rng.uniform(200, 900), 1),
+                                  'total_count': 30 - i})
+    for i in range(200):
+        requested = now - timedelta(hours=i * 3)
+        status = 'failed' if rng.random() < 0.05 else 'succeeded'
+        rows[CollectionJob].append({
+            'scope': rng.choice(['all', 'all', f"vcenter:{rng.choice(VCENTERS)['host']}"]), 'status': status,
+            'requested_by': rng.choice(['web', 'schedule']), 'request_count': rng.randint(1, 3),
+            'requested_at': requested, 'started_at': requested + timedelta(seconds=5),
+            'finished_at': requested + timedelta(seconds=rng.randint(120, 900)), 'progress': '{}',
+            'error_message': 'Update failed, see collector log' if status == 'failed' else None
+        })
+    rows[CollectorHeartbeat].append({'id': 1, 'hostname': 'collector', 'pid': 1, 'started_at': now, 'last_seen': now})
+    for name in SCHEDULED_JOBS:
+        rows[SchedulerJobState].append({'name': name, 'last_started': now - timedelta(minutes=5),
+                                        'last_success': now - timedelta(minutes=3), 'last_duration': 120.0})
+    for model in rows:
+        if model not in (DataGeneration, CollectorHeartbeat, SchedulerJobState):
+            rows[DataGeneration].append({'table_name': model.__tablename__, 'generation': 1,
+                                         'updated_at': now, 'source': 'generate_test_data'})
+
+    for model in (Hosts, VirtualMachines):
+        for row in rows[model]:
+            row['RowHash'] = row_hash(model, row)  # As DatabaseManager stores it
+
+    with app.app_context():
+        db.create_all()
+        for model, model_rows in rows.items():
+            insert(model, model_rows)
+        db.session.commit()
+
+    return {model.__tablename__: len(model_rows) for model, model_rows in rows.items()}
+
+def main():
+    """Create a synthetic database for benchmarks and local development"""
+    parser = argparse.ArgumentParser(description='Generate a database filled with synthetic inventory data')
+    parser.add_argument('db_path', help='Database file to create')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='Scale factor; 1.0 is about the size of production (default: 1.0)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed, for reproducible data')
+    parser.add_argument('--force', action='store_true', help='Replace the file if it exists')
+    args = parser.parse_args()
+
+    if os.path.abspath(args.db_path) == os.path.abspath(DATABASE_PATH):
+        parser.error("Refusing to overwrite the production database")
+    if os.path.exists(args.db_path):
+        if not args.force:
+            parser.error(f"{args.db_path} exists, use --force to replace it")
+        os.remove(args.db_path)
+
+    counts = generate(args.db_path, args.scale, args.seed)
+    print(f"\nGenerated {args.db_path} at scale {args.scale}:")
+    print("-" * 50)
+    for table, count in counts.items():
+        print(f"{table}: {count}")
+
+if __name__ == "__main__":
+    main()
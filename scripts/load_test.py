@@ -0,0 +1,343 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from werkzeug.serving import make_server
+
+# Add the parent directory to the Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from app.models.infra import cache
+from app.services.cache import artifact_store
+from app.services.database.manager import DatabaseManager
+from generate_test_data import generate
+from run_benchmarks import current_rows, INVENTORY_KEYS
+
+# (weight, path): what a team of dashboard users requests; pages dominate, health checks poll
+MIX: List[Tuple[int, str]] = [
+    (15, '/'),
+    (12, '/virtual_machines'),
+    (8, '/hosts'),
+    (6, '/snapshots'),
+    (6, '/windows_vms'),
+    (5, '/vcenters'),
+    (5, '/clusters'),
+    (4, '/users_groups'),
+    (3, '/rules'),
+    (3, '/prod_users'),
+    (3, '/dev_users'),
+    (10, '/api/health'),
+    (5, '/api/virtual_machines'),
+    (4, '/api/hosts'),
+    (3, '/api/vcenters'),
+    (3, '/api/snapshots'),
+    (2, '/api/windows_vms'),
+    (2, '/api/clusters'),
+    (1, '/api/affinity_rules'),
+    (1, '/api/users_groups'),
+]
+
+REQUEST_TIMEOUT = 120
+
+CACHE_BACKENDS = {
+    'redis': 'RedisCache',
+    'layered': 'app.services.cache.layered.LayeredCache'
+}
+
+class Sample:
+    __slots__ = ('path', 'start', 'latency', 'status', 'size', 'during_write')
+
+    def __init__(self, path: str, start: float, latency: float, status: int, size: int, during_write: bool):
+        self.path = path
+        self.start = start
+        self.latency = latency
+        self.status = status
+        self.size = size
+        self.during_write = during_write
+
+class LoadTest:
+    """Closed-loop load: every client sends its next request as soon as the last one returns.
+
+    Each client is a thread with its own HTTP session, so connections are
+    kept alive like a browser's. With ``revalidate`` clients remember ETags
+    and send If-None-Match, as browsers do for pages they have seen.
+    """
+
+    def __init__(self, url: str, clients: int, duration: float, think: float = 0.0,
+                 revalidate: bool = False, seed: int = 42):
+        self.url = url.rstrip('/')
+        self.clients = clients
+        self.duration = duration
+        self.think = think
+        self.revalidate = revalidate
+        self.seed = seed
+        self.samples: List[Sample] = []
+        self.writing = threading.Event()
+        self.write_spans: List[Tuple[float, float]] = []
+        self._lock = threading.Lock()
+
+    def prime(self):
+        """Request every path once so the run starts from a warm cache"""
+        with requests.Session() as session:
+            for _, path in MIX:
+                session.get(f"{self.url}{path}", timeout=REQUEST_TIMEOUT)
+
+    def _client(self, number: int, deadline: float):
+        rng = random.Random(self.seed + number)
+        paths = [path for _, path in MIX]
+        weights = [weight for weight, _ in MIX]
+        etags: Dict[str, str] = {}
+        samples = []
+
+        with requests.Session() as session:
+            session.headers['Accept-Encoding'] = 'gzip, br'
+            while time.monotonic() < deadline:
+                path = rng.choices(paths, weights)[0]
+                headers = {'If-None-Match': etags[path]} if path in etags else {}
+                during_write = self.writing.is_set()
+                start = time.perf_counter()
+                try:
+                    response = session.get(f"{self.url}{path}", headers=headers, timeout=REQUEST_TIMEOUT)
+                    status, size = response.status_code, len(response.content)
+                    if self.revalidate and response.headers.get('ETag'):
+                        etags[path] = response.headers['ETag']
+                except requests.RequestException:
+                    status, size = 0, 0
+                samples.append(Sample(path, start, time.perf_counter() - start, status, size,
+                                      during_write or self.writing.is_set()))
+                if self.think:
+                    time.sleep(rng.expovariate(1 / self.think))
+
+        with self._lock:
+            self.samples.extend(samples)
+
+    def _writer(self, app, count: int, delay: float, deadline: float):
+        """Rewrite the inventory ``count`` times in a row, like a collection landing during the run"""
+        time.sleep(delay)
+        with app.app_context():
+            manager = DatabaseManager()
+            manager.logger.setLevel(logging.WARNING)
+            collected = current_rows(manager)
+            inventory = {key: collected[key] for key in INVENTORY_KEYS if key in collected}
+            for _ in range(count):
+                if time.monotonic() >= deadline:
+                    break
+                self.writing.set()
+                start = time.perf_counter()
+                try:
+                    manager.perform_full_update(inventory, source='load_test')
+                finally:
+                    self.writing.clear()
+                    self.write_spans.append((start, time.perf_counter()))
+
+    def run(self, write_app=None, writes: int = 0, write_delay: float = 5.0):
+        deadline = time.monotonic() + self.duration
+        threads = [threading.Thread(target=self._client, args=(n, deadline), name=f'load-client-{n}')
+                   for n in range(self.clients)]
+        if write_app is not None and writes:
+            threads.append(threading.Thread(target=self._writer, args=(write_app, writes, write_delay, deadline),
+                                            name='load-writer'))
+        self.started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile of already sorted values"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))]
+
+def summarize(samples: List[Sample], elapsed: float) -> Dict:
+    latencies = sorted(s.latency * 1000 for s in samples)
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for s in samples if not (200 <= s.status < 400)),
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50), 1),
+        'p95_ms': round(percentile(latencies, 95), 1),
+        'p99_ms': round(percentile(latencies, 99), 1),
+        'max_ms': round(latencies[-1], 1) if latencies else 0.0,
+        'not_modified': sum(1 for s in samples if s.status == 304),
+        'megabytes': round(sum(s.size for s in samples) / 1048576, 1)
+    }
+
+def report(test: LoadTest) -> Dict:
+    """Print throughput and latency percentiles overall, per path and around the writes"""
+    results = {'overall': summarize(test.samples, test.elapsed), 'paths': {}}
+
+    print(f"\n{'Path':<28} {'Requests':>9} {'Errors':>7} {'Req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'Max':>9}")
+    print("-" * 96)
+    rows = [('all', results['overall'])]
+    for _, path in sorted(MIX, key=lambda m: -m[0]):
+        samples = [s for s in test.samples if s.path == path]
+        if samples:
+            results['paths'][path] = summarize(samples, test.elapsed)
+            rows.append((path, results['paths'][path]))
+
+    if test.write_spans:
+        writing = sum(end - start for start, end in test.write_spans)
+        during = [s for s in test.samples if s.during_write]
+        idle = [s for s in test.samples if not s.during_write]
+        results['idle'] = summarize(idle, test.elapsed - writing)
+        results['during_write'] = summarize(during, writing)
+        results['writes'] = [round(end - start, 2) for start, end in test.write_spans]
+        rows += [('idle', results['idle']), ('during write', results['during_write'])]
+
+    for name, row in rows:
+        print(f"{name:<28} {row['requests']:>9} {row['errors']:>7} {row['throughput_rps']:>8.1f} "
+              f"{row['p50_ms']:>7.1f}ms {row['p95_ms']:>7.1f}ms {row['p99_ms']:>7.1f}ms {row['max_ms']:>7.1f}ms")
+
+    overall = results['overall']
+    print(f"\n{overall['requests']} requests from {test.clients} clients in {test.elapsed:.1f}s: "
+          f"{overall['throughput_rps']} req/s, {overall['errors']} errors, "
+          f"{overall['not_modified']} not modified, {overall['megabytes']} MB")
+    if test.write_spans:
+        print(f"{len(test.write_spans)} inventory writes: "
+              f"{', '.join(f'{end - start:.1f}s' for start, end in test.write_spans)}")
+    return results
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_local_redis(work_dir: str) -> Tuple[subprocess.Popen, str]:
+    """Start a throwaway redis-server without persistence and return it with its URL"""
+    binary = shutil.which('redis-server')
+    if binary is None:
+        raise RuntimeError("redis-server is not on PATH; pass --redis-url or use --cache simple")
+    port = free_port()
+    process = subprocess.Popen([binary, '--port', str(port), '--bind', '127.0.0.1', '--save', '',
+                                '--appendonly', 'no', '--dir', work_dir],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+                return process, f"redis://127.0.0.1:{port}/0"
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("redis-server did not start")
+
+def main():
+    """Drive concurrent dashboard traffic against the web tier and report latency percentiles"""
+    parser = argparse.ArgumentParser(description='Load test the web tier with a realistic request mix')
+    parser.add_argument('--url', help='Server to load, e.g. a gunicorn instance (default: serve the app in-process)')
+    parser.add_argument('--db', help='Database to serve, or with --url the database that server uses '
+                                     '(default: generate one in a temporary directory)')
+    parser.add_argument('--scale', type=float, default=1.0, help='Scale of the generated database')
+    parser.add_argument('--clients', type=int, default=10, help='Concurrent clients')
+    parser.add_argument('--duration', type=float, default=60, help='Seconds of load')
+    parser.add_argument('--think', type=float, default=0.0, help='Mean think time between requests in seconds')
+    parser.add_argument('--revalidate', action='store_true', help='Clients send If-None-Match like browsers')
+    parser.add_argument('--cold', action='store_true', help='Start without priming the cache')
+    parser.add_argument('--cache', choices=['simple', 'redis', 'layered'], default='layered',
+                        help='Cache backend of the in-process server: SimpleCache, RedisCache, '
+                             'or the production LayeredCache (default)')
+    parser.add_argument('--redis-url', help='Redis for --cache redis/layered (default: start a throwaway redis-server)')
+    parser.add_argument('--writes', type=int, default=0,
+                        help='Inventory writes to run back to back during the load (default: none)')
+    parser.add_argument('--write-delay', type=float, default=5.0, help='Seconds of load before the first write')
+    parser.add_argument('--json', help='Save the results as JSON')
+    args = parser.parse_args()
+
+    if args.url and args.writes and not args.db:
+        parser.error("--writes with --url needs --db, the database that server uses")
+
+    work_dir = tempfile.mkdtemp(prefix='infraweb-load-')
+    redis_process = None
+    server = None
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    try:
+        db_path = args.db
+        if not db_path:
+            db_path = os.path.join(work_dir, 'generated.db')
+            print(f"Generating database at scale {args.scale}...")
+            generate(db_path, args.scale)
+
+        write_app = None
+        if args.url:
+            url = args.url
+            if args.writes:
+                # Writes go to the server's own database so it sees the new generations
+                write_app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}'})
+        else:
+            # Serve a copy so writes never touch the given database
+            work_db = os.path.join(work_dir, 'load.db')
+            shutil.copy2(db_path, work_db)
+            artifact_store.artifact_dir = os.path.join(work_dir, 'artifacts')  # Never serve real artifacts
+
+            config = {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{work_db}', 'CACHE_TYPE': 'SimpleCache'}
+            if args.cache != 'simple':
+                redis_url = args.redis_url
+                if not redis_url and (args.cache == 'redis' or shutil.which('redis-server')):
+                    redis_process, redis_url = start_local_redis(work_dir)
+                elif not redis_url:
+                    print("redis-server is not on PATH; LayeredCache runs from process memory only")
+                    redis_url = ''
+                config.update({'CACHE_TYPE': CACHE_BACKENDS[args.cache], 'CACHE_REDIS_URL': redis_url})
+            app = create_app(config)
+            if args.cache != 'simple':
+                with app.app_context():
+                    cache.clear()  # Entries from an earlier run would make the first requests warm
+            write_app = app if args.writes else None
+
+            server = make_server('127.0.0.1', 0, app, threaded=True)
+            threading.Thread(target=server.serve_forever, daemon=True, name='load-server').start()
+            url = f"http://127.0.0.1:{server.server_port}"
+
+        test = LoadTest(url, args.clients, args.duration, think=args.think, revalidate=args.revalidate)
+        if not args.cold:
+            print("Priming the cache...")
+            test.prime()
+        print(f"Running {args.clients} clients for {args.duration:.0f}s against {url}"
+              f"{f' with {args.writes} writes' if args.writes else ''}...")
+        test.run(write_app, args.writes, args.write_delay)
+        results = report(test)
+    finally:
+        if server is not None:
+            server.shutdown()
+        if redis_process is not None:
+            redis_process.terminate()
+            redis_process.wait()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, 'w') as f:
+            json.dump({
+                'created_at': datetime.utcnow().isoformat(),
+                'url': args.url,
+                'cache': None if args.url else args.cache,
+                'clients': args.clients,
+                'duration': args.duration,
+                'think': args.think,
+                'revalidate': args.revalidate,
+                'writes': args.writes,
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'results': results
+            }, f, indent=2)
+        print(f"\nSaved results to {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import os
+import sys
+import sqlite3
+import logging
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.config import DATABASE_PATH
+
+def setup_logging():
+    """Set up logging configuration"""
+    log_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'logs')
+    os.makedirs(log_dir, exist_ok=True)
+    log_file = os.path.join(log_dir, 'database_migration.log')
+    
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_file),
+            logging.StreamHandler()
+        ]
+    )
+    return logging.getLogger(__name__)
+
+def migrate_database():
+    """Add the columns used by scoped refreshes, job coalescing and VM routing"""
+    logger = setup_logging()
+    logger.info("Starting database migration for scoped refreshes")
+    
+    try:
+        conn = sqlite3.connect(DATABASE_PATH)
+        cursor = conn.cursor()
+        
+        # Table -> new columns
+        new_columns = {
+            'hosts': [('VCenter', 'VARCHAR(100)')],
+            'clusters': [('VCenter', 'VARCHAR(100)')],
+            'virtual_machines': [('VCenter', 'VARCHAR(100)'), ('MoRef', 'VARCHAR(50)'),
+                                 ('InstanceUuid', 'VARCHAR(50)')],
+            'snapshots': [('vcenter', 'VARCHAR(100)'), ('cluster', 'VARCHAR(100)')],
+            'collection_jobs': [('request_count', 'INTEGER DEFAULT 1'), ('merged_into', 'INTEGER')]
+        }
+        
+        for table, columns in new_columns.items():
+            cursor.execute(f"PRAGMA table_info({table})")
+            existing_columns = [row[1] for row in cursor.fetchall()]
+            if not existing_columns:
+                logger.info(f"Table {table} does not exist yet; the web server or collector creates it, "
+                            f"with every column, when it starts")
+                continue
+            
+            for column_name, column_type in columns:
+                if column_name in existing_columns:
+                    continue
+                logger.info(f"Adding column {table}.{column_name}")
+                try:
+                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column_name} {column_type}")
+                    if column_name.lower() == 'vcenter':
+                        cursor.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_{column_name} "
+                                       f"ON {table} ({column_name})")
+                except sqlite3.OperationalError as e:
+                    logger.error(f"Error adding column {table}.{column_name}: {str(e)}")
+                    continue
+        
+        conn.commit()
+        logger.info("Database migration completed successfully")
+        # Existing rows have no vCenter or MoRef until the next full collection
+        logger.info("Run a full collection before using vCenter or cluster refreshes")
+        
+    except Exception as e:
+        logger.error(f"Error during migration: {str(e)}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    print("Starting database migration...")
+    migrate_database()
+    print("Migration complete!")
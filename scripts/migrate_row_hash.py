@@ -0,0 +1,66 @@
+import os
+import sys
+import sqlite3
+import logging
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.config import DATABASE_PATH
+
+def setup_logging():
+    """Set up logging configuration"""
+    log_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'logs')
+    os.makedirs(log_dir, exist_ok=True)
+    log_file = os.path.join(log_dir, 'database_migration.log')
+    
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_file),
+            logging.StreamHandler()
+        ]
+    )
+    return logging.getLogger(__name__)
+
+def migrate_database():
+    """Add the content hash columns that cached row fragments are keyed on"""
+    logger = setup_logging()
+    logger.info("Starting database migration for row content hashes")
+    
+    try:
+        conn = sqlite3.connect(DATABASE_PATH)
+        cursor = conn.cursor()
+        
+        for table in ('hosts', 'virtual_machines'):
+            cursor.execute(f"PRAGMA table_info({table})")
+            existing_columns = [row[1] for row in cursor.fetchall()]
+            if not existing_columns:
+                logger.info(f"Table {table} does not exist yet; the web server or collector creates it, "
+                            f"with every column, when it starts")
+                continue
+            if 'RowHash' in existing_columns:
+                continue
+            logger.info(f"Adding column {table}.RowHash")
+            try:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN RowHash VARCHAR(16)")
+            except sqlite3.OperationalError as e:
+                logger.error(f"Error adding column {table}.RowHash: {str(e)}")
+        
+        conn.commit()
+        logger.info("Database migration completed successfully")
+        # Rows without a hash are rendered on every rebuild until the next collection rewrites them
+        logger.info("Row fragments are cached from the next collection onwards")
+        
+    except Exception as e:
+        logger.error(f"Error during migration: {str(e)}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    print("Starting database migration...")
+    migrate_database()
+    print("Migration complete!")
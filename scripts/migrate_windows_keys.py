@@ -0,0 +1,72 @@
+import os
+import sys
+import sqlite3
+import logging
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.config import DATABASE_PATH
+
+def setup_logging():
+    """Set up logging configuration"""
+    log_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'logs')
+    os.makedirs(log_dir, exist_ok=True)
+    log_file = os.path.join(log_dir, 'database_migration.log')
+    
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_file),
+            logging.StreamHandler()
+        ]
+    )
+    return logging.getLogger(__name__)
+
+def migrate_database():
+    """Key Windows guest data by vCenter and MoRef instead of VM name"""
+    logger = setup_logging()
+    logger.info("Starting database migration for Windows guest keys")
+    
+    try:
+        conn = sqlite3.connect(DATABASE_PATH)
+        cursor = conn.cursor()
+        
+        # The fact cache cannot change its primary key in place; it only saves probes, so it is
+        # dropped and the web server or collector recreates it empty when it starts
+        cursor.execute("PRAGMA table_info(windows_guest_facts)")
+        existing_columns = [row[1] for row in cursor.fetchall()]
+        if existing_columns and 'MoRef' not in existing_columns:
+            logger.info("Dropping windows_guest_facts, keyed by VM name; every VM is probed on the next run")
+            cursor.execute("DROP TABLE windows_guest_facts")
+        
+        cursor.execute("PRAGMA table_info(windows_vms)")
+        existing_columns = [row[1] for row in cursor.fetchall()]
+        if not existing_columns:
+            logger.info("Table windows_vms does not exist yet; the web server or collector creates it, "
+                        "with every column, when it starts")
+        for column, column_type in (('VCenter', 'VARCHAR(100)'), ('MoRef', 'VARCHAR(50)')):
+            if existing_columns and column not in existing_columns:
+                logger.info(f"Adding {column} column to windows_vms table")
+                cursor.execute(f"ALTER TABLE windows_vms ADD COLUMN {column} {column_type}")
+        if existing_columns and 'VCenter' not in existing_columns:
+            cursor.execute("CREATE INDEX IF NOT EXISTS ix_windows_vms_VCenter ON windows_vms (VCenter)")
+            # Rows keyed by name alone are replaced on the next Windows collection
+            logger.info("Clearing windows_vms rows without a vCenter")
+            cursor.execute("DELETE FROM windows_vms")
+        
+        conn.commit()
+        logger.info("Database migration completed successfully")
+        
+    except Exception as e:
+        logger.error(f"Error during migration: {str(e)}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    print("Starting database migration...")
+    migrate_database()
+    print("Migration complete!")
@@ -0,0 +1,288 @@
+import gc
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import contextlib
+import statistics
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+# Add the parent directory to the Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from app.models.infra import (db, cache, VCenterInfo, Hosts, Clusters, AffinityRule, VirtualMachines,
+                              Snapshots, UsersGroups, WindowsVMs, ProdUsers, DevUsers)
+from app.models.read import read_model
+from app.services.cache import artifact_store
+from app.services.database.manager import DatabaseManager
+from app.utils.config import DATA_DIR, VCENTERS
+from db_maintenance import DatabaseMaintenance
+from generate_test_data import generate
+
+BASELINE_PATH = os.path.join(DATA_DIR, 'benchmarks', 'baseline.json')
+NOISE_FLOOR_MS = 1.0  # Differences below this are never reported as regressions
+# Tables behind the list pages and APIs
+LIST_MODELS = (VCenterInfo, Hosts, Clusters, AffinityRule, VirtualMachines, Snapshots,
+               UsersGroups, WindowsVMs, ProdUsers, DevUsers)
+# What a scheduled collection writes
+INVENTORY_KEYS = ('hosts_data', 'clusters_data', 'vms_data', 'snapshots_data')
+
+def measure(func: Callable[[], object], runs: int, setup: Optional[Callable[[], None]] = None) -> Dict[str, float]:
+    """Time ``func`` over several runs, calling ``setup`` untimed before each one"""
+    timings = []
+    size = 0
+    for _ in range(runs):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+        size = len(result.get_data()) if hasattr(result, 'get_data') else size
+    timings.sort()
+    return {
+        'median_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+        'min_ms': round(timings[0], 2),
+        'runs': runs,
+        'bytes': size
+    }
+
+def bench_routes(app, runs: int) -> Dict[str, Dict]:
+    """Every route of the vcenter blueprint with a cold cache and with a warm one"""
+    results = {}
+    client = app.test_client()
+    with app.app_context():
+        job_id = db.session.execute(db.text("SELECT MIN(id) FROM collection_jobs")).scalar() or 1
+
+    def clear_cache():
+        with app.app_context():
+            cache.clear()
+
+    for rule in sorted(app.url_map.iter_rules(), key=lambda r: r.rule):
+        if not rule.endpoint.startswith('vcenter.'):
+            continue
+        path = rule.rule.replace('<int:job_id>', str(job_id))
+
+        if 'GET' in rule.methods:
+            get = lambda: client.get(path)
+            results[f"GET {rule.rule} cold"] = measure(get, runs, setup=clear_cache)
+            get()  # Prime the cache
+            results[f"GET {rule.rule} warm"] = measure(get, runs)
+        if 'POST' in rule.methods:
+            results[f"POST {rule.rule}"] = measure(lambda: client.post(path), runs)
+    return results
+
+def current_rows(manager: DatabaseManager) -> Dict[str, List[Dict]]:
+    """Current content of every table, shaped like collected data, so it can be written back"""
+    models = {mapper.class_.__tablename__: mapper.class_ for mapper in db.Model.registry.mappers}
+    collected = {}
+    for key, (_, table) in manager.table_updates.items():
+        model = models.get(table)
+        if model is None:
+            continue
+        columns = [c for c in model.__table__.columns.keys() if c != 'id']
+        collected[key] = [{c: getattr(row, c) for c in columns} for row in model.query.all()]
+    db.session.expunge_all()
+    return collected
+
+def bench_refreshes(app, runs: int) -> Dict[str, Dict]:
+    """DatabaseManager rewriting each table with its current content, fully and for one vCenter"""
+    results = {}
+    with app.app_context():
+        manager = DatabaseManager()
+        # Silence the per-update info logging; it is not what is measured
+        manager.logger.setLevel(logging.WARNING)
+        collected = current_rows(manager)
+
+        for key, rows in collected.items():
+            results[f"refresh {key} ({len(rows)} rows)"] = measure(
+                lambda: manager.perform_full_update({key: rows}, source='benchmark'), runs)
+
+        results['refresh inventory'] = measure(
+            lambda: manager.perform_full_update({key: collected[key] for key in INVENTORY_KEYS},
+                                                source='benchmark'), runs)
+
+        vcenter = VCENTERS[0]['host']
+        scoped = {key: [row for row in rows if vcenter in (row.get('VCenter'), row.get('vcenter'))]
+                  for key, rows in collected.items() if key in ('hosts_data', 'clusters_data', 'vms_data')}
+        results['refresh inventory scoped to one vCenter'] = measure(
+            lambda: manager.perform_full_update(scoped, source='benchmark', scope={'vcenter': vcenter}), runs)
+    return results
+
+def retained_bytes(func: Callable[[], object]) -> int:
+    """Memory still allocated after ``func`` returns, while its result is alive"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = func()
+        retained = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del result
+    return retained
+
+def bench_read_models(app, runs: int) -> Dict[str, Dict]:
+    """Each list table loaded as ORM instances and through its read model, in time and memory"""
+    results = {}
+    with app.app_context():
+        for model in LIST_MODELS:
+            reader = read_model(model)
+            count = db.session.query(model).count()
+
+            # The session keeps ORM instances in its identity map, so every run starts from an empty one
+            orm = measure(lambda: model.query.all(), runs, setup=db.session.expunge_all)
+            db.session.expunge_all()
+            orm['bytes'] = retained_bytes(lambda: model.query.all())
+            db.session.expunge_all()
+
+            rows = measure(lambda: reader.wrap(reader.load()), runs)
+            rows['bytes'] = retained_bytes(lambda: reader.wrap(reader.load()))
+
+            for name, result in (('orm', orm), ('read model', rows)):
+                result['rows'] = count
+                results[f"load {model.__tablename__} {name}"] = result
+    return results
+
+def report_read_models(results: Dict[str, Dict]):
+    """Per-row time and memory of ORM loading against the read models"""
+    print(f"\n{'Table':<24} {'Rows':>7} {'ORM us/row':>11} {'Read us/row':>12} {'ORM B/row':>10} {'Read B/row':>11}")
+    print("-" * 80)
+    for model in LIST_MODELS:
+        orm = results.get(f"load {model.__tablename__} orm")
+        rows = results.get(f"load {model.__tablename__} read model")
+        if not orm or not rows or not orm['rows']:
+            continue
+        count = orm['rows']
+        print(f"{model.__tablename__:<24} {count:>7} {orm['median_ms'] * 1000 / count:>11.1f} "
+              f"{rows['median_ms'] * 1000 / count:>12.1f} {orm['bytes'] / count:>10.0f} {rows['bytes'] / count:>11.0f}")
+
+def bench_maintenance(db_path: str, runs: int) -> Dict[str, Dict]:
+    """db_maintenance operations on a copy of the database"""
+    results = {}
+    work_dir = tempfile.mkdtemp(prefix='infraweb-bench-')
+    try:
+        copy_path = os.path.join(work_dir, 'data', os.path.basename(db_path))
+        os.makedirs(os.path.dirname(copy_path))
+        shutil.copy2(db_path, copy_path)
+        maintainer = DatabaseMaintenance(copy_path)
+        maintainer.logger.setLevel(logging.WARNING)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            for name in ('backup_database', 'standardize_dates', 'vacuum_database', 'analyze_database'):
+                results[f"maintenance {name}"] = measure(getattr(maintainer, name), runs)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    """Print current against baseline medians and return the benchmarks that regressed"""
+    regressions = []
+    print(f"\n{'Benchmark':<60} {'Baseline':>10} {'Current':>10} {'Change':>8}")
+    print("-" * 92)
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:<60} {'-':>10} {result['median_ms']:>8.2f}ms {'new':>8}")
+            continue
+        before, after = baseline[name]['median_ms'], result['median_ms']
+        change = (after - before) / before if before else 0.0
+        regressed = change > threshold and after - before > NOISE_FLOOR_MS
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<60} {before:>8.2f}ms {after:>8.2f}ms {change:>+7.0%}{' <-- REGRESSION' if regressed else ''}")
+    return regressions
+
+def main():
+    """Benchmark routes, refreshes and maintenance against a synthetic database"""
+    parser = argparse.ArgumentParser(description='Benchmark routes, database refreshes and maintenance')
+    parser.add_argument('--db', help='Database to benchmark (default: generate one in a temporary directory)')
+    parser.add_argument('--scale', type=float, default=1.0, help='Scale of the generated database')
+    parser.add_argument('--runs', type=int, default=5, help='Timed runs per benchmark')
+    parser.add_argument('--only', choices=['routes', 'refreshes', 'read_models', 'maintenance'], action='append',
+                        help='Run only some groups (repeatable)')
+    parser.add_argument('--save', nargs='?', const=BASELINE_PATH, help='Save results as a JSON baseline')
+    parser.add_argument('--compare', nargs='?', const=BASELINE_PATH, help='Compare against a JSON baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Relative slowdown of the median reported as a regression (default: 0.25)')
+    args = parser.parse_args()
+
+    temp_dir = None
+    db_path = args.db
+    if not db_path:
+        temp_dir = tempfile.mkdtemp(prefix='infraweb-bench-db-')
+        db_path = os.path.join(temp_dir, 'benchmark.db')
+        print(f"Generating database at scale {args.scale}...")
+        generate(db_path, args.scale)
+
+    # Work on a copy so refresh benchmarks never touch the given database
+    work_dir = tempfile.mkdtemp(prefix='infraweb-bench-work-')
+    work_db = os.path.join(work_dir, 'benchmark.db')
+    shutil.copy2(db_path, work_db)
+    artifact_store.artifact_dir = os.path.join(work_dir, 'artifacts')  # Never serve real artifacts
+
+    try:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{work_db}', 'CACHE_TYPE': 'SimpleCache'})
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        groups = args.only or ['routes', 'refreshes', 'read_models', 'maintenance']
+
+        results = {}
+        if 'routes' in groups:
+            print("Benchmarking routes...")
+            results.update(bench_routes(app, args.runs))
+        if 'refreshes' in groups:
+            print("Benchmarking database refreshes...")
+            results.update(bench_refreshes(app, args.runs))
+        if 'read_models' in groups:
+            print("Benchmarking ORM loading against read models...")
+            results.update(bench_read_models(app, args.runs))
+        if 'maintenance' in groups:
+            print("Benchmarking maintenance operations...")
+            results.update(bench_maintenance(db_path, args.runs))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    regressions = []
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            regressions = compare(results, json.load(f)['results'], args.threshold)
+    else:
+        print(f"\n{'Benchmark':<60} {'Median':>10} {'p95':>10} {'Bytes':>10}")
+        print("-" * 92)
+        for name, result in results.items():
+            print(f"{name:<60} {result['median_ms']:>8.2f}ms {result['p95_ms']:>8.2f}ms {result['bytes']:>10}")
+
+    if any(name.startswith('load ') for name in results):
+        report_read_models(results)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump({
+                'created_at': datetime.utcnow().isoformat(),
+                'scale': None if args.db else args.scale,
+                'database': args.db,
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'runs': args.runs,
+                'results': results
+            }, f, indent=2)
+        print(f"\nSaved baseline to {args.save}")
+
+    if regressions:
+        print(f"\n{len(regressions)} benchmarks regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app import create_app
 from app.models.infra import (db, Hosts, Clusters, VirtualMachines, 
                             Snapshots, UpdateStats, VCenterInfo, AffinityRule)
+from app.services.cache import cache_manager
 from app.services.credentials import credentials_manager
 from app.services.vcenter.collector import VCenterCollector
 from app.utils.config import DATABASE_PATH, LOG_DIR, VCENTERS
@@ -197,6 +198,11 @@ def update_database(vcenter_data: Dict, total_collection_time: float) -> bool:
                 )
                 db.session.add(rule)
 
+            cache_manager.bump_generation(
+                ['hosts', 'clusters', 'virtual_machines', 'snapshots',
+                 'vcenter_details', 'affinity_rules'],
+                source='test_collection'
+            )
             db.session.commit()
             
             # Update statistics
@@ -209,9 +215,13 @@ def update_database(vcenter_data: Dict, total_collection_time: float) -> bool:
                 total_count=count
             )
             db.session.add(stats)
+            cache_manager.bump_generation(['update_stats'], source='test_collection')
             db.session.commit()
             
             logging.info(f"Update stats saved - Duration: {total_collection_time:.2f}s, Count: {count}")
+            
+            # Pre-render pages and API payloads for the new data
+            cache_manager.warm(app)
             return True
             
         except Exception as e:
@@ -320,4 +330,4 @@ def test_collection():
         return None
 
 if __name__ == "__main__":
-    test_collection()
\ No newline at end of file
+    test_collection()
\ No newline at end of file
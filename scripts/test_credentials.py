@@ -20,13 +20,15 @@ def test_credentials():
     logger = setup_logging()
     
     try:
-        logger.info("Testing credential script path...")
-        script_path = credentials_manager.ps_script_path
-        if os.path.exists(script_path):
-            logger.info(f"Found credential script at: {script_path}")
-        else:
-            logger.error(f"Credential script not found at: {script_path}")
-            return
+        provider = credentials_manager.provider
+        logger.info(f"Using {provider.name} credential provider")
+        script_path = getattr(provider, 'script_path', None)
+        if script_path:
+            if os.path.exists(script_path):
+                logger.info(f"Found credential script at: {script_path}")
+            else:
+                logger.error(f"Credential script not found at: {script_path}")
+                return
 
         logger.info("Testing credential retrieval...")
         credentials = credentials_manager.get_credentials(force_refresh=True)
@@ -43,4 +45,4 @@ def test_credentials():
         logger.error(f"Credential test failed: {str(e)}")
 
 if __name__ == "__main__":
-    test_credentials()
\ No newline at end of file
+    test_credentials()
\ No newline at end of file
@@ -16,31 +16,16 @@ function Write-Log {
     Add-Content -Path $LogPath -Value $logMessage
 }
 
-function Clear-RedisCache {
+function Invoke-CacheWarming {
     try {
-        $pythonScript = @"
-import redis
-r = redis.Redis(host='localhost', port=6379, db=0)
-cache_keys = r.keys('*users*')
-for key in cache_keys:
-    r.delete(key)
-r.delete('dashboard')  # Also clear dashboard cache as it might show user counts
-"@
-        
-        # Save the Python script to a temporary file
-        $tempFile = Join-Path $env:TEMP "clear_cache.py"
-        $pythonScript | Set-Content $tempFile
-
-        # Execute the Python script using the virtual environment's Python
+        # Views are keyed by data generation, so nothing needs deleting; just pre-render the new pages
         $pythonPath = "C:\Docker\infraweb\venv\Scripts\python.exe"
-        & $pythonPath $tempFile
-
-        Remove-Item $tempFile -Force
-        Write-Log "Cache cleared successfully"
+        & $pythonPath "C:\Docker\infraweb\scripts\warm_cache.py" prod_users dev_users
+        Write-Log "Cache warmed successfully"
         return $true
     }
     catch {
-        Write-Log ("Error clearing cache: " + $_.Exception.Message)
+        Write-Log ("Error warming cache: " + $_.Exception.Message)
         return $false
     }
 }
@@ -80,6 +65,16 @@ $enabled,$(if ($creationDate -eq "NULL") { "NULL" } else { "'$creationDate'" }),
             Add-Content -Path $tempSqlFile -Value $insertSql
         }
 
+        # Bump the table's data generation in the same transaction so cached views roll over
+        @"
+INSERT INTO data_generations (table_name, generation, updated_at, source)
+VALUES ('$TableName', 1, datetime('now'), 'user-group-merge')
+ON CONFLICT(table_name) DO UPDATE SET
+    generation = generation + 1,
+    updated_at = excluded.updated_at,
+    source = excluded.source;
+"@ | Add-Content -Path $tempSqlFile
+
         Add-Content -Path $tempSqlFile -Value "COMMIT;"
         $result = & $SqlitePath $DatabasePath ".read $tempSqlFile"
         
@@ -170,13 +165,13 @@ try {
     Write-Log "Copying development CSV file locally"
     Copy-Item -Path $DevCsvNetworkPath -Destination $DevCsvLocalPath -Force
 
-    # Clear Redis cache before updating database
-    Write-Log "Clearing Redis cache"
-    Clear-RedisCache
-
     $prodSuccess = Update-DatabaseFromCsv -CsvPath $ProdCsvPath -TableName "prod_users"
     $devSuccess = Update-DatabaseFromCsv -CsvPath $DevCsvLocalPath -TableName "dev_users"
 
+    # Pre-render the user pages for the new data generation
+    Write-Log "Warming cache"
+    Invoke-CacheWarming
+
     # Cleanup
     Write-Log "Cleaning up CSV files"
     if (Test-Path $ProdCsvPath) {
@@ -199,4 +194,4 @@ catch {
     if (Test-Path $ProdCsvPath) { Remove-Item -Path $ProdCsvPath -Force }
     if (Test-Path $DevCsvLocalPath) { Remove-Item -Path $DevCsvLocalPath -Force }
     throw
-}
\ No newline at end of file
+}
\ No newline at end of file
@@ -0,0 +1,43 @@
+import os
+import sys
+import argparse
+import logging
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.services.cache import cache_manager
+
+def setup_logging():
+    """Set up logging configuration"""
+    log_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'logs')
+    os.makedirs(log_dir, exist_ok=True)
+    log_file = os.path.join(log_dir, 'cache_warming.log')
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_file),
+            logging.StreamHandler()
+        ]
+    )
+    return logging.getLogger(__name__)
+
+def main():
+    """Pre-render cached views after an external import has committed"""
+    parser = argparse.ArgumentParser(description='Warm cached pages and API payloads')
+    parser.add_argument('tables', nargs='*',
+                        help='Only warm views that read these tables (default: all)')
+    args = parser.parse_args()
+
+    logger = setup_logging()
+    app = create_app()
+
+    with app.app_context():
+        warmed = cache_manager.warm(app, args.tables or None)
+        logger.info(f"Warmed {len(warmed)} views: {', '.join(warmed)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+import pytest
+from app import create_app, create_missing_tables
+from app.models.infra import db
+from app.services.cache import artifact_store
+from app.services.metrics import metrics
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """The app on an empty database of its own, with an in-process cache and no exported artifacts"""
+    monkeypatch.setattr(artifact_store, 'artifact_dir', str(tmp_path / 'artifacts'))
+    monkeypatch.setattr(metrics, 'metrics_dir', str(tmp_path / 'metrics'))
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'audit_reports.db'}",
+        'CACHE_TYPE': 'SimpleCache'
+    })
+    create_missing_tables(app)
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,13 @@
+from app.services.cache import cache_manager
+
+VCENTER = 'cr3-vcenter-11.csmodule.com'
+OTHER_VCENTER = 'cha-vcenter-11.csmodule.com'
+
+def host_row(name: str, vcenter: str = VCENTER, **values) -> dict:
+    """A host as the vCenter collector reports it"""
+    return {'Host': name, 'VCenter': vcenter, 'Datacenter': 'DC1',
+            'Cluster': 'CL1', 'NumCPU': 2, 'NumCores': 32, 'CPUUsagePercentage': 12.5,
+            'Mem': 512.0, 'MemoryUsagePercentage': 40.0, 'TotalVMs': 10, **values}
+
+def generation(table: str) -> int:
+    return cache_manager.get_generations().get(table, (0, None))[0]
@@ -0,0 +1,78 @@
+import os
+import gzip
+import json
+import threading
+import time
+import pytest
+from app.models.infra import Clusters, db
+from app.services.cache import artifact_store, cache_manager
+from app.services.database.manager import DatabaseManager
+from .helpers import host_row, VCENTER
+
+@pytest.fixture
+def export_pages(monkeypatch):
+    monkeypatch.setattr('app.services.cache.artifacts.EXPORT_HTML_PAGES', True)
+
+def export(app, path):
+    view = app.view_functions[app.url_map.bind('').match(path)[0]]
+    token, _ = cache_manager.get_validators(view.cache_tables)
+    return artifact_store.export(app, path, view, token)
+
+def manifest():
+    with open(artifact_store.manifest_path) as f:
+        return json.load(f)
+
+def test_exported_page_is_served_until_its_generation_changes(app, client, export_pages):
+    DatabaseManager().perform_full_update({'hosts_data': [host_row('esx01')]})
+    assert export(app, '/hosts')
+
+    entry = manifest()['/hosts']
+    assert set(entry['files']) >= {'identity', 'gzip'}
+    response = client.get('/hosts', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert b'esx01' in gzip.decompress(response.data)
+    response.close()
+
+    DatabaseManager().perform_full_update({'hosts_data': [host_row('esx01'), host_row('esx02')]})
+    response = client.get('/hosts', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert b'esx02' in response.data
+
+def test_concurrent_exports_keep_every_manifest_entry(app, export_pages, monkeypatch):
+    DatabaseManager().perform_full_update({'hosts_data': [host_row('esx01')]})
+    db.session.add(Clusters(ClusterName='CL1', VCenter=VCENTER))
+    db.session.commit()
+    write = artifact_store._write_atomic
+
+    def slow_write(path, data):
+        if path == artifact_store.manifest_path:
+            time.sleep(0.05)  # Widen the window between reading and replacing the manifest
+        write(path, data)
+    monkeypatch.setattr(artifact_store, '_write_atomic', slow_write)
+    paths = ['/hosts', '/clusters', '/rules', '/snapshots'] * 4
+
+    def run(path):
+        with app.app_context():
+            export(app, path)
+
+    threads = [threading.Thread(target=run, args=(path,)) for path in paths]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert set(manifest()) == set(paths)
+
+def test_prune_keeps_referenced_and_recent_artifacts(app, export_pages, monkeypatch):
+    monkeypatch.setattr('app.services.cache.artifacts.ARTIFACT_RETENTION', 0)
+    DatabaseManager().perform_full_update({'hosts_data': [host_row('esx01')]})
+    assert export(app, '/hosts')
+    stale = os.path.join(artifact_store.artifact_dir, 'hosts-0000000000000000.html')
+    with open(stale, 'w') as f:
+        f.write('old')
+    os.utime(stale, (0, 0))
+
+    assert artifact_store.prune() == 1
+    assert not os.path.exists(stale)
+    assert sorted(os.listdir(artifact_store.artifact_dir)) == sorted(
+        ['manifest.json', 'manifest.lock'] + list(manifest()['/hosts']['files'].values()))
@@ -0,0 +1,23 @@
+from app.services.database.manager import DatabaseManager
+from .helpers import host_row
+
+def test_conditional_request_is_not_modified_until_the_data_changes(app, client):
+    DatabaseManager().perform_full_update({'hosts_data': [host_row('esx01')]})
+
+    response = client.get('/api/hosts')
+    assert response.status_code == 200
+    etag, last_modified = response.headers['ETag'], response.headers['Last-Modified']
+    assert response.headers['Cache-Control'] == 'no-cache'
+
+    response = client.get('/api/hosts', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+    response = client.get('/api/hosts', headers={'If-Modified-Since': last_modified})
+    assert response.status_code == 304
+
+    DatabaseManager().perform_full_update({'hosts_data': [host_row('esx01'), host_row('esx02')]})
+    response = client.get('/api/hosts', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert [host['Host'] for host in response.get_json()] == ['esx01', 'esx02']
@@ -0,0 +1,95 @@
+import os
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+import pytest
+from app.services.credentials import CredentialProvider, get_provider
+from app.services.credentials.manager import CredentialsManager
+from app.services.credentials.providers import FileProvider
+
+class CountingProvider(CredentialProvider):
+    """Static credentials that count fetches and can be held until released"""
+
+    name = 'counting'
+
+    def __init__(self, password='secret'):
+        super().__init__()
+        self.password = password
+        self.fetches = 0
+        self.release = threading.Event()
+        self.release.set()
+
+    def fetch(self):
+        self.fetches += 1
+        self.release.wait(5)
+        return {service: {'username': f'{service}-svc', 'password': self.password}
+                for service in ('vcenter', 'windows')}
+
+@pytest.fixture(autouse=True)
+def cache_files(tmp_path, monkeypatch):
+    """Keep the encrypted credential cache and its key in a tmp dir"""
+    monkeypatch.delenv('INFRAWEB_CREDENTIAL_KEY', raising=False)
+    for name, filename in (('CREDENTIAL_CACHE_DIR', ''), ('CREDENTIAL_CACHE_FILE', 'credentials.cache'),
+                           ('CREDENTIAL_CACHE_KEY_FILE', 'credentials.key')):
+        monkeypatch.setattr(f'app.services.credentials.manager.{name}', str(tmp_path / 'cache' / filename))
+    return tmp_path / 'cache'
+
+def test_providers_are_chosen_by_name(tmp_path, monkeypatch):
+    monkeypatch.setenv('INFRAWEB_VCENTER_USERNAME', 'admin')
+    assert get_provider('env').fetch()['vcenter']['username'] == 'admin'
+    credentials_file = tmp_path / 'credentials.json'
+    credentials_file.write_text(json.dumps({'vcenter': {'username': 'file-admin', 'password': 'x'}}))
+    assert isinstance(get_provider('file'), FileProvider)
+    assert FileProvider(str(credentials_file)).fetch()['vcenter']['username'] == 'file-admin'
+    assert get_provider('static').fetch()['windows']['username'] == 'windows-user'
+    with pytest.raises(ValueError):
+        get_provider('vault')
+
+def test_concurrent_cold_callers_fetch_once():
+    provider = CountingProvider()
+    provider.release.clear()
+    manager = CredentialsManager(provider)
+    results = []
+
+    threads = [threading.Thread(target=lambda: results.append(manager.get_credentials())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    provider.release.set()
+    for thread in threads:
+        thread.join()
+
+    assert provider.fetches == 1
+    assert len(results) == 8
+
+def test_expired_credentials_are_served_while_one_refresh_runs():
+    provider = CountingProvider()
+    manager = CredentialsManager(provider)
+    manager.get_credentials()
+    manager._last_refresh = datetime.now() - timedelta(days=1)
+    provider.password = 'rotated'
+    provider.release.clear()
+
+    for _ in range(5):
+        assert manager.get_credentials()['vcenter']['password'] == 'secret'
+    provider.release.set()
+    while manager._background_refresh:
+        time.sleep(0.01)
+
+    assert provider.fetches == 2
+    assert manager.get_credentials()['vcenter']['password'] == 'rotated'
+
+def test_restarted_process_reads_the_encrypted_cache(cache_files):
+    CredentialsManager(CountingProvider()).get_credentials()
+    cache_file = cache_files / 'credentials.cache'
+    assert oct(os.stat(cache_file).st_mode & 0o777) == '0o600'
+    assert b'secret' not in cache_file.read_bytes()
+
+    provider = CountingProvider()
+    assert CredentialsManager(provider).get_credentials()['windows']['password'] == 'secret'
+    assert provider.fetches == 0
+
+def test_invalid_credentials_are_rejected():
+    provider = CountingProvider(password='')
+    with pytest.raises(Exception):
+        CredentialsManager(provider).get_credentials()
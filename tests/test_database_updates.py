@@ -0,0 +1,60 @@
+from app.models.infra import Hosts
+from app.scheduler import scheduler_manager
+from app.services.database.manager import DatabaseManager
+from .helpers import VCENTER, OTHER_VCENTER, host_row, generation
+
+def test_update_bumps_only_changed_tables(app):
+    manager = DatabaseManager()
+    data = {'hosts_data': [host_row('esx01'), host_row('esx02')], 'clusters_data': []}
+
+    assert manager.perform_full_update(data)
+    assert generation('hosts') == 1
+    assert generation('clusters') == 0  # Empty and still empty
+    assert generation('virtual_machines') == 0  # Not collected
+
+    assert manager.perform_full_update(data)
+    assert generation('hosts') == 1
+
+    data['hosts_data'][1]['TotalVMs'] = 11
+    assert manager.perform_full_update(data)
+    assert generation('hosts') == 2
+    assert Hosts.query.filter_by(Host='esx02').one().TotalVMs == 11
+
+
+def test_failed_vcenter_keeps_its_rows(app):
+    manager = DatabaseManager()
+    manager.perform_full_update({'hosts_data': [host_row('esx01'), host_row('esx11', OTHER_VCENTER)]})
+
+    assert manager.perform_full_update({'hosts_data': [host_row('esx01'), host_row('esx02')]},
+                                       failed_vcenters=[OTHER_VCENTER])
+    assert sorted(host.Host for host in Hosts.query.all()) == ['esx01', 'esx02', 'esx11']
+
+    # Nothing changed on the vCenter that answered
+    assert manager.perform_full_update({'hosts_data': [host_row('esx01'), host_row('esx02')]},
+                                       failed_vcenters=[OTHER_VCENTER])
+    assert generation('hosts') == 2
+
+def test_scheduled_run_leaves_failed_vcenters_alone(app, monkeypatch):
+    DatabaseManager().perform_full_update({'hosts_data': [host_row('esx01'), host_row('esx11', OTHER_VCENTER)]})
+
+    class Collector:
+        sessions = {}
+
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def collect_from_all_vcenters(self, progress_callback, **kwargs):
+            progress_callback(VCENTER, {'hosts_data': 1})
+            progress_callback(OTHER_VCENTER, {'error': 'connection refused'})
+            return {'hosts_data': [host_row('esx01', TotalVMs=12)]}
+
+        def close_sessions(self):
+            pass
+
+    monkeypatch.setattr('app.services.vcenter.collector.VCenterCollector', Collector)
+    monkeypatch.setattr('app.scheduler.manager.credentials_manager.get_credentials', lambda: {})
+    monkeypatch.setattr('app.scheduler.manager.cache_manager.warm', lambda app, tables: tables)
+
+    assert scheduler_manager.perform_update(sections={'inventory'})
+    hosts = {host.Host: host.TotalVMs for host in Hosts.query.all()}
+    assert hosts == {'esx01': 12, 'esx11': 10}
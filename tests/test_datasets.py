@@ -0,0 +1,40 @@
+import threading
+import time
+from app.models.infra import Hosts
+from app.models.read import ReadModel
+from app.services.cache import cache_manager
+from app.services.database.manager import DatabaseManager
+from .helpers import host_row
+
+def test_concurrent_dataset_misses_load_once(app, monkeypatch):
+    DatabaseManager().perform_full_update({'hosts_data': [host_row('esx01')]})
+    loads = []
+    load = ReadModel.load
+
+    def slow_load(reader):
+        loads.append(reader.table.name)
+        time.sleep(0.2)
+        return load(reader)
+    monkeypatch.setattr(ReadModel, 'load', slow_load)
+
+    results = []
+
+    def read():
+        with app.app_context():
+            results.append([host.Host for host in cache_manager.rows(Hosts)])
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert loads == ['hosts']
+    assert results == [['esx01']] * 8
+
+def test_dataset_follows_the_data_generation(app):
+    DatabaseManager().perform_full_update({'hosts_data': [host_row('esx01')]})
+    assert [host.Host for host in cache_manager.rows(Hosts)] == ['esx01']
+
+    DatabaseManager().perform_full_update({'hosts_data': [host_row('esx01'), host_row('esx02')]})
+    assert [host.Host for host in cache_manager.rows(Hosts)] == ['esx01', 'esx02']
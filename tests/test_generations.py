@@ -0,0 +1,16 @@
+from app.models.infra import Hosts
+from app.services.database.manager import DatabaseManager
+from .helpers import host_row, generation
+
+def test_failed_update_commits_nothing(app, monkeypatch):
+    manager = DatabaseManager()
+    manager.perform_full_update({'hosts_data': [host_row('esx01')]})
+
+    def fail(clusters_data, scope=None):
+        raise RuntimeError('collector sent garbage')
+    monkeypatch.setitem(manager.table_updates, 'clusters_data', (fail, 'clusters'))
+
+    assert not manager.perform_full_update({'hosts_data': [host_row('esx01'), host_row('esx02')],
+                                            'clusters_data': [{}]})
+    assert generation('hosts') == 1
+    assert [host.Host for host in Hosts.query.all()] == ['esx01']
@@ -0,0 +1,13 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+from check_import_time import ENTRY_POINTS, fastest, leaked_modules, total_ms
+
+@pytest.mark.parametrize('name', list(ENTRY_POINTS))
+def test_entry_point_imports_within_budget(name):
+    statement, budget_ms, forbidden = ENTRY_POINTS[name]
+    imports = fastest(statement, runs=3)
+    assert not leaked_modules(imports, forbidden)
+    assert total_ms(imports) <= budget_ms
@@ -0,0 +1,92 @@
+import pytest
+from app.models.infra import db, Clusters, CollectionJob
+from app.services.jobs.manager import JobQueue, parse_scope
+
+VCENTER = 'cr3-vcenter-11.csmodule.com'
+OTHER_VCENTER = 'cha-vcenter-11.csmodule.com'
+
+@pytest.fixture
+def queue(app):
+    db.session.add(Clusters(ClusterName='CL1', VCenter=VCENTER))
+    db.session.commit()
+    return JobQueue()
+
+def test_invalid_scope_is_rejected(queue):
+    for scope in ('everything', 'vcenter:', 'vcenter:unknown.example.com', 'cluster:missing'):
+        with pytest.raises(ValueError):
+            queue.enqueue(scope)
+    assert CollectionJob.query.count() == 0
+
+def test_cluster_scope_carries_its_vcenter(queue):
+    assert parse_scope('cluster:CL1') == {'cluster': 'CL1', 'vcenter': VCENTER}
+
+def test_same_scope_is_coalesced(queue):
+    job, coalesced = queue.enqueue(f"vcenter:{VCENTER}")
+    assert not coalesced
+    again, coalesced = queue.enqueue(f"vcenter:{VCENTER}")
+    assert coalesced
+    assert again.id == job.id
+    assert again.request_count == 2
+
+def test_narrower_scope_joins_a_running_wider_job(queue):
+    job, _ = queue.enqueue('all')
+    job.status = 'running'
+    db.session.commit()
+
+    for scope in (f"vcenter:{VCENTER}", 'cluster:CL1'):
+        joined, coalesced = queue.enqueue(scope)
+        assert coalesced
+        assert joined.id == job.id
+    assert CollectionJob.query.count() == 1
+
+def test_disjoint_scopes_get_their_own_jobs(queue):
+    first, _ = queue.enqueue(f"vcenter:{VCENTER}")
+    second, coalesced = queue.enqueue(f"vcenter:{OTHER_VCENTER}")
+    assert not coalesced
+    assert second.id != first.id
+
+def test_wider_scope_widens_and_merges_queued_jobs(queue):
+    cluster_job, _ = queue.enqueue('cluster:CL1')
+    vcenter_job, _ = queue.enqueue(f"vcenter:{OTHER_VCENTER}")
+
+    job, coalesced = queue.enqueue('all')
+    assert coalesced
+    assert job.id == cluster_job.id
+    assert job.scope == 'all'
+    assert job.request_count == 3
+    merged = db.session.get(CollectionJob, vcenter_job.id)
+    assert merged.status == 'merged'
+    assert merged.merged_into == job.id
+
+def test_running_job_is_not_widened(queue):
+    running, _ = queue.enqueue(f"vcenter:{VCENTER}")
+    running.status = 'running'
+    db.session.commit()
+
+    job, coalesced = queue.enqueue('all')
+    assert not coalesced
+    assert job.id != running.id
+    assert db.session.get(CollectionJob, running.id).scope == f"vcenter:{VCENTER}"
+
+def test_job_whose_scope_no_longer_parses_does_not_block_requests(queue):
+    stale, _ = queue.enqueue('cluster:CL1')
+    Clusters.query.delete()
+    db.session.commit()
+
+    job, coalesced = queue.enqueue(f"vcenter:{VCENTER}")
+    assert not coalesced
+    assert job.id != stale.id
+
+def test_refresh_rejects_payloads_that_are_not_objects(queue, client):
+    for payload in ([f"vcenter:{VCENTER}"], 'all', 5, {'scope': ['all']}):
+        response = client.post('/api/refresh', json=payload)
+        assert response.status_code == 400
+        assert response.get_json()['status'] == 'error'
+    assert CollectionJob.query.count() == 0
+
+def test_refresh_accepts_json_and_form_scopes(queue, client):
+    response = client.post('/api/refresh', json={'scope': 'cluster:CL1'})
+    assert response.status_code == 202
+    response = client.post('/api/refresh', data={'scope': 'cluster:CL1'})
+    assert response.status_code == 202
+    assert response.get_json()['coalesced']
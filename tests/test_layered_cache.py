@@ -0,0 +1,201 @@
+import time
+import queue
+import threading
+import pytest
+import redis
+from app.services.cache.layered import LayeredCache, LocalCache
+
+class FakeRedisServer:
+    """Strings with expiry and pub/sub, shared by the clients of every simulated process"""
+
+    def __init__(self):
+        self.data = {}  # key -> (value, expires)
+        self.subscribers = []
+        self.listening = set()  # Pub/sub connections waiting for messages
+        self.down = False
+        self.gets = 0
+        self.lock = threading.Lock()
+
+    def check(self):
+        if self.down:
+            raise redis.ConnectionError('Connection refused')
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+class FakePubSub:
+    def __init__(self, server):
+        self.server = server
+        self.messages = queue.Queue()
+
+    def subscribe(self, channel):
+        self.server.check()
+        with self.server.lock:
+            self.server.subscribers.append((channel, self.messages))
+
+    def get_message(self, timeout):
+        self.server.listening.add(self)
+        try:
+            return self.messages.get(timeout=timeout)
+        except queue.Empty:
+            self.server.check()
+            return None
+
+    def close(self):
+        with self.server.lock:
+            self.server.subscribers = [(c, q) for c, q in self.server.subscribers if q is not self.messages]
+
+class FakeRedis:
+    """The subset of redis.Redis that LayeredCache uses"""
+
+    def __init__(self, server):
+        self.server = server
+
+    def _live(self, key):
+        value, expires = self.server.data.get(key, (None, None))
+        if expires is not None and expires <= time.time():
+            self.server.data.pop(key, None)
+            return None
+        return value
+
+    def ping(self):
+        self.server.check()
+        return True
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return FakePubSub(self.server)
+
+    def get(self, key):
+        self.server.check()
+        self.server.gets += 1
+        return self._live(key)
+
+    def pttl(self, key):
+        self.server.check()
+        if self._live(key) is None:
+            return -2
+        expires = self.server.data[key][1]
+        return -1 if expires is None else int((expires - time.time()) * 1000)
+
+    def set(self, key, value, ex=None, nx=False):
+        self.server.check()
+        with self.server.lock:
+            if nx and self._live(key) is not None:
+                return None
+            self.server.data[key] = (value, time.time() + ex if ex else None)
+        return True
+
+    def setex(self, key, timeout, value):
+        return self.set(key, value, ex=timeout)
+
+    def exists(self, key):
+        self.server.check()
+        return int(self._live(key) is not None)
+
+    def delete(self, *keys):
+        self.server.check()
+        return sum(self.server.data.pop(key, None) is not None for key in keys)
+
+    def scan_iter(self, match):
+        self.server.check()
+        return [key for key in list(self.server.data) if key.startswith(match.rstrip('*'))]
+
+    def publish(self, channel, message):
+        self.server.check()
+        with self.server.lock:
+            subscribers = [q for c, q in self.server.subscribers if c == channel]
+        for messages in subscribers:
+            messages.put({'type': 'message', 'data': message.encode()})
+        return len(subscribers)
+
+def eventually(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+@pytest.fixture
+def server():
+    return FakeRedisServer()
+
+def process(server):
+    """A LayeredCache as one web worker has it, subscribed to invalidations"""
+    cache = LayeredCache(FakeRedis(server), max_bytes=1024 * 1024)
+    listening = len(server.listening)
+    cache.has('warm-up')  # Starts the invalidation listener, which clears the local tier once subscribed
+    assert eventually(lambda: len(server.listening) > listening)
+    return cache
+
+def test_redis_hits_are_kept_in_process(server):
+    writer, reader = process(server), process(server)
+    writer.set('view/1', {'rows': [1, 2, 3]}, timeout=60)
+
+    assert reader.get('view/1') == {'rows': [1, 2, 3]}
+    gets = server.gets
+    assert reader.get('view/1') == {'rows': [1, 2, 3]}
+    assert server.gets == gets
+
+def test_writes_and_deletes_evict_other_processes_copies(server):
+    writer, reader = process(server), process(server)
+    writer.set('dataset/hosts', 'v1')
+    assert reader.get('dataset/hosts') == 'v1'
+
+    writer.set('dataset/hosts', 'v2')
+    assert eventually(lambda: reader.local.get('dataset/hosts') is None)
+    assert reader.get('dataset/hosts') == 'v2'
+
+    writer.delete('dataset/hosts')
+    assert eventually(lambda: reader.get('dataset/hosts') is None)
+
+def test_add_is_claimed_by_one_process(server):
+    first, second = process(server), process(server)
+    assert first.add('lock/view/1', 1, timeout=30)
+    assert not second.add('lock/view/1', 2, timeout=30)
+    first.delete('lock/view/1')
+    assert second.add('lock/view/1', 2, timeout=30)
+
+def test_outage_falls_back_to_process_memory_and_drops_it_on_reconnect(server, monkeypatch):
+    monkeypatch.setattr('app.services.cache.layered.CACHE_REDIS_RETRY', 0.2)
+    cache = process(server)
+    server.down = True
+
+    assert cache.set('view/1', 'rendered during the outage')
+    assert cache.get('view/1') == 'rendered during the outage'
+    assert cache.get('view/2') is None
+
+    server.down = False
+    time.sleep(0.25)
+    assert cache.get('view/1') is None  # May have missed invalidations while Redis was away
+    cache.set('view/1', 'fresh')
+    assert FakeRedis(server).get('infraweb:view/1') is not None
+
+def test_local_tier_is_bounded_by_size():
+    local = LocalCache(max_bytes=100)
+    for key in 'abcd':
+        local.put(key, key, 20, None)
+    local.get('a')
+    local.put('e', 'e', 25, None)  # Evicts b, the least recently used
+    local.put('huge', 'huge', 26, None)  # Over a quarter of the budget; never kept
+
+    assert [key for key in 'abcde' if local.get(key)] == ['a', 'c', 'd', 'e']
+    assert local.get('huge') is None
+    assert local.size == 85
+
+def test_expired_local_copies_are_not_served():
+    local = LocalCache(max_bytes=100)
+    local.put('a', 'a', 10, time.time() - 1)
+    assert local.get('a') is None
+    assert local.size == 0
@@ -0,0 +1,59 @@
+import os
+import json
+import threading
+import time
+from app.services.metrics.registry import MetricsRegistry, RETIRED_SNAPSHOT
+
+def write_snapshot(registry, pid, samples, age=0):
+    os.makedirs(registry.metrics_dir, exist_ok=True)
+    path = os.path.join(registry.metrics_dir, f"{pid}.json")
+    with open(path, 'w') as f:
+        json.dump({'jobs_total': {'samples': samples}}, f)
+    if age:
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+    return path
+
+def sample(text, name):
+    return [line for line in text.splitlines() if line.startswith(name)]
+
+def test_thread_shards_sum_and_survive_their_threads(tmp_path):
+    registry = MetricsRegistry(str(tmp_path))
+    jobs = registry.counter('jobs_total', 'Jobs run', ['status'])
+
+    threads = [threading.Thread(target=jobs.inc, kwargs={'status': 'ok'}) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    jobs.inc(status='failed')
+
+    assert jobs.values() == {('ok',): 4, ('failed',): 1}
+    assert jobs.values() == {('ok',): 4, ('failed',): 1}  # Exited threads were retired, not dropped
+
+def test_scrape_sums_the_snapshots_of_other_processes(tmp_path):
+    registry = MetricsRegistry(str(tmp_path))
+    jobs = registry.counter('jobs_total', 'Jobs run', ['status'])
+    jobs.inc(2, status='ok')
+    write_snapshot(registry, 1, [[['ok'], 3], [['failed'], 1]])
+
+    assert sample(registry.render(), 'jobs_total{') == ['jobs_total{status="failed"} 1',
+                                                        'jobs_total{status="ok"} 5']
+
+def test_exited_process_is_retired_without_moving_counters_backwards(tmp_path, monkeypatch):
+    monkeypatch.setattr('app.services.metrics.registry.METRICS_STALE_AFTER', 60)
+    registry = MetricsRegistry(str(tmp_path))
+    registry.counter('jobs_total', 'Jobs run', ['status'])
+    stale = write_snapshot(registry, 1, [[['ok'], 3]], age=120)
+    write_snapshot(registry, 2, [[['ok'], 4]])
+
+    before = sample(registry.render(), 'jobs_total{')
+    assert before == ['jobs_total{status="ok"} 7']
+    assert not os.path.exists(stale)
+    assert json.load(open(tmp_path / RETIRED_SNAPSHOT)) == {'jobs_total': {'samples': [[['ok'], 3]]}}
+    assert sample(registry.render(), 'jobs_total{') == before
+
+def test_app_does_not_write_snapshots(app, client):
+    from app.services.metrics import metrics
+    client.get('/metrics')
+    assert not os.path.isdir(metrics.metrics_dir) or not os.listdir(metrics.metrics_dir)
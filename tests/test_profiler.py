@@ -0,0 +1,27 @@
+import sys
+from flask import Flask
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.models.infra import db, cache
+from app.models.read import ReadModel
+from app.services.profiling.profiler import profiler
+
+CACHE_OPERATIONS = ('get', 'set', 'get_many', 'set_many', 'delete')
+
+def test_process_wide_hooks_are_installed_once(app, monkeypatch):
+    monkeypatch.setattr(sys.modules['app.services.profiling.profiler'], '_installed', False)
+    monkeypatch.setattr(ReadModel, 'load', ReadModel.load)
+    for operation in CACHE_OPERATIONS:
+        monkeypatch.setattr(cache, operation, getattr(cache, operation))
+
+    try:
+        profiler.init_app(Flask('first'))
+        load, cache_get = ReadModel.load, cache.get
+        profiler.init_app(Flask('second'))
+        assert ReadModel.load is load
+        assert cache.get is cache_get
+        assert event.contains(Engine, 'before_cursor_execute', profiler._before_execute)
+    finally:
+        event.remove(Engine, 'before_cursor_execute', profiler._before_execute)
+        event.remove(Engine, 'after_cursor_execute', profiler._after_execute)
+        event.remove(db.Model, 'load', profiler._on_load)
@@ -0,0 +1,42 @@
+from app.models.infra import Hosts, cache, row_hash
+from app.services.cache import cache_manager
+from app.services.cache.manager import ROW_FRAGMENTS
+from app.services.database.manager import DatabaseManager
+from .helpers import host_row
+
+TEMPLATE = 'rows/hosts.html'
+
+def fragments(app):
+    """Render the host rows as the hosts page does; returns the HTML and how many rows were rendered"""
+    before = ROW_FRAGMENTS.values().get((TEMPLATE, 'rendered'), 0)
+    with app.test_request_context('/hosts'):
+        html = [str(fragment) for fragment in cache_manager.row_fragments(TEMPLATE, cache_manager.rows(Hosts))]
+    return html, ROW_FRAGMENTS.values().get((TEMPLATE, 'rendered'), 0) - before
+
+def test_writers_store_the_hash_of_the_collected_row(app):
+    DatabaseManager().perform_full_update({'hosts_data': [host_row('esx01')]})
+    assert Hosts.query.one().RowHash == row_hash(Hosts, host_row('esx01'))
+
+def test_rebuild_renders_only_changed_rows(app):
+    manager = DatabaseManager()
+    manager.perform_full_update({'hosts_data': [host_row('esx01'), host_row('esx02'), host_row('esx03')]})
+    first, rendered = fragments(app)
+    assert rendered == 3
+
+    manager.perform_full_update({'hosts_data': [host_row('esx01'), host_row('esx02', TotalVMs=11),
+                                                host_row('esx03')]})
+    second, rendered = fragments(app)
+    assert rendered == 1
+    assert second[0] == first[0] and second[2] == first[2]
+    assert second[1] != first[1]
+
+def test_cached_fragments_follow_the_current_rows(app):
+    manager = DatabaseManager()
+    manager.perform_full_update({'hosts_data': [host_row('esx01'), host_row('esx02')]})
+    fragments(app)
+
+    manager.perform_full_update({'hosts_data': [host_row('esx01')]})
+    fragments(app)
+    with app.test_request_context('/hosts'):
+        _, cache_key = cache_manager._row_template(TEMPLATE)
+    assert set(cache.get(cache_key)) == {Hosts.query.one().RowHash}
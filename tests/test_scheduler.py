@@ -0,0 +1,104 @@
+import threading
+import time
+from datetime import datetime, timedelta
+import pytest
+from app.models.infra import WindowsVMs
+from app.scheduler import scheduler_manager
+from app.scheduler.jobs import JobScheduler, ScheduledJob
+from app.services.windows import WindowsGuestCollector
+from .helpers import VCENTER, host_row
+
+def test_dependent_job_waits_for_a_run_that_started_once_it_was_due(app):
+    scheduler = JobScheduler(context_factory=app.app_context)
+    seen = []
+    inventory = ScheduledJob('inventory', lambda: seen.append(scheduler.waiting_on('inventory')) or True, interval=600)
+    windows = ScheduledJob('windows_guest', lambda: seen.append('windows') or True, at='02:00',
+                           depends_on=['inventory'])
+    scheduler.register(inventory)
+    scheduler.register(windows)
+
+    # Inventory succeeded before the Windows job was due, so its results are too old
+    assert scheduler.run_job('inventory')
+    windows.next_run = datetime.utcnow()
+    inventory.next_run = datetime.utcnow() + timedelta(minutes=10)
+    assert scheduler.run_pending() == []
+
+    assert scheduler.run_job('inventory')
+    assert seen == [[], ['windows_guest']]
+    assert scheduler.run_pending() == ['windows_guest']
+    scheduler._executor.shutdown(wait=True)
+    assert seen[-1] == 'windows'
+
+def test_unknown_dependency_is_rejected():
+    with pytest.raises(ValueError):
+        JobScheduler().register(ScheduledJob('windows_guest', lambda: True, at='02:00', depends_on=['inventory']))
+
+def test_inventory_run_hands_its_sessions_to_the_windows_stage(app, monkeypatch):
+    closed = []
+
+    class Collector:
+        def __init__(self, credentials, refresh_static=False, keep_sessions=False):
+            self.sessions = {VCENTER: {'content': None}} if keep_sessions else {}
+
+        def collect_from_all_vcenters(self, progress_callback, **kwargs):
+            progress_callback(VCENTER, {'hosts_data': 1})
+            return {'hosts_data': [host_row('esx01')], 'vms_data': [{'VMName': 'APP01'}]}
+
+        def close_sessions(self):
+            if self.sessions:
+                closed.append(list(self.sessions))
+            self.sessions = {}
+
+    def collect(self, sessions, vms_data):
+        assert list(sessions) == [VCENTER] and not closed
+        return [{'VCenter': VCENTER, 'MoRef': 'vm-1', 'VMName': vm['VMName']} for vm in vms_data]
+
+    monkeypatch.setattr('app.services.vcenter.collector.VCenterCollector', Collector)
+    monkeypatch.setattr(WindowsGuestCollector, 'collect', collect)
+    monkeypatch.setattr('app.scheduler.manager.credentials_manager.get_credentials', lambda: {})
+    monkeypatch.setattr('app.scheduler.manager.cache_manager.warm', lambda app, tables: tables)
+
+    assert not scheduler_manager.perform_windows_update()  # No inventory run to reuse
+
+    assert scheduler_manager.perform_update(sections={'inventory'}, hand_off=True)
+    assert closed == []
+    assert scheduler_manager.perform_windows_update()
+    assert closed == [[VCENTER]]
+    assert [vm.VMName for vm in WindowsVMs.query.all()] == ['APP01']
+
+def test_runs_only_wait_for_runs_of_the_same_sections(app, monkeypatch):
+    started = []
+    release = threading.Event()
+
+    class Collector:
+        sessions = {}
+
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def collect_from_all_vcenters(self, progress_callback, sections, **kwargs):
+            started.append(sorted(sections))
+            release.wait(5)
+            return {}
+
+        def close_sessions(self):
+            pass
+
+    monkeypatch.setattr('app.services.vcenter.collector.VCenterCollector', Collector)
+    monkeypatch.setattr('app.scheduler.manager.credentials_manager.get_credentials', lambda: {})
+
+    def run(sections):
+        with app.app_context():
+            scheduler_manager.perform_update(sections=sections)
+
+    threads = [threading.Thread(target=run, args=(sections,))
+               for sections in ({'inventory'}, {'vcenter_info', 'affinity_rules'}, {'inventory'})]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.1)
+    assert started == [['inventory'], ['affinity_rules', 'vcenter_info']]
+
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert started[-1] == ['inventory']
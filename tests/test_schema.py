@@ -0,0 +1,36 @@
+import os
+import sys
+import logging
+import sqlite3
+import pytest
+from app import create_missing_tables
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+import migrate_collection_scope
+import migrate_row_hash
+
+@pytest.fixture
+def database(app, tmp_path):
+    """The test database as it was before hosts had a vCenter and a row hash"""
+    path = str(tmp_path / 'audit_reports.db')
+    conn = sqlite3.connect(path)
+    conn.execute('DROP INDEX ix_hosts_VCenter')
+    conn.execute('ALTER TABLE hosts DROP COLUMN VCenter')
+    conn.execute('ALTER TABLE hosts DROP COLUMN RowHash')
+    conn.commit()
+    conn.close()
+    return path
+
+def test_missing_columns_name_their_migrations(app, database):
+    with pytest.raises(RuntimeError) as error:
+        create_missing_tables(app)
+    message = str(error.value)
+    assert 'hosts.VCenter' in message and 'hosts.RowHash' in message
+    assert 'scripts/migrate_collection_scope.py' in message and 'scripts/migrate_row_hash.py' in message
+
+def test_migrated_database_starts(app, database, monkeypatch):
+    for script in (migrate_collection_scope, migrate_row_hash):
+        monkeypatch.setattr(script, 'DATABASE_PATH', database)
+        monkeypatch.setattr(script, 'setup_logging', lambda: logging.getLogger(script.__name__))
+        script.migrate_database()
+    create_missing_tables(app)
@@ -0,0 +1,38 @@
+from app.services.cache import cache_manager
+from app.services.database.manager import DatabaseManager
+from .helpers import host_row
+
+def test_rebuild_is_claimed_by_one_caller_at_a_time(app):
+    assert cache_manager._claim_rebuild('view/test', wait=False)
+    assert not cache_manager._claim_rebuild('view/test', wait=False)
+    cache_manager._release_rebuild('view/test')
+    assert cache_manager._claim_rebuild('view/test', wait=False)
+    cache_manager._release_rebuild('view/test')
+
+def test_streamed_rebuild_is_released_when_its_body_is_never_read(app):
+    DatabaseManager().perform_full_update({'hosts_data': [host_row('esx01')]})
+    token, _ = cache_manager.get_validators(('hosts',))
+    cache_key = f"view/{token}//hosts?"
+
+    with app.test_request_context('/hosts'):
+        response = app.view_functions['vcenter.hosts']()
+    assert response.is_streamed
+    assert not cache_manager._claim_rebuild(cache_key, wait=False)
+
+    response.close()
+    assert not cache_manager._flights
+    assert cache_manager._claim_rebuild(cache_key, wait=False)
+    cache_manager._release_rebuild(cache_key)
+
+def test_streamed_rebuild_is_released_once(app, client, monkeypatch):
+    DatabaseManager().perform_full_update({'hosts_data': [host_row('esx01')]})
+    token, _ = cache_manager.get_validators(('hosts',))
+    released = []
+    release = cache_manager._release_rebuild
+    monkeypatch.setattr(cache_manager, '_release_rebuild',
+                        lambda cache_key, locked=True: (released.append(cache_key), release(cache_key, locked)))
+
+    response = client.get('/hosts', buffered=False)
+    b''.join(response.response)
+    response.close()
+    assert [key for key in released if key.startswith('view/')] == [f"view/{token}//hosts?"]
@@ -0,0 +1,34 @@
+from app.services.database.manager import DatabaseManager
+from app.services.metrics.routes import REQUEST_DURATION
+from app.services.vcenter.routes import _chunked
+from .helpers import host_row
+
+def observed(endpoint):
+    return sum(value[-2] + sum(value[:-2]) for key, value in REQUEST_DURATION.values().items()
+               if key[0] == endpoint)
+
+def test_template_pieces_are_joined_into_chunks():
+    assert list(_chunked(['ab', 'cd', 'e', 'fgh', 'i'], size=4)) == ['abcd', 'efgh', 'i']
+    assert list(_chunked(['ab', 'c'], size=4)) == ['abc']
+
+def test_streamed_page_is_timed_until_its_last_chunk(app, client):
+    DatabaseManager().perform_full_update({'hosts_data': [host_row('esx01'), host_row('esx02')]})
+    before = observed('vcenter.hosts')
+
+    response = client.get('/hosts', buffered=False)
+    assert response.is_streamed
+    assert observed('vcenter.hosts') == before
+
+    body = b''.join(response.response)
+    response.close()
+    assert observed('vcenter.hosts') == before + 1
+    assert b'esx01' in body and b'esx02' in body
+
+def test_streamed_page_is_teed_into_the_cache(app, client):
+    DatabaseManager().perform_full_update({'hosts_data': [host_row('esx01')]})
+
+    first = client.get('/hosts')
+    second = client.get('/hosts')
+    assert first.status_code == second.status_code == 200
+    assert second.data == first.data
+    assert not second.is_streamed
@@ -0,0 +1,266 @@
+import json
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from pyVmomi import vim
+from app.models.infra import db, WindowsGuestFacts, WindowsVMs
+from app.services.database.manager import DatabaseManager
+from app.services.windows import WindowsGuestCollector
+from app.utils.config import WINDOWS_FACT_TTLS
+from .helpers import VCENTER, OTHER_VCENTER
+
+CREDENTIALS = {'windows': {'username': 'svc', 'password': 'secret'}}
+
+def windows_vm(name: str, vcenter: str = VCENTER, moref: str = 'vm-1', **values) -> dict:
+    """A powered-on Windows VM as the inventory pass reports it"""
+    return {'VMName': name, 'VCenter': vcenter, 'MoRef': moref, 'InstanceUuid': None,
+            'OS': 'Microsoft Windows Server 2019', 'State': 'poweredOn', 'NICType': 'vim.vm.device.VirtualVmxnet3',
+            'Host': 'esx01', 'Cluster': 'CL1', 'Site': 'Site1', 'SizeGB': 80.0, 'IP': '10.0.0.1',
+            'VMTools': 'guestToolsCurrent', 'VMVersion': 'vmx-19', 'Notes': '', **values}
+
+@pytest.fixture
+def collector(app, monkeypatch):
+    """A collector whose vCenters index the VMs given to them and whose probe reports the VM's vCenter"""
+    def index_vms(self, content, vms):
+        refs = {vm['MoRef']: SimpleNamespace(_moId=vm['MoRef'], name=vm['VMName']) for vm in vms}
+        return {'name': {ref.name: ref for ref in refs.values()}, 'uuid': {}, 'moref': refs,
+                'runtime': {moref: content.get(moref, {}) for moref in refs}}
+    monkeypatch.setattr(WindowsGuestCollector, '_index_vms', index_vms)
+
+    collector = WindowsGuestCollector(CREDENTIALS)
+    collector.probes = []
+
+    def run(content, vm, creds, groups, vcenter=''):
+        collector.probes.append((vcenter, vm._moId, tuple(groups)))
+        return {'os': f"Windows on {vcenter}", 'cortex': 'Running'}
+    monkeypatch.setattr(collector.probe, 'run', run)
+    return collector
+
+def sessions(*vcenters, runtime=None):
+    """Open sessions whose content maps MoRefs to boot time and Tools version"""
+    return {vcenter: {'content': runtime or {}} for vcenter in vcenters}
+
+def test_unreachable_vcenter_keeps_its_windows_rows(collector):
+    vms = [windows_vm('APP01'), windows_vm('APP02', moref='vm-2'), windows_vm('DB01', OTHER_VCENTER)]
+    rows = collector.collect(sessions(VCENTER, OTHER_VCENTER), vms)
+    assert DatabaseManager().perform_full_update({'windows_vms': rows})
+
+    # The other vCenter cannot be reached, has no cached facts to report DB01 from, and APP02 is powered off
+    WindowsGuestFacts.query.filter_by(VCenter=OTHER_VCENTER).delete()
+    db.session.commit()
+    vms[1]['State'] = 'poweredOff'
+    rows = collector.collect(sessions(VCENTER), vms)
+    assert collector.failed_vcenters == [OTHER_VCENTER]
+    assert DatabaseManager().perform_full_update({'windows_vms': rows},
+                                                 failed_vcenters=collector.failed_vcenters)
+    assert sorted(vm.VMName for vm in WindowsVMs.query.all()) == ['APP01', 'DB01']
+
+def test_indexing_error_is_contained_to_its_vcenter(collector, monkeypatch):
+    index_vms = WindowsGuestCollector._index_vms
+
+    def failing(self, content, vms):
+        if vms[0]['VCenter'] == OTHER_VCENTER:
+            raise RuntimeError('property collector fault')
+        return index_vms(self, content, vms)
+    monkeypatch.setattr(WindowsGuestCollector, '_index_vms', failing)
+
+    rows = collector.collect(sessions(VCENTER, OTHER_VCENTER), [windows_vm('APP01'), windows_vm('DB01', OTHER_VCENTER)])
+    assert [row['VMName'] for row in rows] == ['APP01']
+    assert collector.failed_vcenters == [OTHER_VCENTER]
+
+class PropertyCollector:
+    """Answers RetrievePropertiesEx with the given pages, chained by continuation tokens"""
+
+    def __init__(self, *pages):
+        self.pages = list(pages)
+        self.calls = 0
+
+    def RetrievePropertiesEx(self, specs, options):
+        self.calls += 1
+        return self.pages[0]
+
+    def ContinueRetrievePropertiesEx(self, token):
+        self.calls += 1
+        return self.pages[int(token)]
+
+def page(vms, token=None):
+    """One page of VM properties; ``vms`` maps MoRefs to their name and instance UUID"""
+    return SimpleNamespace(token=token, objects=[
+        SimpleNamespace(obj=SimpleNamespace(_moId=moref), propSet=[
+            SimpleNamespace(name='name', val=name), SimpleNamespace(name='config.instanceUuid', val=uuid)
+        ]) for moref, (name, uuid) in vms.items()
+    ])
+
+def test_index_is_built_from_every_page_and_looked_up_by_moref_uuid_then_name(app):
+    collector = WindowsGuestCollector(CREDENTIALS)
+    content = SimpleNamespace(propertyCollector=PropertyCollector(
+        page({'vm-1': ('APP01', 'uuid-1'), 'vm-2': ('APP02', 'uuid-2')}, token='1'),
+        page({'vm-3': ('APP01', 'uuid-3')})
+    ))
+    index = collector._retrieve_index(content, [vim.PropertyCollector.ObjectSpec(obj=vim.VirtualMachine('vm-1'))])
+
+    assert content.propertyCollector.calls == 2
+    assert set(index['moref']) == {'vm-1', 'vm-2', 'vm-3'}
+    assert collector.stats['duplicate_vm_names'] == 1
+    assert collector._find_vm(index, windows_vm('APP01', moref='vm-3'))._moId == 'vm-3'
+    assert collector._find_vm(index, windows_vm('RENAMED', moref='vm-9', InstanceUuid='uuid-2'))._moId == 'vm-2'
+    assert collector._find_vm(index, windows_vm('APP02', moref=None))._moId == 'vm-2'
+    assert collector._find_vm(index, windows_vm('GONE', moref='vm-9')) is None
+
+def test_vms_with_morefs_are_read_without_a_container_view(app):
+    collector = WindowsGuestCollector(CREDENTIALS)
+    property_collector = PropertyCollector(page({'vm-1': ('APP01', 'uuid-1')}))
+    property_collector._stub = None
+    content = SimpleNamespace(propertyCollector=property_collector)  # No viewManager to fall back on
+
+    index = collector._index_vms(content, [windows_vm('APP01')])
+    assert property_collector.calls == 1
+    assert collector._find_vm(index, windows_vm('APP01'))._moId == 'vm-1'
+
+class GuestOperations:
+    """Guest operations of a VM whose probe script exits after ``polls`` status checks"""
+
+    def __init__(self, exit_code=0, polls=2, output=b'\xef\xbb\xbf{"os": "Windows Server 2019"}'):
+        self.exit_code = exit_code
+        self.polls = polls
+        self.output = output
+        self.started = []
+        self.listed = 0
+        self.processManager = SimpleNamespace(StartProgram=self.start, ListProcessesInGuest=self.list)
+        self.fileManager = SimpleNamespace(InitiateFileTransferFromGuest=self.transfer)
+
+    def start(self, vm, auth, spec):
+        self.started.append(spec)
+        return 42
+
+    def list(self, vm, auth, pids):
+        self.listed += 1
+        done = self.listed >= self.polls
+        return [SimpleNamespace(pid=pids[0], endTime='now' if done else None, exitCode=self.exit_code)]
+
+    def transfer(self, vm, auth, guestFilePath):
+        return SimpleNamespace(url=f"https://esx01/guestFile?path={guestFilePath}")
+
+@pytest.fixture
+def probe(app, monkeypatch):
+    monkeypatch.setattr('app.services.windows.collector.time.sleep', lambda seconds: None)
+    probe = WindowsGuestCollector(CREDENTIALS).probe
+    probe.downloads = []
+
+    def get(url, timeout):
+        probe.downloads.append(url)
+        return SimpleNamespace(content=probe.guest.output, raise_for_status=lambda: None)
+    monkeypatch.setattr(probe.http, 'get', get)
+    return probe
+
+def test_probe_starts_one_script_and_downloads_its_result(probe):
+    probe.guest = GuestOperations(polls=3)
+    content = SimpleNamespace(guestOperationsManager=probe.guest)
+
+    facts = probe.run(content, SimpleNamespace(name='APP01'), None, ['os', 'services'], VCENTER)
+    assert facts == {'os': 'Windows Server 2019'}
+    assert len(probe.guest.started) == 1
+    assert list(probe.guest.started[0].envVariables) == ['INFRAWEB_FACTS=os,services']
+    assert probe.guest.listed == 3
+    assert len(probe.downloads) == 1
+
+def test_failed_probe_script_downloads_nothing(probe):
+    probe.guest = GuestOperations(exit_code=1)
+    content = SimpleNamespace(guestOperationsManager=probe.guest)
+
+    assert probe.run(content, SimpleNamespace(name='APP01'), None, ['os'], VCENTER) is None
+    assert probe.downloads == []
+
+def test_probes_stay_within_the_vcenter_and_host_caps(collector, monkeypatch):
+    monkeypatch.setattr('app.services.windows.collector.WINDOWS_COLLECTION_PER_VCENTER', 3)
+    monkeypatch.setattr('app.services.windows.collector.WINDOWS_COLLECTION_PER_HOST', 2)
+    running = Counter()
+    peaks = Counter()
+    lock = threading.Lock()
+
+    def run(content, vm, creds, groups, vcenter=''):
+        host = vm.name.split('-')[0]
+        with lock:
+            running[vcenter] += 1
+            running[host] += 1
+            for key in (vcenter, host):
+                peaks[key] = max(peaks[key], running[key])
+        time.sleep(0.02)
+        with lock:
+            running[vcenter] -= 1
+            running[host] -= 1
+        return {'os': 'Windows'}
+    monkeypatch.setattr(collector.probe, 'run', run)
+
+    vms = [windows_vm(f"{host}-{i}", vcenter, moref=f"vm-{host}-{i}", Host=f"{host}")
+           for vcenter, hosts in ((VCENTER, ('esx01', 'esx02')), (OTHER_VCENTER, ('esx03',)))
+           for host in hosts for i in range(4)]
+    rows = collector.collect(sessions(VCENTER, OTHER_VCENTER), vms)
+
+    assert len(rows) == len(vms)
+    assert peaks[VCENTER] == 3
+    assert peaks[OTHER_VCENTER] == 2
+    assert max(peaks[host] for host in ('esx01', 'esx02', 'esx03')) == 2
+
+def test_slowest_vms_are_probed_first(collector, monkeypatch):
+    monkeypatch.setattr('app.services.windows.collector.WINDOWS_COLLECTION_WORKERS', 1)
+    vms = [windows_vm(name, moref=name) for name in ('FAST', 'SLOW', 'NEW')]
+    for name, duration in (('FAST', 1.0), ('SLOW', 30.0)):
+        db.session.add(WindowsGuestFacts(VCenter=VCENTER, MoRef=name, VMName=name, last_duration=duration))
+    db.session.commit()
+
+    collector.collect(sessions(VCENTER), vms)
+    assert [moref for _, moref, _ in collector.probes] == ['NEW', 'SLOW', 'FAST']
+
+def test_facts_are_reprobed_when_expired_or_invalidated(collector):
+    vms = [windows_vm('APP01')]
+    runtime = {'vm-1': {'boot_time': datetime(2026, 10, 1), 'tools_version': '12352'}}
+    all_groups = tuple(WINDOWS_FACT_TTLS)
+
+    collector.collect(sessions(VCENTER, runtime=runtime), vms)
+    assert collector.probes == [(VCENTER, 'vm-1', all_groups)]
+
+    rows = collector.collect(sessions(VCENTER, runtime=runtime), vms)
+    assert len(collector.probes) == 1
+    assert rows[0]['OS'] == f"Windows on {VCENTER}"
+
+    # Only the services group has outlived its TTL
+    entry = WindowsGuestFacts.query.one()
+    fact_times = json.loads(entry.fact_times)
+    fact_times['services'] = (datetime.utcnow() - timedelta(seconds=WINDOWS_FACT_TTLS['services'] + 1)).isoformat()
+    entry.fact_times = json.dumps(fact_times)
+    db.session.commit()
+    collector.collect(sessions(VCENTER, runtime=runtime), vms)
+    assert collector.probes[-1] == (VCENTER, 'vm-1', ('services',))
+
+    for changed in ({'boot_time': datetime(2026, 10, 18)}, {'tools_version': '12384'}):
+        runtime['vm-1'] = dict(runtime['vm-1'], **changed)
+        collector.collect(sessions(VCENTER, runtime=runtime), vms)
+        assert collector.probes[-1] == (VCENTER, 'vm-1', all_groups)
+    assert collector.stats['probes_triggered'] == 2
+
+def test_vms_are_routed_to_the_vcenter_that_reported_them(collector):
+    vms = [
+        windows_vm('APP01', VCENTER, Cluster='cha-CL1'),  # Cluster name points at the other vCenter
+        windows_vm('APP02', None, moref='vm-2', Cluster='cha-CL2'),  # Collected before vCenters were recorded
+        windows_vm('APP03', None, moref='vm-3', Cluster='zzz-CL3')  # Neither recorded nor guessable
+    ]
+    rows = collector.collect(sessions(VCENTER, OTHER_VCENTER), vms)
+
+    assert sorted(collector.probes) == [(OTHER_VCENTER, 'vm-2', tuple(WINDOWS_FACT_TTLS)),
+                                        (VCENTER, 'vm-1', tuple(WINDOWS_FACT_TTLS))]
+    assert sorted((row['VMName'], row['VCenter'], row['MoRef']) for row in rows) == [
+        ('APP01', VCENTER, 'vm-1'), ('APP02', OTHER_VCENTER, 'vm-2')]
+    assert collector.stats['misroutes_avoided'] == 1
+    assert collector.stats['routed_by_guess'] == 2
+
+def test_renamed_vm_keeps_its_cached_facts(collector):
+    collector.collect(sessions(VCENTER), [windows_vm('APP01')])
+    rows = collector.collect(sessions(VCENTER), [windows_vm('APP01-NEW')])
+
+    assert len(collector.probes) == 1
+    assert rows[0]['VMName'] == 'APP01-NEW'
+    assert rows[0]['OS'] == f"Windows on {VCENTER}"
@@ -0,0 +1,7 @@
+from app import create_app, create_missing_tables
+
+# WSGI entry point for production servers, e.g. gunicorn -c gunicorn.conf.py wsgi:app
+app = create_app()
+
+# With preload_app this runs once, in the gunicorn master, before any worker starts
+create_missing_tables(app)